@@ -0,0 +1,5 @@
+"""
+Benchmarks for the fair_value package. Run from the repository root, e.g.
+
+    python -m benchmarks.bench_fair_value > bench_output.txt
+"""
@@ -0,0 +1,238 @@
+"""
+Benchmark of the core valuation functions on synthetic workbooks in the template schema
+('Perusahaan_Target' and 'Perusahaan_Sektor' sheets), from 10 to 100k comparables.
+
+    python -m benchmarks.bench_fair_value
+    python -m benchmarks.bench_fair_value --sizes 10 1000 --repeats 7 --json > bench.json
+
+Workbooks are generated from a fixed seed, so every run on every commit times the same data;
+the data fingerprint in the output confirms it. Nothing is downloaded and Streamlit is not needed.
+"""
+import argparse
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+
+import pandas as pd
+import numpy as np
+
+from fair_value.ingest import TARGET_SHEET, SECTOR_SHEET, read_valuation_frames, read_valuation_frames_cached
+from fair_value.incremental import INPUT_COLUMNS
+from fair_value.sector_index import SectorIndex
+from fair_value.valuation import (
+    calculate_key_ratios,
+    get_sector_comparables_from_excel,
+    calculate_sector_averages_from_excel,
+    calculate_fair_value_multiplier
+)
+from fair_value.batch import value_companies_batch
+from fair_value.methods import VALUATION_METHODS
+from fair_value.report import write_valuation_report
+
+DEFAULT_SIZES = (10, 100, 1_000, 10_000, 100_000)
+DEFAULT_SEED = 2024
+
+# Roughly 50 comparables per sector, between 2 and 200 sectors
+COMPANIES_PER_SECTOR = 50
+MAX_SECTORS = 200
+
+# Function to generate a synthetic comparables universe in the template schema
+def make_companies(n_companies, seed=DEFAULT_SEED):
+    """
+    `n_companies` rows with IDX-like magnitudes spread over several sectors. About 10% of the
+    companies report a loss and a few have zero net income or equity, like real data.
+    """
+    rng = np.random.default_rng(seed)
+    n_sectors = int(np.clip(n_companies // COMPANIES_PER_SECTOR, 2, MAX_SECTORS))
+    shares = np.round(rng.lognormal(np.log(5e9), 1.0, n_companies), -6)
+    equity = rng.lognormal(np.log(5e12), 1.2, n_companies)
+    revenue = equity * rng.uniform(0.2, 1.5, n_companies)
+    net_income = revenue * rng.normal(0.08, 0.08, n_companies)
+    net_income[rng.random(n_companies) < 0.01] = 0
+    equity[rng.random(n_companies) < 0.005] = 0
+    book_per_share = np.where(shares > 0, equity / shares, 0)
+    price = np.round(np.maximum(50, book_per_share * rng.lognormal(0.3, 0.6, n_companies)), 0)
+
+    return pd.DataFrame({
+        'Ticker': [f'T{i:06d}' for i in range(n_companies)],
+        'Nama_Perusahaan': [f'Perusahaan {i}' for i in range(n_companies)],
+        'Sektor': [f'Sektor {s:03d}' for s in rng.integers(0, n_sectors, n_companies)],
+        'Harga_Saham_Saat_Ini': price,
+        'Jumlah_Saham_Beredar': shares,
+        'Net_Income_Terbaru': np.round(net_income, -6),
+        'Total_Pendapatan_Terbaru': np.round(revenue, -6),
+        'Total_Ekuitas_Terbaru': np.round(equity, -6)
+    })[INPUT_COLUMNS]
+
+# Function to write a synthetic workbook with both template sheets
+def write_workbook(path, companies):
+    """
+    Writes the first company as 'Perusahaan_Target' and every company as 'Perusahaan_Sektor'.
+    """
+    with pd.ExcelWriter(path, engine='xlsxwriter') as writer:
+        companies.head(1).to_excel(writer, sheet_name=TARGET_SHEET, index=False)
+        companies.to_excel(writer, sheet_name=SECTOR_SHEET, index=False)
+
+# Function to fingerprint the generated data (the .xlsx bytes carry a timestamp, the data does not)
+def data_fingerprint(companies):
+    """
+    Short hex digest of the row hashes of `companies`.
+    """
+    return f'{int(pd.util.hash_pandas_object(companies, index=False).sum()) & 0xFFFFFFFFFFFF:012x}'
+
+# Function to time a callable
+def time_call(function, repeats):
+    """
+    Runs `function` `repeats` times and returns (min, median) wall time in seconds.
+    """
+    timings = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings), float(np.median(timings))
+
+# Function to read a workbook the way read_excel_data does, without Streamlit
+def read_target_and_comparables(path, read_frames=read_valuation_frames):
+    """
+    Both sheets, with the first 'Perusahaan_Target' row as the target dict.
+    """
+    df_target, df_sector = read_frames(path)
+    return df_target.iloc[0].to_dict(), df_sector
+
+# Function to value the target end to end, as the dashboard does for a single company
+def value_target(target_data, df_sector):
+    """
+    Comparables of the target's sector, their averages and both fair values.
+    """
+    ratios = calculate_key_ratios(
+        target_data['Net_Income_Terbaru'], target_data['Total_Pendapatan_Terbaru'], target_data['Total_Ekuitas_Terbaru'],
+        target_data['Harga_Saham_Saat_Ini'], target_data['Jumlah_Saham_Beredar']
+    )
+    comparables = get_sector_comparables_from_excel(df_sector, target_data['Sektor'])
+    sector_averages = calculate_sector_averages_from_excel(comparables)
+    return [calculate_fair_value_multiplier(ratios, sector_averages, target_data['Harga_Saham_Saat_Ini'], method=method)
+            for method in ['P/E', 'P/B']]
+
+# Function to run every benchmark for one workbook size
+def bench_size(n_companies, workdir, seed=DEFAULT_SEED, repeats=5, read_repeats=3):
+    """
+    Returns (info dict, list of result dicts) for a workbook with `n_companies` comparables.
+    """
+    companies = make_companies(n_companies, seed)
+    path = os.path.join(workdir, f'bench_{n_companies}.xlsx')
+    write_workbook(path, companies)
+    cache_dir = os.path.join(workdir, f'cache_{n_companies}')
+    info = {
+        'companies': n_companies,
+        'sectors': int(companies['Sektor'].nunique()),
+        'fingerprint': data_fingerprint(companies)
+    }
+
+    target_data, df_sector = read_target_and_comparables(path)
+    sector = target_data['Sektor']
+    comparables = get_sector_comparables_from_excel(df_sector, sector)
+    ratios = calculate_key_ratios(
+        target_data['Net_Income_Terbaru'], target_data['Total_Pendapatan_Terbaru'], target_data['Total_Ekuitas_Terbaru'],
+        target_data['Harga_Saham_Saat_Ini'], target_data['Jumlah_Saham_Beredar']
+    )
+    sector_averages = calculate_sector_averages_from_excel(comparables)
+    read_valuation_frames_cached(path, cache_dir=cache_dir)
+    batch_results = value_companies_batch(df_sector, df_sector)
+    report_path = os.path.join(workdir, f'report_{n_companies}.xlsx')
+
+    cases = [
+        ('read_excel_data (xlsx parse)', lambda: read_target_and_comparables(path), read_repeats),
+        ('read_excel_data (warm disk cache)',
+         lambda: read_target_and_comparables(path, lambda p: read_valuation_frames_cached(p, cache_dir=cache_dir)), repeats),
+        ('get_sector_comparables_from_excel', lambda: get_sector_comparables_from_excel(df_sector, sector), repeats),
+        ('SectorIndex build', lambda: SectorIndex(df_sector), repeats),
+        ('calculate_sector_averages_from_excel', lambda: calculate_sector_averages_from_excel(comparables), repeats),
+        ('calculate_fair_value_multiplier (P/E + P/B)',
+         lambda: [calculate_fair_value_multiplier(ratios, sector_averages, target_data['Harga_Saham_Saat_Ini'], method=method)
+                  for method in ['P/E', 'P/B']], repeats),
+        ('value target end to end (after read)', lambda: value_target(target_data, df_sector), repeats),
+        ('value_companies_batch (all rows)', lambda: value_companies_batch(df_sector, df_sector), repeats),
+        ('value_companies_batch (all methods)',
+         lambda: value_companies_batch(df_sector, df_sector, methods=list(VALUATION_METHODS)), repeats),
+        ('write_valuation_report (all rows)', lambda: write_valuation_report(batch_results, report_path), read_repeats)
+    ]
+
+    results = []
+    for name, function, case_repeats in cases:
+        best, median = time_call(function, case_repeats)
+        results.append({'companies': n_companies, 'benchmark': name, 'repeats': case_repeats,
+                        'min_ms': best * 1000, 'median_ms': median * 1000})
+    return info, results
+
+# Function to describe the machine and code the benchmark ran on
+def environment_info():
+    """
+    Python, NumPy, pandas versions, platform and the current git commit (if any).
+    """
+    try:
+        commit = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True, text=True,
+                                check=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        commit = None
+    return {
+        'commit': commit,
+        'python': platform.python_version(),
+        'numpy': np.__version__,
+        'pandas': pd.__version__,
+        'platform': platform.platform(),
+        'processor': platform.processor() or platform.machine()
+    }
+
+# Function to format the results as a plain-text report
+def format_report(environment, infos, results, seed):
+    """
+    Fixed-width text: environment, one line per generated workbook and one line per timing.
+    """
+    lines = [f"fair_value benchmark (seed {seed})"]
+    lines += [f"  {key}: {value}" for key, value in environment.items()]
+    lines.append('')
+    lines.append(f"{'companies':>10} {'sectors':>8} {'fingerprint':>14}")
+    lines += [f"{info['companies']:>10} {info['sectors']:>8} {info['fingerprint']:>14}" for info in infos]
+    lines.append('')
+    lines.append(f"{'companies':>10}  {'benchmark':<45} {'repeats':>7} {'min_ms':>12} {'median_ms':>12}")
+    lines += [f"{r['companies']:>10}  {r['benchmark']:<45} {r['repeats']:>7} {r['min_ms']:>12.3f} {r['median_ms']:>12.3f}" for r in results]
+    return '\n'.join(lines)
+
+# Function to build the argument parser
+def build_parser():
+    """
+    Returns the argparse parser for the benchmark.
+    """
+    parser = argparse.ArgumentParser(prog='python -m benchmarks.bench_fair_value',
+                                     description='Times the core fair_value functions on synthetic workbooks.')
+    parser.add_argument('--sizes', type=int, nargs='+', default=list(DEFAULT_SIZES), help='Numbers of comparables to generate')
+    parser.add_argument('--seed', type=int, default=DEFAULT_SEED, help='Seed of the synthetic data')
+    parser.add_argument('--repeats', type=int, default=5, help='Timed runs per in-memory benchmark')
+    parser.add_argument('--read-repeats', type=int, default=3, help='Timed runs of the .xlsx parse')
+    parser.add_argument('--json', action='store_true', help='Print JSON instead of the text report')
+    return parser
+
+def main(argv=None):
+    args = build_parser().parse_args(argv)
+    infos, results = [], []
+    with tempfile.TemporaryDirectory(prefix='fair_value_bench_') as workdir:
+        for n_companies in args.sizes:
+            print(f"benchmarking {n_companies} companies...", file=sys.stderr)
+            info, size_results = bench_size(n_companies, workdir, args.seed, args.repeats, args.read_repeats)
+            infos.append(info)
+            results.extend(size_results)
+
+    environment = environment_info()
+    if args.json:
+        print(json.dumps({'seed': args.seed, 'environment': environment, 'workbooks': infos, 'results': results}, indent=2))
+    else:
+        print(format_report(environment, infos, results, args.seed))
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
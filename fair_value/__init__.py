@@ -0,0 +1,175 @@
+"""
+Stock fair value calculations without any Streamlit dependency.
+
+The dashboard in fair_value_app.py and the command line (`python -m fair_value`)
+are both built on these functions.
+"""
+from fair_value.valuation import (
+    RATIO_COLUMNS,
+    UNDERVALUED_THRESHOLD,
+    OVERVALUED_THRESHOLD,
+    calculate_key_ratios,
+    calculate_key_ratios_vectorized,
+    get_sector_comparables_from_excel,
+    aggregate_sector_ratios,
+    calculate_sector_ratios_from_excel,
+    calculate_sector_averages_from_excel,
+    calculate_fair_value_multiplier,
+    classify_valuation_status,
+    get_investment_recommendation
+)
+from fair_value.sector_stats import (
+    SECTOR_AGGREGATORS,
+    DEFAULT_TRIM,
+    MULTIPLE_RATIOS,
+    AVERAGE_ORDER,
+    compute_sector_statistics,
+    sector_averages_from_statistics
+)
+from fair_value.sector_index import MISSING_SECTOR_KEY, SectorIndex, normalize_sector
+from fair_value.batch import BATCH_RESULT_COLUMNS, value_companies_batch
+from fair_value.methods import (
+    GROWTH_COLUMN,
+    DEFAULT_METHODS,
+    VALUATION_METHODS,
+    ValuationMethod,
+    register_valuation_method,
+    resolve_methods,
+    available_methods,
+    method_multiples,
+    method_contributions,
+    method_averages,
+    method_fair_values,
+    batch_result_columns
+)
+from fair_value.sensitivity import (
+    SENSITIVITY_SCENARIOS,
+    DEFAULT_SENSITIVITY_STEPS,
+    scenario_shocks,
+    fair_value_sensitivity,
+    sensitivity_grid,
+    sensitivity_table
+)
+from fair_value.monte_carlo import (
+    MONTE_CARLO_METHODS,
+    MONTE_CARLO_PERCENTILES,
+    DEFAULT_NOISE,
+    DEFAULT_SAMPLES,
+    DEFAULT_SEED,
+    MonteCarloResult,
+    simulate_fair_value,
+    summarize_fair_value_samples
+)
+from fair_value.pagination import (
+    PAGE_SIZES,
+    DEFAULT_PAGE_SIZE,
+    sort_positions,
+    page_count,
+    paginate,
+    format_page
+)
+from fair_value.profiling import PIPELINE_STAGES, PROFILE_LOG_ENV, TRACE_MEMORY_ENV, StageProfiler, start_memory_tracing
+from fair_value.history import (
+    HISTORY_COLUMNS,
+    DEFAULT_WINDOW,
+    HISTORY_RESULT_COLUMNS,
+    PeriodStore,
+    parse_periods,
+    historical_fair_values
+)
+from fair_value.streaming import (
+    DEFAULT_CHUNK_ROWS,
+    StreamedComparables,
+    iter_table_chunks,
+    read_target_frame,
+    stream_sector_comparables
+)
+from fair_value.cache import (
+    CacheStats,
+    LRUCache,
+    estimate_size,
+    shared_cache
+)
+from fair_value.concurrency import (
+    THREADS_ENV,
+    DEFAULT_THREADS,
+    shared_executor,
+    submit_tasks
+)
+from fair_value.parallel import (
+    WORKERS_ENV,
+    MIN_PARALLEL_ROWS,
+    default_workers,
+    partition_by_sector,
+    value_companies_parallel
+)
+from fair_value.schema import (
+    CATEGORY_COLUMNS,
+    SHARE_COLUMNS,
+    MONEY_COLUMNS,
+    REQUIRED_COLUMNS,
+    ISSUE_COLUMNS,
+    SchemaResult,
+    apply_schema,
+    missing_fields
+)
+from fair_value.peers import (
+    PEER_FEATURES,
+    DEFAULT_PEERS,
+    DEFAULT_LEAF_SIZE,
+    DISTANCE_COLUMN,
+    KDTree,
+    PeerIndex,
+    peer_features,
+    value_companies_with_peers
+)
+from fair_value.screener import (
+    SCREEN_FIELDS,
+    SCREEN_OPERATORS,
+    SECTOR_RELATIVE_SUFFIX,
+    ScreenCondition,
+    ScreenIndex,
+    parse_screen_query
+)
+from fair_value.live import (
+    PRICE_FEEDS_ENV,
+    DEFAULT_REFRESH_SECONDS,
+    RESYNC_TICKS,
+    PriceTick,
+    LiveQuote,
+    CsvPriceFeed,
+    HttpPriceFeed,
+    LivePricer,
+    configured_price_feeds,
+    open_price_feed,
+    parse_tick_line,
+    parse_tick_payload
+)
+from fair_value.report import (
+    REPORT_SUMMARY_SHEET,
+    REPORT_ALL_SHEET,
+    REPORT_SUMMARY_COLUMNS,
+    sector_sheet_name,
+    write_valuation_report,
+    valuation_report_bytes
+)
+from fair_value.incremental import (
+    IncrementalSectorState,
+    IncrementalBatchValuation,
+    ChangeSummary,
+    row_keys,
+    row_hashes
+)
+from fair_value.ingest import (
+    TARGET_SHEET,
+    SECTOR_SHEET,
+    HISTORY_SHEET,
+    SUPPORTED_EXTENSIONS,
+    read_valuation_frames,
+    read_history_frame,
+    read_valuation_frames_cached,
+    is_single_table_source,
+    content_hash,
+    default_cache_dir,
+    prune_cache_dir
+)
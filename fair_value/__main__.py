@@ -0,0 +1,195 @@
+"""
+Command line entry point: values every company in a file without starting Streamlit.
+
+    python -m fair_value data.xlsx -o valuasi.csv
+    python -m fair_value universe.parquet --targets sector -o valuasi.parquet
+    python -m fair_value export_besar.xlsx --stream -o valuasi.csv
+    python -m fair_value pasar_penuh.parquet --targets sector --workers 8 -o valuasi.parquet
+    python -m fair_value pasar_penuh.parquet --targets sector --peers 10 -o valuasi.parquet
+    python -m fair_value pasar_penuh.parquet --screen "P/E < 10 and ROE > 15 and P/B < sektor"
+    python -m fair_value data.xlsx --methods P/E,P/B,P/S,PEG -o valuasi.csv
+    python -m fair_value pasar_penuh.parquet --targets sector --report laporan.xlsx -o valuasi.parquet
+"""
+import argparse
+import sys
+
+from fair_value.ingest import TARGET_SHEET, SECTOR_SHEET, read_valuation_frames, read_valuation_frames_cached
+from fair_value.methods import DEFAULT_METHODS, VALUATION_METHODS, resolve_methods
+from fair_value.parallel import default_workers, value_companies_parallel
+from fair_value.peers import value_companies_with_peers
+from fair_value.profiling import StageProfiler, start_memory_tracing
+from fair_value.report import write_valuation_report
+from fair_value.schema import apply_schema
+from fair_value.screener import ScreenIndex, parse_screen_query
+from fair_value.streaming import read_target_frame, stream_sector_comparables
+
+OUTPUT_EXTENSIONS = ('.csv', '.parquet', '.xlsx')
+
+# Function to build the argument parser
+def build_parser():
+    """
+    Returns the argparse parser for the command line.
+    """
+    parser = argparse.ArgumentParser(
+        prog='python -m fair_value',
+        description='Batch fair value valuation (P/E, P/B and other multiples) for an .xlsx, .csv, .parquet or .feather file.'
+    )
+    parser.add_argument('input', help="Input file (.xlsx with 'Perusahaan_Target'/'Perusahaan_Sektor' sheets, or .csv/.parquet/.feather)")
+    parser.add_argument('-o', '--output', help='Output file (.csv, .parquet or .xlsx). Defaults to CSV on stdout.')
+    parser.add_argument(
+        '--no-cache', action='store_true',
+        help='Always parse the input instead of using the content-hash cache ($FAIR_VALUE_CACHE_DIR or ~/.cache/fair_value; '
+             'entries expire after $FAIR_VALUE_DISK_CACHE_MAX_AGE seconds and the cache is kept under $FAIR_VALUE_DISK_CACHE_MAX_MB)'
+    )
+    parser.add_argument(
+        '--targets', choices=['auto', 'target', 'sector'], default='auto',
+        help="Rows to value: the 'Perusahaan_Target' sheet, every row of 'Perusahaan_Sektor', "
+             "or auto (the target sheet when it has rows, otherwise the sector sheet)"
+    )
+    parser.add_argument(
+        '--stream', action='store_true',
+        help="Read 'Perusahaan_Sektor' in chunks and keep only the sectors of the target rows, "
+             "so memory follows the size of those sectors instead of the file (implies --no-cache)"
+    )
+    parser.add_argument(
+        '--workers', type=int, default=default_workers(),
+        help='Processes for the valuation, one sector partition each ($FAIR_VALUE_WORKERS, default 1 = serial)'
+    )
+    parser.add_argument(
+        '--peers', type=int, metavar='K',
+        help="Value each company against its K nearest peers of the whole universe (market cap, revenue, "
+             "ROE, net profit margin) instead of its 'Sektor'; ignores --workers"
+    )
+    parser.add_argument(
+        '--sector-weight', type=float, default=0.0,
+        help='With --peers: extra distance, in standard deviations, for peers from another sector (default 0)'
+    )
+    parser.add_argument(
+        '--screen', metavar='QUERY',
+        help="Value only the rows of 'Perusahaan_Sektor' matching QUERY, e.g. \"P/E < 10 and ROE > 15 and P/B < sektor\" "
+             "(overrides --targets)"
+    )
+    parser.add_argument(
+        '--methods', default=','.join(DEFAULT_METHODS),
+        help=f"Comma-separated valuation methods, each adding its sector average, fair value and status columns "
+             f"and a vote to the recommendation (default {','.join(DEFAULT_METHODS)}; available: {', '.join(VALUATION_METHODS)})"
+    )
+    parser.add_argument(
+        '--report', metavar='FILE',
+        help='Also write a formatted .xlsx report: a summary sheet and one sheet per sector with colour-coded statuses '
+             '(streamed row by row, so memory does not grow with the number of companies)'
+    )
+    parser.add_argument(
+        '--profile', metavar='FILE',
+        help='Append per-stage timings and memory of this run to FILE as a JSON line'
+    )
+    return parser
+
+# Function to write the valuation results in the format implied by the file name
+def write_results(results, output):
+    """
+    Writes the results DataFrame to `output` (.csv, .parquet or .xlsx), or as CSV to stdout when `output` is None.
+    """
+    if output is None:
+        results.to_csv(sys.stdout, index=False)
+    elif output.lower().endswith('.csv'):
+        results.to_csv(output, index=False)
+    elif output.lower().endswith('.parquet'):
+        results.to_parquet(output, index=False)
+    elif output.lower().endswith('.xlsx'):
+        results.to_excel(output, sheet_name='Hasil_Valuasi', index=False)
+    else:
+        raise ValueError(f"Unsupported output type for '{output}'. Supported types: {', '.join(OUTPUT_EXTENSIONS)}")
+
+def main(argv=None):
+    parser = build_parser()
+    args = parser.parse_args(argv)
+    if args.peers is not None and args.stream:
+        parser.error('--peers searches the whole universe and cannot be combined with --stream')
+    if args.peers is not None and (args.peers < 1 or args.sector_weight < 0):
+        parser.error('--peers must be at least 1 and --sector-weight must not be negative')
+    try:
+        screen_conditions = parse_screen_query(args.screen) if args.screen is not None else None
+    except ValueError as e:
+        parser.error(f'invalid --screen query: {e}')
+    try:
+        methods = [method.key for method in resolve_methods([key.strip() for key in args.methods.split(',') if key.strip()])]
+    except ValueError as e:
+        parser.error(f'invalid --methods: {e}')
+    if args.report is not None and not args.report.lower().endswith('.xlsx'):
+        parser.error('--report must be an .xlsx file')
+    # The command line is one run per process, so it can start the tracer itself
+    profiler = StageProfiler(trace_memory=args.profile is not None and start_memory_tracing(), run_label='cli')
+
+    streamed = None
+    try:
+        with profiler.stage('ingest'):
+            if args.stream:
+                df_target = read_target_frame(args.input)
+                # Leave-one-out sector means only involve the target's own sector, so other sectors can be skipped
+                use_targets = args.targets == 'target' or (args.targets == 'auto' and not df_target.empty)
+                sectors = df_target['Sektor'].dropna().unique() if use_targets and 'Sektor' in df_target.columns else None
+                streamed = stream_sector_comparables(args.input, sectors)
+                df_sector = streamed.comparables
+            else:
+                read_frames = read_valuation_frames if args.no_cache else read_valuation_frames_cached
+                df_target, df_sector = read_frames(args.input)
+    except (OSError, ValueError) as e:
+        parser.error(f"failed to read '{args.input}': {e}")
+
+    # Type and validate both tables once; invalid rows are kept (their ratios are NaN) and reported together.
+    # Streamed comparables were typed chunk by chunk while they were read
+    with profiler.stage('ingest'):
+        typed_target = apply_schema(df_target)
+        if streamed is None:
+            typed_sector = apply_schema(df_sector)
+            df_sector, sector_issues = typed_sector.frame, typed_sector.issues
+        else:
+            sector_issues = streamed.issues
+    df_target = typed_target.frame
+    invalid_rows = len(typed_target.issues) + len(sector_issues)
+    if invalid_rows:
+        print(f"{invalid_rows} baris tidak valid (data kosong atau tidak terbaca):", file=sys.stderr)
+        for sheet, issues in ((TARGET_SHEET, typed_target.issues), (SECTOR_SHEET, sector_issues)):
+            for row in issues.head(20).itertuples(index=False):
+                print(f"  {sheet} baris {row.Baris} ({row.Ticker}): {row.Masalah}", file=sys.stderr)
+            if len(issues) > 20:
+                print(f"  {sheet}: ... dan {len(issues) - 20} baris lainnya", file=sys.stderr)
+
+    if screen_conditions is not None:
+        with profiler.stage('filter'):
+            df_targets = df_sector.iloc[ScreenIndex(df_sector).screen(screen_conditions)]
+    elif args.targets == 'target' or (args.targets == 'auto' and not df_target.empty):
+        df_targets = df_target
+    else:
+        df_targets = df_sector
+
+    if df_targets.empty:
+        parser.error('no companies to value in the selected rows')
+
+    with profiler.stage('fair_value'):
+        if args.peers is not None:
+            results = value_companies_with_peers(df_targets, df_sector, k=args.peers, sector_weight=args.sector_weight, methods=methods)
+        else:
+            results = value_companies_parallel(df_targets, df_sector, workers=args.workers, methods=methods)
+
+    try:
+        with profiler.stage('render'):
+            write_results(results, args.output)
+            if args.report is not None:
+                write_valuation_report(results, args.report)
+    except (OSError, ValueError) as e:
+        parser.error(str(e))
+
+    counts = results['Rekomendasi'].value_counts()
+    print(
+        f"{len(results)} perusahaan dinilai: "
+        + ', '.join(f"{label} {int(counts.get(label, 0))}" for label in ['BUY', 'HOLD', 'HOLD/SELL']),
+        file=sys.stderr
+    )
+    if args.profile:
+        profiler.finish(args.profile)
+    return 0
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,88 @@
+"""
+Batch valuation: every target company is valued against its own sector in one vectorized pass.
+"""
+import pandas as pd
+import numpy as np
+
+from fair_value.valuation import (
+    RATIO_COLUMNS,
+    calculate_key_ratios_vectorized,
+    classify_valuation_status,
+    get_investment_recommendation,
+    _numeric_column
+)
+from fair_value.sector_index import SectorIndex, normalize_sector
+from fair_value.methods import resolve_methods, method_multiples, method_contributions, method_fair_values, batch_result_columns
+
+BATCH_RESULT_COLUMNS = ['Ticker', 'Nama_Perusahaan', 'Sektor', 'Harga_Saham_Saat_Ini'] + RATIO_COLUMNS + [
+    'Rata-rata Sektor P/E', 'Rata-rata Sektor P/B', 'Jumlah Pembanding',
+    'Fair Value (P/E)', 'Fair Value (P/B)', 'Status (P/E)', 'Status (P/B)', 'Rekomendasi'
+]
+
+# Function to value many target companies against their sectors in one pass
+def value_companies_batch(targets_df, comparables_df, sector_index=None, methods=None):
+    """
+    Vectorized batch valuation.
+    For each target, sector averages are computed from the comparables in the same sector
+    (case-insensitive) excluding the target's own ticker, then the fair value and status of every
+    method in `methods` (keys of VALUATION_METHODS, default P/E and P/B) and the recommendation
+    voted over them are derived. Returns one row per target, columns as batch_result_columns(methods).
+    A prebuilt SectorIndex over `comparables_df` can be passed to reuse its sector totals.
+    """
+    methods = resolve_methods(methods)
+    method_keys = [method.key for method in methods]
+    if targets_df.empty:
+        return pd.DataFrame(columns=batch_result_columns(method_keys))
+
+    if sector_index is None:
+        sector_index = SectorIndex(comparables_df)
+
+    target_ratios = calculate_key_ratios_vectorized(targets_df)
+    target_sector = normalize_sector(targets_df['Sektor']).to_numpy() if 'Sektor' in targets_df.columns else np.full(len(targets_df), '')
+    target_ticker = targets_df['Ticker'].astype(str).to_numpy() if 'Ticker' in targets_df.columns else np.full(len(targets_df), '')
+
+    sector_means = np.full((len(targets_df), len(methods)), np.nan)
+    comparables_count = np.zeros(len(targets_df), dtype=int)
+    if not sector_index.totals.empty:
+        contributions = sector_index.contributions
+        # Multiples the sector index does not aggregate are summed here, with the same rules
+        extra_methods = [method.key for method in methods if method.ratio + ' sum' not in contributions.columns]
+        if extra_methods:
+            contributions = pd.concat([contributions, method_contributions(sector_index.comparables, extra_methods)], axis=1)
+        columns = ['n'] + [method.ratio + suffix for method in methods for suffix in (' sum', ' count')]
+        totals = contributions[['sector'] + columns].groupby('sector', sort=False).sum() if extra_methods else sector_index.totals[columns]
+        own_totals = contributions[['sector', 'ticker'] + columns].groupby(['sector', 'ticker']).sum()
+
+        # Leave the target itself out of its own sector average
+        target_keys = pd.MultiIndex.from_arrays([target_sector, target_ticker])
+        leave_one_out = totals.reindex(target_sector).fillna(0).to_numpy() - own_totals.reindex(target_keys).fillna(0).to_numpy()
+        leave_one_out = pd.DataFrame(leave_one_out, columns=columns)
+
+        comparables_count = leave_one_out['n'].to_numpy(dtype=int)
+        sums = leave_one_out[[method.ratio + ' sum' for method in methods]].to_numpy(dtype=float)
+        counts = leave_one_out[[method.ratio + ' count' for method in methods]].to_numpy(dtype=float)
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sector_means = np.where(counts > 0, sums / counts, np.nan)
+
+    current_price = _numeric_column(targets_df, 'Harga_Saham_Saat_Ini')
+    target_multiples = method_multiples(targets_df, method_keys).to_numpy(dtype=float)
+    fair_values = method_fair_values(current_price, target_multiples, sector_means, method_keys)
+    statuses = classify_valuation_status(current_price[:, np.newaxis], fair_values)
+
+    result = pd.DataFrame({
+        'Ticker': targets_df['Ticker'].to_numpy() if 'Ticker' in targets_df.columns else target_ticker,
+        'Nama_Perusahaan': targets_df['Nama_Perusahaan'].to_numpy() if 'Nama_Perusahaan' in targets_df.columns else '',
+        'Sektor': targets_df['Sektor'].to_numpy() if 'Sektor' in targets_df.columns else '',
+        'Harga_Saham_Saat_Ini': current_price,
+    })
+    for ratio in RATIO_COLUMNS:
+        result[ratio] = target_ratios[ratio].to_numpy(dtype=float)
+    for j, key in enumerate(method_keys):
+        result[f'Rata-rata Sektor {key}'] = sector_means[:, j]
+    result['Jumlah Pembanding'] = comparables_count
+    for j, key in enumerate(method_keys):
+        result[f'Fair Value ({key})'] = fair_values[:, j]
+    for j, key in enumerate(method_keys):
+        result[f'Status ({key})'] = statuses[:, j]
+    result['Rekomendasi'] = get_investment_recommendation(*statuses.T)
+    return result[batch_result_columns(method_keys)]
@@ -0,0 +1,166 @@
+"""
+Bounded in-memory cache shared by every session of the process.
+
+Parsed frames and sector aggregates are keyed by the content hash of the uploaded file, so
+analysts uploading the same file reuse one copy instead of parsing and aggregating it again.
+The cache is capped by number of entries and by estimated size, entries can expire after a
+time to live, and the least recently used entries are evicted first. Cached values are shared:
+callers must treat them as read-only.
+"""
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, namedtuple
+
+import pandas as pd
+import numpy as np
+
+# Limits of the shared cache, overridable through the environment
+CACHE_MAX_ENTRIES_ENV = 'FAIR_VALUE_CACHE_MAX_ENTRIES'
+CACHE_MAX_MB_ENV = 'FAIR_VALUE_CACHE_MAX_MB'
+CACHE_TTL_ENV = 'FAIR_VALUE_CACHE_TTL'
+DEFAULT_MAX_ENTRIES = 64
+DEFAULT_MAX_BYTES = 1024 * 2**20
+DEFAULT_TTL = 24 * 60 * 60
+
+CacheStats = namedtuple('CacheStats', ['hits', 'misses', 'evictions', 'expirations', 'entries', 'bytes', 'max_entries', 'max_bytes'])
+
+# Function to estimate the memory held by a cached value
+def estimate_size(value, _seen=None):
+    """
+    Approximate size in bytes: deep memory usage for pandas objects, nbytes for arrays,
+    the sum of the parts for tuples, lists, dicts and objects with a __dict__ (e.g. SectorIndex).
+    An object reached twice is counted once, and attributes an object lists in `_shared_state`
+    (frames it was given and does not own, e.g. the comparables of SectorIndex) are not counted.
+    """
+    seen = set() if _seen is None else _seen
+    if id(value) in seen:
+        return 0
+    seen.add(id(value))
+
+    if isinstance(value, (pd.DataFrame, pd.Series, pd.Index)):
+        return int(value.memory_usage(deep=True).sum()) if isinstance(value, pd.DataFrame) else int(value.memory_usage(deep=True))
+    if isinstance(value, np.ndarray):
+        return int(value.nbytes)
+    if isinstance(value, (tuple, list)):
+        return sys.getsizeof(value) + sum(estimate_size(item, seen) for item in value)
+    if isinstance(value, dict):
+        return sys.getsizeof(value) + sum(estimate_size(key, seen) + estimate_size(item, seen) for key, item in value.items())
+    if hasattr(value, '__dict__') and not isinstance(value, type):
+        shared = getattr(value, '_shared_state', ())
+        attributes = vars(value)
+        return sys.getsizeof(value) + sys.getsizeof(attributes) + sum(
+            estimate_size(name, seen) + estimate_size(item, seen) for name, item in attributes.items() if name not in shared
+        )
+    return sys.getsizeof(value)
+
+class LRUCache:
+    """
+    Thread-safe least-recently-used cache with limits on entries and estimated bytes and an optional
+    time to live (seconds since the entry was stored). Values larger than `max_bytes` are not stored.
+    """
+
+    def __init__(self, max_entries=DEFAULT_MAX_ENTRIES, max_bytes=DEFAULT_MAX_BYTES, ttl=None, clock=time.monotonic):
+        if max_entries < 1 or max_bytes < 1:
+            raise ValueError('max_entries and max_bytes must be at least 1')
+        if ttl is not None and ttl <= 0:
+            raise ValueError('ttl must be positive')
+        self.max_entries = max_entries
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._clock = clock
+        self._entries = OrderedDict() # key -> (value, size, stored_at)
+        self._bytes = 0
+        self._lock = threading.RLock()
+        self.hits = self.misses = self.evictions = self.expirations = 0
+
+    def __len__(self):
+        with self._lock:
+            return len(self._entries)
+
+    def __contains__(self, key):
+        with self._lock:
+            return key in self._entries and not self._expired(key)
+
+    def _expired(self, key):
+        return self.ttl is not None and self._clock() - self._entries[key][2] > self.ttl
+
+    def _remove(self, key):
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+
+    def get(self, key, default=None):
+        """The cached value of `key` (now the most recently used), or `default` on a miss."""
+        with self._lock:
+            if key in self._entries and self._expired(key):
+                self._remove(key)
+                self.expirations += 1
+            if key not in self._entries:
+                self.misses += 1
+                return default
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return self._entries[key][0]
+
+    def put(self, key, value, size=None):
+        """
+        Stores `value` under `key` and evicts the least recently used entries until both limits hold.
+        Returns False (and stores nothing) when the value alone exceeds max_bytes.
+        """
+        size = estimate_size(value) if size is None else size
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            if size > self.max_bytes:
+                return False
+            self._entries[key] = (value, size, self._clock())
+            self._bytes += size
+            while len(self._entries) > self.max_entries or self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+            return True
+
+    def get_or_compute(self, key, compute):
+        """
+        The cached value of `key`, or the result of `compute()` which is then stored.
+        Exceptions from `compute` propagate and nothing is cached.
+        """
+        missing = object()
+        value = self.get(key, missing)
+        if value is missing:
+            value = compute()
+            self.put(key, value)
+        return value
+
+    def clear(self):
+        """Drops every entry (the hit/miss counters are kept)."""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+
+    def stats(self):
+        """Current CacheStats."""
+        with self._lock:
+            return CacheStats(self.hits, self.misses, self.evictions, self.expirations,
+                              len(self._entries), self._bytes, self.max_entries, self.max_bytes)
+
+_shared_cache = None
+_shared_cache_lock = threading.Lock()
+
+# Function to get the process-wide cache, created on first use from the environment limits
+def shared_cache():
+    """
+    The LRUCache shared by every session of this process. Limits come from $FAIR_VALUE_CACHE_MAX_ENTRIES,
+    $FAIR_VALUE_CACHE_MAX_MB and $FAIR_VALUE_CACHE_TTL (seconds, 0 disables expiry).
+    """
+    global _shared_cache
+    with _shared_cache_lock:
+        if _shared_cache is None:
+            ttl = float(os.environ.get(CACHE_TTL_ENV, DEFAULT_TTL))
+            _shared_cache = LRUCache(
+                max_entries=int(os.environ.get(CACHE_MAX_ENTRIES_ENV, DEFAULT_MAX_ENTRIES)),
+                max_bytes=int(float(os.environ.get(CACHE_MAX_MB_ENV, DEFAULT_MAX_BYTES / 2**20)) * 2**20),
+                ttl=ttl if ttl > 0 else None
+            )
+        return _shared_cache
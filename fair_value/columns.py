@@ -0,0 +1,22 @@
+"""
+Column names and the column reader shared by the valuation, statistics and method modules.
+Nothing in this module imports the rest of the package, so every module can import it at load time.
+"""
+import pandas as pd
+import numpy as np
+
+# Ratio columns produced by the vectorized ratio engine, in the same order as calculate_key_ratios
+RATIO_COLUMNS = ['Net Profit Margin (%)', 'ROE (%)', 'P/E Ratio', 'P/B Ratio']
+
+# Function to read a column as a float array (missing or non-numeric values become NaN)
+def _numeric_column(df, column):
+    """
+    Returns the given column as a float64 NumPy array, or an all-NaN array if the column is missing.
+    """
+    if column not in df.columns:
+        return np.full(len(df), np.nan)
+    values = df[column]
+    # Columns typed by apply_schema are already numeric and skip the parse
+    if not pd.api.types.is_numeric_dtype(values):
+        values = pd.to_numeric(values, errors='coerce')
+    return values.to_numpy(dtype=float, na_value=np.nan)
@@ -0,0 +1,46 @@
+"""
+Background execution of the heavy numeric steps on a shared thread pool.
+
+The dashboard submits its slow steps as soon as their inputs are known and keeps writing the
+page; each result is collected where it is shown:
+- the history sheet is parsed while the main sheets are read;
+- the sensitivity grids, the historical fair values and the Plotly figures (comparison chart,
+  gauges, heatmaps, batch gauge grid) are built while the cards and tables are written.
+The NumPy and file-parsing work releases the GIL for most of its run time, so those tasks overlap
+with each other and with the script thread; the figure builds are pure Python and mostly move
+off the script thread's critical path. Tasks must not call Streamlit: only the script thread
+writes to the page.
+"""
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+# Number of worker threads of the shared pool, overridable through the environment
+THREADS_ENV = 'FAIR_VALUE_THREADS'
+DEFAULT_THREADS = min(8, (os.cpu_count() or 1) + 4)
+
+_shared_executor = None
+_shared_executor_lock = threading.Lock()
+
+# Function to get the process-wide thread pool, created on first use
+def shared_executor():
+    """
+    The ThreadPoolExecutor shared by every session of this process ($FAIR_VALUE_THREADS workers).
+    """
+    global _shared_executor
+    with _shared_executor_lock:
+        if _shared_executor is None:
+            _shared_executor = ThreadPoolExecutor(
+                max_workers=max(1, int(os.environ.get(THREADS_ENV, DEFAULT_THREADS))),
+                thread_name_prefix='fair_value'
+            )
+        return _shared_executor
+
+# Function to start several tasks in the background
+def submit_tasks(tasks, executor=None):
+    """
+    Submits every callable of the `tasks` dict (name -> callable without arguments) and returns
+    {name: Future}. Results are read with future.result(), which re-raises the task's exception.
+    """
+    executor = executor or shared_executor()
+    return {name: executor.submit(task) for name, task in tasks.items()}
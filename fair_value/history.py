@@ -0,0 +1,251 @@
+"""
+Multi-period fundamentals: an append-only columnar store of (ticker, period) rows and
+historical fair values computed from it.
+
+The long-format sheet 'Perusahaan_Historis' has one row per company and period
+(Ticker, Periode, Net_Income, Pendapatan, Ekuitas, Harga, optionally Jumlah_Saham_Beredar).
+Sector and share count come from the 'Perusahaan_Sektor'/'Perusahaan_Target' rows of the same ticker.
+"""
+import os
+
+import pandas as pd
+import numpy as np
+
+from fair_value.ingest import _write_parquet_atomic
+from fair_value.valuation import calculate_key_ratios_vectorized, classify_valuation_status
+from fair_value.methods import method_fair_values
+from fair_value.sector_index import normalize_sector, sector_contributions
+
+HISTORY_COLUMNS = ['Ticker', 'Periode', 'Net_Income', 'Pendapatan', 'Ekuitas', 'Harga']
+HISTORY_VALUE_COLUMNS = ['Net_Income', 'Pendapatan', 'Ekuitas', 'Harga', 'Jumlah_Saham_Beredar']
+
+# Periods are stored as quarterly ordinals
+PERIOD_FREQ = 'Q'
+
+# Number of periods in the rolling sector multiples (four quarters)
+DEFAULT_WINDOW = 4
+
+HISTORY_RESULT_COLUMNS = ['Ticker', 'Periode', 'Tanggal', 'Sektor', 'Harga', 'P/E Ratio', 'P/B Ratio',
+                          'Rata-rata Sektor P/E', 'Rata-rata Sektor P/B', 'Fair Value (P/E)', 'Fair Value (P/B)',
+                          'Status (P/E)', 'Status (P/B)']
+
+# Function to turn the 'Periode' column into quarterly period ordinals
+def parse_periods(values):
+    """
+    Accepts '2024Q1', dates ('2024-03-31') or Excel dates. Returns int64 ordinals of quarterly
+    periods, with -1 where the value cannot be parsed.
+    """
+    values = pd.Series(values)
+    if isinstance(values.dtype, pd.PeriodDtype):
+        periods = values.dt.asfreq(PERIOD_FREQ)
+    else:
+        dates = pd.to_datetime(values.astype(str).str.strip(), errors='coerce', format='mixed')
+        periods = dates.dt.to_period(PERIOD_FREQ)
+    return np.where(periods.isna().to_numpy(), -1, periods.array.asi8).astype(np.int64)
+
+class PeriodStore:
+    """
+    Append-only columnar store of per-period fundamentals indexed by (ticker, period).
+
+    Rows are kept as chunks of NumPy columns (ticker codes, period ordinals, float values).
+    append() only adds rows for new (ticker, period) keys or keys whose values changed; existing
+    chunks are never rewritten, and when the same key appears twice the latest chunk wins.
+    With a `directory`, every append is also written as a new Parquet part file.
+    """
+
+    def __init__(self, directory=None):
+        self.directory = directory
+        self.tickers = []
+        self._ticker_codes = {}
+        self._chunks = []
+        self._frame = None
+
+        if directory is not None and os.path.isdir(directory):
+            for name in sorted(os.listdir(directory)):
+                if name.startswith('part-') and name.endswith('.parquet'):
+                    self._add_chunk(pd.read_parquet(os.path.join(directory, name)))
+
+    def __len__(self):
+        return len(self.to_frame())
+
+    def _encode_tickers(self, tickers):
+        """Codes of `tickers`, adding unseen tickers at the end of the ticker list."""
+        codes = np.empty(len(tickers), dtype=np.int32)
+        for i, ticker in enumerate(tickers):
+            code = self._ticker_codes.get(ticker)
+            if code is None:
+                code = self._ticker_codes[ticker] = len(self.tickers)
+                self.tickers.append(ticker)
+            codes[i] = code
+        return codes
+
+    def _add_chunk(self, part):
+        """Adds a part (Ticker, period ordinal, value columns) as a new chunk."""
+        chunk = {
+            'ticker': self._encode_tickers(part['Ticker'].astype(str).tolist()),
+            'period': part['period'].to_numpy(dtype=np.int64)
+        }
+        for column in HISTORY_VALUE_COLUMNS:
+            chunk[column] = part[column].to_numpy(dtype=float)
+        self._chunks.append(chunk)
+        self._frame = None
+
+    def append(self, history_df):
+        """
+        Adds the rows of a long-format history frame. Rows without a ticker or a parseable period are
+        skipped, as are rows identical to what the store already holds. Returns the number of rows appended.
+        Raises ValueError when a required column is missing.
+        """
+        missing = [column for column in HISTORY_COLUMNS if column not in history_df.columns]
+        if missing:
+            raise ValueError(f"Missing history columns: {', '.join(missing)}")
+
+        part = pd.DataFrame({'Ticker': history_df['Ticker'].astype(str).str.strip(), 'period': parse_periods(history_df['Periode'])})
+        for column in HISTORY_VALUE_COLUMNS:
+            part[column] = pd.to_numeric(history_df[column], errors='coerce').to_numpy(dtype=float) if column in history_df.columns else np.nan
+        part = part[(part['period'] >= 0) & history_df['Ticker'].notna().to_numpy()]
+        part = part.drop_duplicates(['Ticker', 'period'], keep='last')
+
+        # Only keys that are new or whose values differ from the stored ones are appended
+        current = self.to_frame()
+        if not current.empty:
+            keys = pd.MultiIndex.from_arrays([part['Ticker'], part['period']])
+            new_values = part[HISTORY_VALUE_COLUMNS].to_numpy(dtype=float)
+            old_values = current.reindex(keys).to_numpy(dtype=float)
+            same = ((new_values == old_values) | (np.isnan(new_values) & np.isnan(old_values))).all(axis=1)
+            part = part[~(same & keys.isin(current.index))]
+
+        if part.empty:
+            return 0
+
+        part = part.reset_index(drop=True)
+        if self.directory is not None:
+            os.makedirs(self.directory, exist_ok=True)
+            _write_parquet_atomic(part, os.path.join(self.directory, f'part-{len(self._chunks):06d}.parquet'))
+        self._add_chunk(part)
+        return len(part)
+
+    def to_frame(self):
+        """
+        The current rows (latest value per key) as a DataFrame indexed by (Ticker, period ordinal),
+        sorted by ticker and period.
+        """
+        if self._frame is not None:
+            return self._frame
+        if not self._chunks:
+            self._frame = pd.DataFrame(columns=HISTORY_VALUE_COLUMNS, dtype=float,
+                                       index=pd.MultiIndex.from_arrays([[], []], names=['Ticker', 'period']))
+            return self._frame
+
+        codes = np.concatenate([chunk['ticker'] for chunk in self._chunks])
+        frame = pd.DataFrame({
+            'Ticker': np.asarray(self.tickers, dtype=object)[codes],
+            'period': np.concatenate([chunk['period'] for chunk in self._chunks])
+        })
+        for column in HISTORY_VALUE_COLUMNS:
+            frame[column] = np.concatenate([chunk[column] for chunk in self._chunks])
+
+        frame = frame.drop_duplicates(['Ticker', 'period'], keep='last')
+        self._frame = frame.sort_values(['Ticker', 'period'], kind='mergesort').set_index(['Ticker', 'period'])
+        return self._frame
+
+# Function to compute historical fair values for every company and period
+def historical_fair_values(history, companies_df, window=DEFAULT_WINDOW):
+    """
+    Fair value series from a PeriodStore, a PeriodStore.to_frame() snapshot or a long-format history DataFrame.
+    - Each company-period gets P/E and P/B from its own price, earnings, equity and share count.
+    - The sector multiple of a period is the mean over the last `window` periods of the sector's
+      usable P/E (P/B) values, leaving the company itself out, as in batch valuation.
+    - The fair value is price x sector multiple / own multiple; statuses use the usual bands.
+    Sector and missing share counts are taken from `companies_df` by ticker. Companies with no
+    sector there have no sector multiple. Returns one row per (ticker, period) in HISTORY_RESULT_COLUMNS.
+    """
+    if window < 1:
+        raise ValueError('window must be at least 1')
+    if isinstance(history, PeriodStore):
+        history = history.to_frame()
+    elif list(history.index.names) != ['Ticker', 'period']:
+        store = PeriodStore()
+        store.append(history)
+        history = store.to_frame()
+    frame = history.reset_index()
+    if frame.empty:
+        return pd.DataFrame(columns=HISTORY_RESULT_COLUMNS)
+
+    # Sector and share count of each ticker from the latest snapshot
+    if not companies_df.empty and 'Ticker' in companies_df.columns:
+        snapshot = companies_df.assign(Ticker=companies_df['Ticker'].astype(str).str.strip()).drop_duplicates('Ticker').set_index('Ticker')
+    else:
+        snapshot = pd.DataFrame(columns=['Sektor', 'Jumlah_Saham_Beredar'])
+    sector = snapshot['Sektor'].reindex(frame['Ticker']).to_numpy() if 'Sektor' in snapshot.columns else np.full(len(frame), np.nan)
+    shares = frame['Jumlah_Saham_Beredar'].to_numpy(dtype=float)
+    if 'Jumlah_Saham_Beredar' in snapshot.columns:
+        snapshot_shares = pd.to_numeric(snapshot['Jumlah_Saham_Beredar'], errors='coerce').reindex(frame['Ticker']).to_numpy(dtype=float)
+        shares = np.where(np.isnan(shares), snapshot_shares, shares)
+
+    companies = pd.DataFrame({
+        'Ticker': frame['Ticker'].to_numpy(),
+        'Sektor': sector,
+        'Harga_Saham_Saat_Ini': frame['Harga'].to_numpy(dtype=float),
+        'Jumlah_Saham_Beredar': shares,
+        'Net_Income_Terbaru': frame['Net_Income'].to_numpy(dtype=float),
+        'Total_Pendapatan_Terbaru': frame['Pendapatan'].to_numpy(dtype=float),
+        'Total_Ekuitas_Terbaru': frame['Ekuitas'].to_numpy(dtype=float)
+    })
+    ratios = calculate_key_ratios_vectorized(companies)
+    contributions = sector_contributions(companies, ratios)
+    value_columns = ['P/E Ratio sum', 'P/E Ratio count', 'P/B Ratio sum', 'P/B Ratio count']
+    values = contributions[value_columns].to_numpy(dtype=float)
+
+    # Rows without a known sector do not count towards any sector
+    has_sector = ~pd.isna(sector)
+    values[~has_sector] = 0.0
+    sector_codes, sector_keys = pd.factorize(pd.Series(np.where(has_sector, normalize_sector(pd.Series(sector)).to_numpy(), '')))
+    period = frame['period'].to_numpy(dtype=np.int64)
+    first_period = period.min()
+    period_index = period - first_period
+    n_periods = period_index.max() + 1
+
+    # Sector rolling sums: dense (period, sector) table, cumulative over periods
+    sector_table = np.zeros((n_periods, len(sector_keys), len(value_columns)))
+    np.add.at(sector_table, (period_index, sector_codes), values)
+    sector_cumulative = np.cumsum(sector_table, axis=0)
+    sector_rolling = sector_cumulative.copy()
+    sector_rolling[window:] -= sector_cumulative[:-window]
+    sector_window = sector_rolling[period_index, sector_codes]
+
+    # The company's own rolling sums over the same window, from its sorted rows
+    ticker_codes = pd.factorize(frame['Ticker'])[0].astype(np.int64)
+    row_key = ticker_codes * (n_periods + window) + period_index
+    own_cumulative = np.cumsum(values, axis=0)
+    window_start = np.searchsorted(row_key, row_key - window + 1, side='left')
+    own_window = own_cumulative - np.where(window_start[:, None] > 0, own_cumulative[np.maximum(window_start - 1, 0)], 0.0)
+
+    leave_one_out = sector_window - own_window
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sector_pe = np.where(leave_one_out[:, 1] > 0, leave_one_out[:, 0] / leave_one_out[:, 1], np.nan)
+        sector_pb = np.where(leave_one_out[:, 3] > 0, leave_one_out[:, 2] / leave_one_out[:, 3], np.nan)
+    sector_pe[~has_sector] = np.nan
+    sector_pb[~has_sector] = np.nan
+
+    price = companies['Harga_Saham_Saat_Ini'].to_numpy()
+    fair_values = method_fair_values(price, ratios[['P/E Ratio', 'P/B Ratio']].to_numpy(dtype=float),
+                                     np.column_stack([sector_pe, sector_pb]), ['P/E', 'P/B'])
+    fair_value_pe, fair_value_pb = fair_values[:, 0], fair_values[:, 1]
+    periods = pd.PeriodIndex.from_ordinals(period, freq=PERIOD_FREQ)
+
+    return pd.DataFrame({
+        'Ticker': frame['Ticker'].to_numpy(),
+        'Periode': periods.astype(str),
+        'Tanggal': periods.to_timestamp(how='end').normalize(),
+        'Sektor': sector,
+        'Harga': price,
+        'P/E Ratio': ratios['P/E Ratio'].to_numpy(dtype=float),
+        'P/B Ratio': ratios['P/B Ratio'].to_numpy(dtype=float),
+        'Rata-rata Sektor P/E': sector_pe,
+        'Rata-rata Sektor P/B': sector_pb,
+        'Fair Value (P/E)': fair_value_pe,
+        'Fair Value (P/B)': fair_value_pb,
+        'Status (P/E)': classify_valuation_status(price, fair_value_pe),
+        'Status (P/B)': classify_valuation_status(price, fair_value_pb)
+    })[HISTORY_RESULT_COLUMNS]
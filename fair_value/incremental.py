@@ -0,0 +1,192 @@
+"""
+Diff-aware recomputation for re-uploaded workbooks.
+
+Each row is identified by its ticker (plus its occurrence number for duplicated tickers) and
+fingerprinted with a hash of its input columns. When a new version of the data arrives, only
+added or changed rows get their ratios recomputed, and each sector's running sums and counts
+are corrected by subtracting the old contributions and adding the new ones.
+"""
+from collections import namedtuple
+import pandas as pd
+import numpy as np
+
+from fair_value.valuation import calculate_key_ratios_vectorized
+from fair_value.sector_index import SectorIndex, normalize_sector, sector_contributions, sector_totals
+from fair_value.batch import value_companies_batch
+from fair_value.methods import GROWTH_COLUMN, resolve_methods, method_contributions
+
+# Columns whose values determine the valuation of a row
+INPUT_COLUMNS = ['Ticker', 'Nama_Perusahaan', 'Sektor', 'Harga_Saham_Saat_Ini', 'Jumlah_Saham_Beredar',
+                 'Net_Income_Terbaru', 'Total_Pendapatan_Terbaru', 'Total_Ekuitas_Terbaru']
+
+ChangeSummary = namedtuple('ChangeSummary', ['added', 'removed', 'changed', 'sectors'])
+
+# Function to build a unique key for every row
+def row_keys(df):
+    """
+    'TICKER#n' where n is the occurrence number of the ticker, so duplicated tickers stay distinct.
+    Falls back to the row position when there is no 'Ticker' column.
+    """
+    if 'Ticker' not in df.columns:
+        return pd.Index([f'#{i}' for i in range(len(df))])
+    tickers = df['Ticker'].astype(str)
+    occurrence = tickers.groupby(tickers, sort=False).cumcount().astype(str)
+    return pd.Index((tickers + '#' + occurrence).to_numpy())
+
+# Function to fingerprint the input columns of every row
+def row_hashes(df):
+    """
+    uint64 hash per row over INPUT_COLUMNS and the optional growth column used by PEG
+    (missing columns are ignored), indexed by row_keys.
+    """
+    columns = [column for column in INPUT_COLUMNS + [GROWTH_COLUMN] if column in df.columns]
+    hashes = pd.util.hash_pandas_object(df[columns], index=False)
+    return pd.Series(hashes.to_numpy(), index=row_keys(df))
+
+class IncrementalSectorState:
+    """
+    Comparables, their ratios and per-sector running sums/counts, kept up to date across uploads.
+    """
+
+    def __init__(self, comparables_df):
+        self._set_full(comparables_df)
+
+    def _set_full(self, comparables_df):
+        """Computes everything from scratch."""
+        self.comparables = comparables_df
+        self.hashes = row_hashes(comparables_df)
+        keys = self.hashes.index
+        self.ratios = calculate_key_ratios_vectorized(comparables_df).set_axis(keys)
+        if comparables_df.empty or 'Sektor' not in comparables_df.columns:
+            self.contributions = pd.DataFrame()
+            self.totals = pd.DataFrame()
+            return
+        self.contributions = sector_contributions(comparables_df, self.ratios).set_axis(keys)
+        self.totals = sector_totals(self.contributions)
+
+    def update(self, comparables_df):
+        """
+        Applies a new version of the comparables. Only added/changed rows get their ratios computed,
+        and sector totals are adjusted by the difference. Returns a ChangeSummary of row keys and
+        the normalized sectors whose aggregates changed.
+        """
+        new_hashes = row_hashes(comparables_df)
+        if self.contributions.empty or comparables_df.empty or 'Sektor' not in comparables_df.columns:
+            old_sectors = set(self.totals.index)
+            self._set_full(comparables_df)
+            return ChangeSummary(list(new_hashes.index), [], [], old_sectors | set(self.totals.index))
+
+        old_hashes = self.hashes
+        added = new_hashes.index.difference(old_hashes.index, sort=False)
+        removed = old_hashes.index.difference(new_hashes.index, sort=False)
+        common = new_hashes.index.intersection(old_hashes.index, sort=False)
+        changed = common[new_hashes.loc[common].to_numpy() != old_hashes.loc[common].to_numpy()]
+
+        stale = removed.append(changed)
+        fresh = added.append(changed)
+
+        # Recompute ratios and contributions for the fresh rows only
+        fresh_rows = comparables_df.iloc[new_hashes.index.get_indexer(fresh)]
+        fresh_ratios = calculate_key_ratios_vectorized(fresh_rows).set_axis(fresh)
+        fresh_contributions = sector_contributions(fresh_rows, fresh_ratios).set_axis(fresh)
+        stale_contributions = self.contributions.loc[stale]
+
+        unchanged = self.ratios.index.difference(stale, sort=False)
+        self.ratios = pd.concat([self.ratios.loc[unchanged], fresh_ratios]).reindex(new_hashes.index)
+        self.contributions = pd.concat([self.contributions.loc[unchanged], fresh_contributions]).reindex(new_hashes.index)
+
+        # Running sums and counts: remove the old contributions, add the new ones
+        totals = self.totals.sub(sector_totals(stale_contributions), fill_value=0)
+        totals = totals.add(sector_totals(fresh_contributions), fill_value=0)
+        totals = totals[totals['rows'] > 0]
+
+        # inf - inf leaves NaN in a running sum; rebuild those few sectors from their rows
+        broken = totals.index[~np.isfinite(totals.to_numpy(dtype=float)).all(axis=1)]
+        if len(broken):
+            totals.loc[broken] = sector_totals(self.contributions[self.contributions['sector'].isin(broken)]).loc[broken]
+
+        self.totals = totals.astype(self.contributions.drop(columns=['sector', 'ticker']).dtypes.to_dict())
+        self.hashes = new_hashes
+        self.comparables = comparables_df
+
+        sectors = set(stale_contributions['sector']) | set(fresh_contributions['sector'])
+        return ChangeSummary(list(added), list(removed), list(changed), sectors)
+
+    def sector_index(self):
+        """
+        A SectorIndex over the current comparables that reuses the maintained ratios and totals.
+        """
+        if self.contributions.empty:
+            return SectorIndex(self.comparables)
+        return SectorIndex(
+            self.comparables,
+            ratios=self.ratios.set_axis(self.comparables.index),
+            contributions=self.contributions.set_axis(self.comparables.index),
+            totals=self.totals
+        )
+
+class IncrementalBatchValuation:
+    """
+    Batch valuation results kept up to date across uploads. A target is revalued only if its
+    own row changed or the sums/counts of its sector differ from the ones used last time.
+    `methods` are the valuation methods of the results (default P/E and P/B).
+    """
+
+    def __init__(self, methods=None):
+        self.methods = [method.key for method in resolve_methods(methods)]
+        self.hashes = pd.Series([], dtype='uint64')
+        self.totals = pd.DataFrame()
+        self.results = None
+
+    def _tracked_totals(self, sector_index):
+        """
+        The sector index totals, plus the per-sector sums and counts of the multiples it does not
+        aggregate (e.g. P/S), so a change that only moves those still marks the sector as changed.
+        """
+        extra_methods = [method.key for method in resolve_methods(self.methods) if method.ratio + ' sum' not in sector_index.totals.columns]
+        if not extra_methods or sector_index.totals.empty:
+            return sector_index.totals
+        extra = method_contributions(sector_index.comparables, extra_methods).set_axis(sector_index.sector_keys.index)
+        return pd.concat([sector_index.totals, extra.groupby(sector_index.sector_keys.to_numpy(), sort=False).sum()], axis=1)
+
+    def update(self, targets_df, sector_index):
+        """
+        Returns (results, number of targets revalued) for `targets_df` against `sector_index`.
+        """
+        new_hashes = row_hashes(targets_df)
+        tracked_totals = self._tracked_totals(sector_index)
+        if self.results is None or targets_df.empty:
+            revalued = len(targets_df)
+            self.results = value_companies_batch(targets_df, sector_index.comparables, sector_index=sector_index,
+                                                 methods=self.methods).set_axis(new_hashes.index)
+        else:
+            target_sectors = normalize_sector(targets_df['Sektor']).to_numpy() if 'Sektor' in targets_df.columns else np.full(len(targets_df), '')
+            known = new_hashes.index.isin(self.hashes.index)
+            dirty = ~known | np.isin(target_sectors, list(_changed_sectors(self.totals, tracked_totals)))
+            known_keys = new_hashes.index[known]
+            dirty[known] |= new_hashes.loc[known_keys].to_numpy() != self.hashes.loc[known_keys].to_numpy()
+
+            revalued_results = value_companies_batch(targets_df.iloc[np.flatnonzero(dirty)], sector_index.comparables,
+                                                     sector_index=sector_index, methods=self.methods)
+            revalued_results = revalued_results.set_axis(new_hashes.index[dirty])
+            kept = self.results.reindex(new_hashes.index[~dirty])
+            self.results = pd.concat([kept, revalued_results]).reindex(new_hashes.index)
+            revalued = int(dirty.sum())
+
+        self.hashes = new_hashes
+        self.totals = tracked_totals.copy()
+        return self.results.reset_index(drop=True), revalued
+
+# Function to find the sectors whose sums/counts differ between two totals tables
+def _changed_sectors(previous_totals, current_totals):
+    """
+    Sector keys that were added, removed or have any different sum/count.
+    """
+    if previous_totals.empty or current_totals.empty:
+        return set(previous_totals.index) | set(current_totals.index)
+
+    sectors = previous_totals.index.union(current_totals.index)
+    previous = previous_totals.reindex(sectors)
+    current = current_totals.reindex(sectors, columns=previous.columns)
+    same = (previous == current) | (previous.isna() & current.isna())
+    return set(sectors[~same.all(axis=1).to_numpy()])
@@ -0,0 +1,228 @@
+"""
+Loading of valuation input files (.xlsx, .csv, .parquet, .feather) into DataFrames,
+with an on-disk Parquet cache keyed by the file's content hash.
+
+Retention of the disk cache: an entry is removed once it has not been read or written for
+$FAIR_VALUE_DISK_CACHE_MAX_AGE seconds (default 7 days), and the least recently used entries are
+removed while the cache holds more than $FAIR_VALUE_DISK_CACHE_MAX_MB megabytes (default 256).
+Both limits are applied after every write, so uploaded data is not kept on disk indefinitely.
+"""
+import hashlib
+import io
+import os
+import re
+import shutil
+import tempfile
+import time
+import pandas as pd
+
+TARGET_SHEET = 'Perusahaan_Target'
+SECTOR_SHEET = 'Perusahaan_Sektor'
+HISTORY_SHEET = 'Perusahaan_Historis'
+
+SUPPORTED_EXTENSIONS = ('.xlsx', '.csv', '.parquet', '.feather')
+
+# Bump when the parsing rules change so stale cache entries are not reused
+CACHE_VERSION = 1
+CACHE_DIR_ENV = 'FAIR_VALUE_CACHE_DIR'
+
+# Retention limits of the disk cache, overridable through the environment
+DISK_CACHE_MAX_MB_ENV = 'FAIR_VALUE_DISK_CACHE_MAX_MB'
+DISK_CACHE_MAX_AGE_ENV = 'FAIR_VALUE_DISK_CACHE_MAX_AGE'
+DEFAULT_DISK_CACHE_MAX_BYTES = 256 * 2**20
+DEFAULT_DISK_CACHE_MAX_AGE = 7 * 24 * 60 * 60
+
+# Name of a cache entry directory: content hash and source extension
+_CACHE_ENTRY_NAME = re.compile(r'^[0-9a-f]{64}\.[a-z]+$')
+
+# Function to work out the file extension of a path or an uploaded file object
+def _file_extension(source, file_name=None):
+    """
+    Returns the lower-case extension from `file_name`, the source's `name` attribute or the path itself.
+    """
+    name = file_name or getattr(source, 'name', None) or (source if isinstance(source, (str, os.PathLike)) else '')
+    return os.path.splitext(str(name))[1].lower()
+
+# Function to read the target and comparable companies from any supported file
+def read_valuation_frames(source, file_name=None):
+    """
+    Reads target and comparable company data from a path or file-like object.
+    - .xlsx: the 'Perusahaan_Target' and 'Perusahaan_Sektor' sheets (missing sheets become empty DataFrames).
+    - .csv / .parquet / .feather: a single table, treated as the 'Perusahaan_Sektor' universe with no target rows.
+    Returns a tuple (df_target, df_sector). Raises ValueError for unsupported file types.
+    """
+    extension = _file_extension(source, file_name)
+
+    if extension == '.xlsx':
+        xls = pd.ExcelFile(source)
+        df_target = pd.read_excel(xls, sheet_name=TARGET_SHEET) if TARGET_SHEET in xls.sheet_names else pd.DataFrame()
+        df_sector = pd.read_excel(xls, sheet_name=SECTOR_SHEET) if SECTOR_SHEET in xls.sheet_names else pd.DataFrame()
+        return df_target, df_sector
+
+    if extension == '.csv':
+        return pd.DataFrame(), pd.read_csv(source)
+
+    if extension == '.parquet':
+        return pd.DataFrame(), pd.read_parquet(source)
+
+    if extension == '.feather':
+        return pd.DataFrame(), pd.read_feather(source)
+
+    raise ValueError(f"Unsupported file type '{extension}'. Supported types: {', '.join(SUPPORTED_EXTENSIONS)}")
+
+# Function to read the optional long-format history (one row per company and period)
+def read_history_frame(source, file_name=None):
+    """
+    Reads multi-period fundamentals from a path or file-like object.
+    - .xlsx: the 'Perusahaan_Historis' sheet (an empty DataFrame when the workbook has none).
+    - .csv / .parquet / .feather: the whole table.
+    Raises ValueError for unsupported file types.
+    """
+    extension = _file_extension(source, file_name)
+
+    if extension == '.xlsx':
+        xls = pd.ExcelFile(source)
+        return pd.read_excel(xls, sheet_name=HISTORY_SHEET) if HISTORY_SHEET in xls.sheet_names else pd.DataFrame()
+
+    if extension in ('.csv', '.parquet', '.feather'):
+        return read_valuation_frames(source, file_name)[1]
+
+    raise ValueError(f"Unsupported file type '{extension}'. Supported types: {', '.join(SUPPORTED_EXTENSIONS)}")
+
+# Function to check whether a file holds a single table rather than the two-sheet workbook
+def is_single_table_source(source, file_name=None):
+    """
+    True for .csv, .parquet and .feather inputs, which carry no 'Perusahaan_Target' rows.
+    """
+    return _file_extension(source, file_name) in ('.csv', '.parquet', '.feather')
+
+# Function to get the raw bytes of a path or file-like object
+def _read_source_bytes(source):
+    """
+    Returns the full content of `source` as bytes without moving the position of file-like objects.
+    """
+    if isinstance(source, (str, os.PathLike)):
+        with open(source, 'rb') as f:
+            return f.read()
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+
+    position = source.tell()
+    source.seek(0)
+    data = source.read()
+    source.seek(position)
+    return data
+
+# Function to compute the cache key of an input file
+def content_hash(data):
+    """
+    SHA-256 hex digest of the file content (bytes), combined with the cache version.
+    """
+    digest = hashlib.sha256(data)
+    digest.update(f'fair_value-cache-v{CACHE_VERSION}'.encode())
+    return digest.hexdigest()
+
+# Function to resolve the on-disk cache directory
+def default_cache_dir():
+    """
+    The cache directory: $FAIR_VALUE_CACHE_DIR, or ~/.cache/fair_value.
+    """
+    return os.environ.get(CACHE_DIR_ENV) or os.path.join(os.path.expanduser('~'), '.cache', 'fair_value')
+
+# Function to write a DataFrame to Parquet atomically
+def _write_parquet_atomic(df, path):
+    """
+    Writes to a temporary file in the same directory and renames it, so readers never see a partial file.
+    """
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(path), suffix='.tmp')
+    os.close(fd)
+    try:
+        df.to_parquet(tmp_path, index=False)
+        os.replace(tmp_path, path)
+    finally:
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+# Function to remove expired and least recently used entries from the disk cache
+def prune_cache_dir(cache_dir=None, max_bytes=None, max_age=None, now=None):
+    """
+    Deletes the entries of `cache_dir` not used for more than `max_age` seconds, then the least
+    recently used ones until the rest fit in `max_bytes`. Limits default to $FAIR_VALUE_DISK_CACHE_MAX_MB
+    and $FAIR_VALUE_DISK_CACHE_MAX_AGE. Only content-hash entry directories are touched.
+    Returns the number of entries removed.
+    """
+    cache_dir = cache_dir or default_cache_dir()
+    if max_bytes is None:
+        max_bytes = float(os.environ.get(DISK_CACHE_MAX_MB_ENV, DEFAULT_DISK_CACHE_MAX_BYTES / 2**20)) * 2**20
+    if max_age is None:
+        max_age = float(os.environ.get(DISK_CACHE_MAX_AGE_ENV, DEFAULT_DISK_CACHE_MAX_AGE))
+    now = time.time() if now is None else now
+
+    entries = []
+    try:
+        names = os.listdir(cache_dir)
+    except OSError:
+        return 0
+    for name in names:
+        path = os.path.join(cache_dir, name)
+        if not _CACHE_ENTRY_NAME.match(name) or not os.path.isdir(path):
+            continue
+        try:
+            files = [os.path.join(path, file) for file in os.listdir(path)]
+            entries.append((os.path.getmtime(path), sum(os.path.getsize(file) for file in files), path))
+        except OSError:
+            continue # Removed by another process meanwhile
+
+    # Oldest first; expired entries go regardless of size, then the oldest until the rest fit
+    entries.sort()
+    total = sum(size for _, size, _ in entries)
+    removed = 0
+    for used_at, size, path in entries:
+        if now - used_at <= max_age and total <= max_bytes:
+            break
+        shutil.rmtree(path, ignore_errors=True)
+        total -= size
+        removed += 1
+    return removed
+
+# Function to read target and comparable companies through the content-hash cache
+def read_valuation_frames_cached(source, file_name=None, cache_dir=None):
+    """
+    Same result as read_valuation_frames, but parsed .xlsx/.csv frames are stored as Parquet under
+    `cache_dir` keyed by the file's content hash. Loading the same content again (re-upload,
+    app restart) reads the Parquet files and skips Excel/CSV parsing entirely. Every read marks
+    the entry as used and every write prunes the cache (see prune_cache_dir).
+    Caching is best-effort: if the frames cannot be stored (e.g. mixed-type columns), they are still returned.
+    """
+    extension = _file_extension(source, file_name)
+    if extension in ('.parquet', '.feather'):
+        # Already columnar, nothing to gain from a second copy on disk
+        return read_valuation_frames(source, file_name='data' + extension)
+
+    data = _read_source_bytes(source)
+
+    cache_dir = cache_dir or default_cache_dir()
+    entry_dir = os.path.join(cache_dir, content_hash(data) + extension)
+    target_path = os.path.join(entry_dir, 'target.parquet')
+    sector_path = os.path.join(entry_dir, 'sector.parquet')
+
+    if os.path.exists(target_path) and os.path.exists(sector_path):
+        try:
+            frames = pd.read_parquet(target_path), pd.read_parquet(sector_path)
+            os.utime(entry_dir) # Most recently used: pruned last
+            return frames
+        except Exception:
+            pass # Corrupt or unreadable entry, parse the file again
+
+    df_target, df_sector = read_valuation_frames(io.BytesIO(data), file_name='data' + extension)
+
+    try:
+        os.makedirs(entry_dir, exist_ok=True)
+        _write_parquet_atomic(df_target, target_path)
+        _write_parquet_atomic(df_sector, sector_path)
+        os.utime(entry_dir)
+        prune_cache_dir(cache_dir)
+    except Exception:
+        pass # The cache is an optimisation only
+
+    return df_target, df_sector
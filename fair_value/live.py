@@ -0,0 +1,396 @@
+"""
+Live re-pricing: current prices arrive as ticks from a price feed (a tailed CSV file or an HTTP
+endpoint polled for JSON) and the valuation follows them without re-reading the upload.
+
+LivePricer keeps every company's fundamentals, its multiples and the per-sector running sums and
+counts of the multiples. A tick replaces one price, re-evaluates that company's multiples and moves
+its sector's sums by the difference, so it costs the same whatever the size of the universe. Quotes
+use the leave-one-out sector means of value_companies_batch, and snapshot() returns the same table
+as value_companies_batch would on the repriced data.
+"""
+import json
+import os
+import urllib.request
+from collections import namedtuple
+
+import pandas as pd
+import numpy as np
+
+from fair_value.valuation import RATIO_COLUMNS, calculate_key_ratios_vectorized, classify_valuation_status, get_investment_recommendation, _numeric_column
+from fair_value.sector_index import normalize_sector
+from fair_value.methods import resolve_methods, method_fair_values, batch_result_columns, _per_share_multiple
+
+# One price update
+PriceTick = namedtuple('PriceTick', ['ticker', 'price'])
+
+# Valuation of one company at its latest price
+# - multiples / sector_averages / fair_values / statuses: {method key: value}
+LiveQuote = namedtuple('LiveQuote', ['ticker', 'price', 'multiples', 'sector_averages', 'fair_values', 'statuses', 'recommendation'])
+
+# Price sources the server allows, separated by ';': CSV file paths and/or http(s) URLs. Users can
+# only pick one of these; nothing typed in the dashboard is opened
+PRICE_FEEDS_ENV = 'FAIR_VALUE_PRICE_FEEDS'
+
+# Default seconds between two refreshes of the live view
+DEFAULT_REFRESH_SECONDS = 2.0
+
+# A sector's running sums are rebuilt from its rows after this many ticks, so rounding errors do not build up
+RESYNC_TICKS = 10_000
+
+# Keys accepted for the ticker and the price in JSON price feeds
+_TICKER_KEYS = ('Ticker', 'ticker', 'symbol')
+_PRICE_KEYS = ('Harga', 'Harga_Saham_Saat_Ini', 'price', 'last')
+
+# Function to read one 'TICKER,PRICE' line of a price feed
+def parse_tick_line(line):
+    """
+    PriceTick for a line like 'BBRI,4520' or 'BBRI;4520.5' (extra fields are ignored), or None for
+    blank lines, headers and lines whose price is not a non-negative number.
+    """
+    fields = [field.strip().strip('"') for field in line.replace(';', ',').split(',')]
+    if len(fields) < 2 or not fields[0]:
+        return None
+    try:
+        price = float(fields[1])
+    except ValueError:
+        return None
+    if not np.isfinite(price) or price < 0:
+        return None
+    return PriceTick(fields[0], price)
+
+# Function to read the ticks of a JSON price payload
+def parse_tick_payload(payload):
+    """
+    PriceTicks from {"BBRI": 4520, ...} or [{"Ticker": "BBRI", "Harga": 4520}, ...]
+    ('ticker'/'symbol' and 'price'/'last' are accepted too). Entries without a usable price are skipped.
+    """
+    if isinstance(payload, dict):
+        entries = payload.items()
+    elif isinstance(payload, list):
+        entries = []
+        for item in payload:
+            if not isinstance(item, dict):
+                continue
+            ticker = next((item[key] for key in _TICKER_KEYS if key in item), None)
+            price = next((item[key] for key in _PRICE_KEYS if key in item), None)
+            entries.append((ticker, price))
+    else:
+        raise ValueError('Price payload must be a JSON object or a list of objects')
+
+    ticks = []
+    for ticker, price in entries:
+        tick = parse_tick_line(f'{ticker},{price}') if ticker is not None else None
+        if tick is not None:
+            ticks.append(tick)
+    return ticks
+
+class CsvPriceFeed:
+    """
+    Tails a CSV file that another process appends 'TICKER,PRICE' lines to.
+
+    Each poll() reads only the bytes added since the previous one. A trailing line without its
+    newline is left for the next poll, and a file that shrank (truncated or rotated) is read again
+    from the start.
+    """
+
+    def __init__(self, path, from_start=True):
+        """
+        With `from_start` the lines already in the file are returned by the first poll (the latest
+        price per ticker wins once applied); otherwise only lines appended from now on.
+        """
+        self.path = path
+        self.offset = 0 if from_start or not os.path.exists(path) else os.path.getsize(path)
+
+    def poll(self):
+        """List of PriceTick appended since the last poll (empty if the file does not exist yet)."""
+        if not os.path.exists(self.path):
+            return []
+        if os.path.getsize(self.path) < self.offset:
+            self.offset = 0
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        complete = data.rfind(b'\n') + 1
+        self.offset += complete
+
+        ticks = []
+        for line in data[:complete].decode('utf-8', errors='replace').splitlines():
+            tick = parse_tick_line(line)
+            if tick is not None:
+                ticks.append(tick)
+        return ticks
+
+class HttpPriceFeed:
+    """
+    Polls an HTTP endpoint returning the latest prices as JSON (see parse_tick_payload).
+    """
+
+    def __init__(self, url, timeout=5.0):
+        self.url = url
+        self.timeout = timeout
+
+    def poll(self):
+        """
+        List of PriceTick from one request. Raises OSError when the endpoint cannot be reached
+        and ValueError when the response is not a price payload.
+        """
+        with urllib.request.urlopen(self.url, timeout=self.timeout) as response:
+            body = response.read()
+        try:
+            payload = json.loads(body)
+        except json.JSONDecodeError as e:
+            raise ValueError(f'Price feed did not return JSON: {e}') from None
+        return parse_tick_payload(payload)
+
+# Function to list the price sources configured on the server
+def configured_price_feeds():
+    """
+    The sources in $FAIR_VALUE_PRICE_FEEDS, in order, without blanks and duplicates. Empty when unset.
+    """
+    sources = [source.strip() for source in os.environ.get(PRICE_FEEDS_ENV, '').split(';')]
+    return list(dict.fromkeys(source for source in sources if source))
+
+# Function to open one of the configured price sources
+def open_price_feed(source):
+    """
+    HttpPriceFeed for an http(s) URL, CsvPriceFeed for a file path. Raises ValueError when `source`
+    is not one of configured_price_feeds(), so user input never reaches the file system or the network.
+    """
+    if source not in configured_price_feeds():
+        raise ValueError(f"Price source '{source}' is not configured in ${PRICE_FEEDS_ENV}")
+    if source.lower().startswith(('http://', 'https://')):
+        return HttpPriceFeed(source)
+    return CsvPriceFeed(source)
+
+# Function to read the method inputs of a frame as float arrays
+def _input_arrays(df, methods):
+    """
+    {column: float array} for every column read by `methods`, plus the inputs of P/E and P/B.
+    """
+    columns = {'Harga_Saham_Saat_Ini', 'Jumlah_Saham_Beredar', 'Net_Income_Terbaru', 'Total_Ekuitas_Terbaru'} | {column for method in methods for column in method.columns}
+    return {column: _numeric_column(df, column).copy() for column in columns}
+
+# Function to evaluate the multiples of the given rows
+def _row_multiples(inputs, methods, rows):
+    """
+    (len(rows), methods) matrix of multiples for the rows `rows` of `inputs`.
+    """
+    row_inputs = {column: values[rows] for column, values in inputs.items()}
+    return np.column_stack([method.multiple(row_inputs) for method in methods]) if len(rows) else np.empty((0, len(methods)))
+
+# Function to list the row positions of every ticker
+def _ticker_rows(df):
+    """
+    {ticker: array of row positions}; rows without a ticker are left out.
+    """
+    if 'Ticker' not in df.columns or df.empty:
+        return {}
+    tickers = df['Ticker'].astype(str).reset_index(drop=True)
+    return dict(tickers.groupby(tickers, sort=False).indices)
+
+class LivePricer:
+    """
+    Valuation of `targets_df` against the sectors of `comparables_df` that follows price ticks.
+
+    - tick(ticker, price) updates one company (as a target and as a comparable) in constant time.
+    - apply(ticks) coalesces a burst of ticks: only the latest price per ticker is applied.
+    - quote(ticker) values one target at its latest price, also in constant time.
+    - snapshot() values every target at once, as value_companies_batch on the repriced data.
+    """
+
+    def __init__(self, targets_df, comparables_df, methods=None):
+        self.methods = resolve_methods(methods)
+        self.method_keys = [method.key for method in self.methods]
+        self.targets = targets_df.reset_index(drop=True)
+        self.ticks = 0
+
+        # Sector codes shared by targets and comparables
+        target_sectors = normalize_sector(self.targets['Sektor']) if 'Sektor' in self.targets.columns else pd.Series('', index=self.targets.index)
+        comparable_sectors = normalize_sector(comparables_df['Sektor']).reset_index(drop=True) if 'Sektor' in comparables_df.columns else pd.Series([], dtype=object)
+        codes, self.sectors = pd.factorize(pd.concat([target_sectors, comparable_sectors], ignore_index=True))
+        # Blank sectors (code -1) get two slots of their own, one for targets and one for comparables, so
+        # as in value_companies_batch a target without a sector has no comparables and vice versa
+        n_slots = len(self.sectors) + 2
+        self._target_codes = np.where(codes[:len(self.targets)] < 0, n_slots - 2, codes[:len(self.targets)])
+        self._comparable_codes = np.where(codes[len(self.targets):] < 0, n_slots - 1, codes[len(self.targets):])
+        self._sector_rows = dict(pd.Series(self._comparable_codes).groupby(self._comparable_codes, sort=False).indices)
+        self._sector_ticks = np.zeros(n_slots, dtype=np.int64)
+
+        # Fundamentals stay as they were uploaded; only the price column changes
+        self._target_inputs = _input_arrays(self.targets, self.methods)
+        self._comparable_inputs = _input_arrays(comparables_df, self.methods)
+        self._target_ratios = calculate_key_ratios_vectorized(self.targets)
+        self._target_rows = _ticker_rows(self.targets)
+        self._comparable_rows = _ticker_rows(comparables_df)
+
+        # Comparables without a usable share count never count, whatever their price
+        self._eligible = self._comparable_inputs['Jumlah_Saham_Beredar'] != 0
+        self._sums = np.zeros((n_slots, len(self.methods)))
+        self._counts = np.zeros((n_slots, len(self.methods)))
+        self._comparables_count = np.bincount(self._comparable_codes[self._eligible], minlength=n_slots)
+        self._comparable_multiples = _row_multiples(self._comparable_inputs, self.methods, np.arange(len(comparables_df)))
+        self._add_contributions(np.arange(len(comparables_df)), 1)
+
+        # Contribution of the comparable rows holding the same company as a target (same ticker and
+        # sector); it is left out of that target's average and kept up to date by tick()
+        self._own_sums = np.zeros((len(self.targets), len(self.methods)))
+        self._own_counts = np.zeros((len(self.targets), len(self.methods)))
+        self._own_n = np.zeros(len(self.targets), dtype=np.int64)
+        if len(self.targets) and len(comparables_df):
+            target_tickers = self.targets['Ticker'].astype(str).to_numpy() if 'Ticker' in self.targets.columns else np.full(len(self.targets), '')
+            comparable_tickers = comparables_df['Ticker'].astype(str).to_numpy() if 'Ticker' in comparables_df.columns else np.full(len(comparables_df), '')
+            pairs = pd.DataFrame({'ticker': target_tickers, 'code': self._target_codes, 'target': np.arange(len(self.targets))}).merge(
+                pd.DataFrame({'ticker': comparable_tickers, 'code': self._comparable_codes, 'comparable': np.arange(len(comparables_df))}),
+                on=['ticker', 'code']
+            )
+            self._add_own(pairs['target'].to_numpy(), pairs['comparable'].to_numpy())
+
+    def __len__(self):
+        return len(self.targets)
+
+    def _contributions(self, rows):
+        """(values, counts) of the rows' multiples in their sector sums: usable finite multiples only."""
+        values = self._comparable_multiples[rows]
+        usable = self._eligible[rows, np.newaxis] & np.isfinite(values)
+        return np.where(usable, values, 0.0), usable.astype(float)
+
+    def _add_contributions(self, rows, sign):
+        """Adds (sign 1) or removes (sign -1) the contributions of comparable `rows` to their sector sums."""
+        values, counts = self._contributions(rows)
+        np.add.at(self._sums, self._comparable_codes[rows], sign * values)
+        np.add.at(self._counts, self._comparable_codes[rows], sign * counts)
+
+    def _add_own(self, targets, comparables):
+        """Adds the contributions of comparable rows to the own totals of the paired target rows."""
+        values, counts = self._contributions(comparables)
+        np.add.at(self._own_sums, targets, values)
+        np.add.at(self._own_counts, targets, counts)
+        np.add.at(self._own_n, targets, self._eligible[comparables].astype(np.int64))
+
+    def _refresh_own(self, target_rows, comparable_rows):
+        """Recomputes the own totals of the target rows of one ticker from its comparable rows."""
+        self._own_sums[target_rows] = 0.0
+        self._own_counts[target_rows] = 0.0
+        self._own_n[target_rows] = 0
+        same_sector = self._target_codes[target_rows, np.newaxis] == self._comparable_codes[comparable_rows]
+        targets, comparables = np.nonzero(same_sector)
+        self._add_own(target_rows[targets], comparable_rows[comparables])
+
+    def _resync(self, code):
+        """Rebuilds one sector's sums from its rows."""
+        rows = self._sector_rows.get(code, np.array([], dtype=np.intp))
+        values, counts = self._contributions(rows)
+        self._sums[code] = values.sum(axis=0)
+        self._counts[code] = counts.sum(axis=0)
+        self._sector_ticks[code] = 0
+
+    def tick(self, ticker, price):
+        """
+        Sets the price of `ticker` in every target and comparable row holding it. Returns False if the
+        ticker is unknown. Raises ValueError for a negative or non-numeric price.
+        """
+        price = float(price)
+        if not np.isfinite(price) or price < 0:
+            raise ValueError(f"Invalid price {price} for '{ticker}'")
+        ticker = str(ticker)
+        target_rows = self._target_rows.get(ticker)
+        comparable_rows = self._comparable_rows.get(ticker)
+        if target_rows is None and comparable_rows is None:
+            return False
+
+        if target_rows is not None:
+            self._target_inputs['Harga_Saham_Saat_Ini'][target_rows] = price
+        if comparable_rows is not None:
+            # Running sums: remove the old contribution, add the new one
+            self._add_contributions(comparable_rows, -1)
+            self._comparable_inputs['Harga_Saham_Saat_Ini'][comparable_rows] = price
+            self._comparable_multiples[comparable_rows] = _row_multiples(self._comparable_inputs, self.methods, comparable_rows)
+            self._add_contributions(comparable_rows, 1)
+            if target_rows is not None:
+                self._refresh_own(target_rows, comparable_rows)
+            for code in set(self._comparable_codes[comparable_rows]):
+                self._sector_ticks[code] += 1
+                if self._sector_ticks[code] >= RESYNC_TICKS:
+                    self._resync(code)
+        self.ticks += 1
+        return True
+
+    def apply(self, ticks):
+        """
+        Applies a batch of PriceTick (or (ticker, price) pairs), keeping only the latest price per
+        ticker. Returns the list of tickers that were repriced.
+        """
+        latest = {}
+        for ticker, price in ticks:
+            latest[str(ticker)] = price
+        return [ticker for ticker, price in latest.items() if self.tick(ticker, price)]
+
+    def _sector_means(self, positions):
+        """(len(positions), methods) leave-one-out sector means and comparables counts of the targets."""
+        codes = self._target_codes[positions]
+        sums = self._sums[codes] - self._own_sums[positions]
+        counts = self._counts[codes] - self._own_counts[positions]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            means = np.where(counts > 0.5, sums / counts, np.nan)
+        return means, self._comparables_count[codes] - self._own_n[positions]
+
+    def _valuation(self, positions):
+        """(price, multiples, sector means, comparables count, fair values, statuses) of the target rows."""
+        price = self._target_inputs['Harga_Saham_Saat_Ini'][positions]
+        multiples = _row_multiples(self._target_inputs, self.methods, positions)
+        sector_means, comparables_count = self._sector_means(positions)
+        fair_values = method_fair_values(price, multiples, sector_means, self.method_keys)
+        statuses = classify_valuation_status(price[:, np.newaxis], fair_values)
+        return price, multiples, sector_means, comparables_count, fair_values, statuses
+
+    def quote(self, ticker):
+        """
+        LiveQuote of the first target row of `ticker` at its latest price, or None if it is not a target.
+        """
+        rows = self._target_rows.get(str(ticker))
+        if rows is None:
+            return None
+        price, multiples, sector_means, _, fair_values, statuses = self._valuation(rows[:1])
+        return LiveQuote(
+            str(ticker), float(price[0]),
+            dict(zip(self.method_keys, multiples[0])), dict(zip(self.method_keys, sector_means[0])),
+            dict(zip(self.method_keys, fair_values[0])), dict(zip(self.method_keys, statuses[0])),
+            get_investment_recommendation(*statuses[0])
+        )
+
+    def snapshot(self, tickers=None):
+        """
+        Batch valuation table (batch_result_columns) of every target at its latest price, or only of
+        the target rows of `tickers`.
+        """
+        if tickers is None:
+            positions = np.arange(len(self.targets))
+        else:
+            rows = [self._target_rows[str(ticker)] for ticker in tickers if str(ticker) in self._target_rows]
+            positions = np.sort(np.concatenate(rows)) if rows else np.array([], dtype=np.intp)
+        if not len(positions):
+            return pd.DataFrame(columns=batch_result_columns(self.method_keys))
+
+        price, _, sector_means, comparables_count, fair_values, statuses = self._valuation(positions)
+        targets = self.targets.iloc[positions]
+        result = pd.DataFrame({
+            'Ticker': targets['Ticker'].to_numpy() if 'Ticker' in targets.columns else '',
+            'Nama_Perusahaan': targets['Nama_Perusahaan'].to_numpy() if 'Nama_Perusahaan' in targets.columns else '',
+            'Sektor': targets['Sektor'].to_numpy() if 'Sektor' in targets.columns else '',
+            'Harga_Saham_Saat_Ini': price,
+        })
+        # Margins and ROE do not depend on the price; P/E and P/B follow it
+        for ratio in RATIO_COLUMNS:
+            result[ratio] = self._target_ratios[ratio].to_numpy(dtype=float)[positions]
+        price_inputs = {column: values[positions] for column, values in self._target_inputs.items()}
+        result['P/E Ratio'] = _per_share_multiple(price_inputs, 'Net_Income_Terbaru')
+        result['P/B Ratio'] = _per_share_multiple(price_inputs, 'Total_Ekuitas_Terbaru')
+        for j, key in enumerate(self.method_keys):
+            result[f'Rata-rata Sektor {key}'] = sector_means[:, j]
+        result['Jumlah Pembanding'] = comparables_count
+        for j, key in enumerate(self.method_keys):
+            result[f'Fair Value ({key})'] = fair_values[:, j]
+        for j, key in enumerate(self.method_keys):
+            result[f'Status ({key})'] = statuses[:, j]
+        result['Rekomendasi'] = get_investment_recommendation(*statuses.T)
+        return result[batch_result_columns(self.method_keys)]
@@ -0,0 +1,229 @@
+"""
+Registry of multiplier valuation methods.
+
+Each method declares the input columns it needs and a vectorized formula for its multiple
+(e.g. price / sales per share for P/S). The enabled methods are evaluated for all companies at once:
+their multiples form a (companies x methods) matrix, the sector averages a matrix of the same shape,
+and fair values, statuses and the recommendation vote are computed on those matrices. Registering a
+method adds a column to the matrices, not a loop over rows.
+"""
+from collections import namedtuple
+
+import pandas as pd
+import numpy as np
+
+from fair_value.columns import RATIO_COLUMNS, _numeric_column
+from fair_value.sector_stats import compute_sector_statistics, sector_averages_from_statistics
+
+# One valuation method
+# - key: short name used in column labels ('P/E' -> 'Fair Value (P/E)')
+# - ratio: name of the multiple's column and of its entry in the sector averages dict
+# - columns: input columns the formula reads; the method is only available when all are present
+# - multiple: function(inputs) -> float array, `inputs` maps each column to its float array
+# - inverse: True for yields, where a higher value is cheaper (fair value = price x target / sector)
+# - harmonic: True when the harmonic mean is a meaningful sector aggregate of the multiple
+# - description: shown in the dashboard
+ValuationMethod = namedtuple('ValuationMethod', ['key', 'ratio', 'columns', 'multiple', 'inverse', 'harmonic', 'description'])
+
+# Column with the expected earnings growth used by PEG (optional in the upload)
+GROWTH_COLUMN = 'Pertumbuhan_Laba_Persen'
+
+# Methods evaluated when none are selected; the batch results keep their original columns
+DEFAULT_METHODS = ('P/E', 'P/B')
+
+# Function to divide the price by a per-share fundamental the way calculate_key_ratios does
+def _per_share_multiple(inputs, fundamental_column):
+    """
+    price / (fundamental / shares): inf when the fundamental is zero, NaN when the share count is zero.
+    """
+    current_price = inputs['Harga_Saham_Saat_Ini']
+    shares_outstanding = inputs['Jumlah_Saham_Beredar']
+    fundamental = inputs[fundamental_column]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        per_share = fundamental / shares_outstanding
+        multiple = np.where((fundamental != 0) & (per_share != 0), current_price / per_share, np.inf)
+    return np.where(shares_outstanding != 0, multiple, np.nan)
+
+# Function for the ROE-adjusted P/B multiple
+def _pb_per_roe(inputs):
+    """
+    P/B divided by ROE (%): a bank earning twice the ROE deserves twice the P/B. NaN unless ROE > 0.
+    """
+    price_to_book = _per_share_multiple(inputs, 'Total_Ekuitas_Terbaru')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        roe = inputs['Net_Income_Terbaru'] / inputs['Total_Ekuitas_Terbaru'] * 100
+        multiple = price_to_book / roe
+    return np.where(np.isfinite(price_to_book) & (roe > 0), multiple, np.nan)
+
+# Function for the earnings yield
+def _earnings_yield(inputs):
+    """
+    EPS / price in percent. Unlike P/E it stays finite for zero earnings. NaN without shares or price.
+    """
+    current_price = inputs['Harga_Saham_Saat_Ini']
+    shares_outstanding = inputs['Jumlah_Saham_Beredar']
+    with np.errstate(divide='ignore', invalid='ignore'):
+        earnings_yield = inputs['Net_Income_Terbaru'] / shares_outstanding / current_price * 100
+    return np.where((shares_outstanding != 0) & (current_price != 0), earnings_yield, np.nan)
+
+# Function for the PEG ratio
+def _peg(inputs):
+    """
+    P/E divided by the expected earnings growth (%). NaN unless both are positive and finite.
+    """
+    price_to_earnings = _per_share_multiple(inputs, 'Net_Income_Terbaru')
+    growth = inputs[GROWTH_COLUMN]
+    with np.errstate(divide='ignore', invalid='ignore'):
+        peg = price_to_earnings / growth
+    return np.where(np.isfinite(price_to_earnings) & (price_to_earnings > 0) & (growth > 0), peg, np.nan)
+
+_PRICE_COLUMNS = ('Harga_Saham_Saat_Ini', 'Jumlah_Saham_Beredar')
+
+VALUATION_METHODS = {}
+
+# Function to add a method to the registry
+def register_valuation_method(method, replace=False):
+    """
+    Adds a ValuationMethod under its key. Raises ValueError if the key is taken and `replace` is False.
+    Methods must be registered at import time to be available in worker processes.
+    """
+    if method.key in VALUATION_METHODS and not replace:
+        raise ValueError(f"Valuation method '{method.key}' is already registered")
+    VALUATION_METHODS[method.key] = method
+    return method
+
+register_valuation_method(ValuationMethod(
+    'P/E', 'P/E Ratio', _PRICE_COLUMNS + ('Net_Income_Terbaru',),
+    lambda inputs: _per_share_multiple(inputs, 'Net_Income_Terbaru'), False, True,
+    'Harga dibanding laba bersih per saham'
+))
+register_valuation_method(ValuationMethod(
+    'P/B', 'P/B Ratio', _PRICE_COLUMNS + ('Total_Ekuitas_Terbaru',),
+    lambda inputs: _per_share_multiple(inputs, 'Total_Ekuitas_Terbaru'), False, True,
+    'Harga dibanding nilai buku per saham'
+))
+register_valuation_method(ValuationMethod(
+    'P/S', 'P/S Ratio', _PRICE_COLUMNS + ('Total_Pendapatan_Terbaru',),
+    lambda inputs: _per_share_multiple(inputs, 'Total_Pendapatan_Terbaru'), False, True,
+    'Harga dibanding pendapatan per saham'
+))
+register_valuation_method(ValuationMethod(
+    'P/B-ROE', 'P/B per ROE', _PRICE_COLUMNS + ('Net_Income_Terbaru', 'Total_Ekuitas_Terbaru'),
+    _pb_per_roe, False, True,
+    'P/B dibagi ROE (%): P/B yang disesuaikan dengan profitabilitas'
+))
+register_valuation_method(ValuationMethod(
+    'Earnings Yield', 'Earnings Yield (%)', _PRICE_COLUMNS + ('Net_Income_Terbaru',),
+    _earnings_yield, True, False,
+    'Laba per saham dibanding harga (%); semakin tinggi semakin murah'
+))
+register_valuation_method(ValuationMethod(
+    'PEG', 'PEG Ratio', _PRICE_COLUMNS + ('Net_Income_Terbaru', GROWTH_COLUMN),
+    _peg, False, True,
+    f"P/E dibagi pertumbuhan laba (%), butuh kolom '{GROWTH_COLUMN}'"
+))
+
+# Function to look up methods by key
+def resolve_methods(methods=None):
+    """
+    List of ValuationMethod for the given keys (default DEFAULT_METHODS), in the given order.
+    Raises ValueError for unknown keys or an empty selection.
+    """
+    keys = DEFAULT_METHODS if methods is None else list(methods)
+    if not keys:
+        raise ValueError('At least one valuation method is required')
+    unknown = [key for key in keys if key not in VALUATION_METHODS]
+    if unknown:
+        raise ValueError(f"Unknown valuation method(s) {', '.join(map(str, unknown))}. Available: {', '.join(VALUATION_METHODS)}")
+    return [VALUATION_METHODS[key] for key in keys]
+
+# Function to list the methods whose input columns are all present
+def available_methods(companies_df):
+    """
+    Keys of the registered methods that can be evaluated on `companies_df`.
+    """
+    return [key for key, method in VALUATION_METHODS.items() if all(column in companies_df.columns for column in method.columns)]
+
+# Function to evaluate the multiples of several methods for every company at once
+def method_multiples(companies_df, methods=None):
+    """
+    DataFrame (same index as the input) with one column per method (named after its ratio).
+    Every input column is parsed once; a method whose column is missing gives an all-NaN column.
+    """
+    methods = resolve_methods(methods)
+    columns = {column for method in methods for column in method.columns}
+    inputs = {column: _numeric_column(companies_df, column) for column in columns}
+    return pd.DataFrame({method.ratio: method.multiple(inputs) for method in methods}, index=companies_df.index)
+
+# Function to compute each comparable's contribution to its sector's sums and counts of the multiples
+def method_contributions(comparables_df, methods=None, multiples=None):
+    """
+    '<ratio> sum' and '<ratio> count' columns per method, one row per comparable, with the same rules as
+    sector_contributions: rows without a usable share count and non-finite multiples are left out.
+    """
+    methods = resolve_methods(methods)
+    multiples = method_multiples(comparables_df, [method.key for method in methods]) if multiples is None else multiples
+    eligible = _numeric_column(comparables_df, 'Jumlah_Saham_Beredar') != 0
+
+    contributions = {}
+    for method in methods:
+        values = multiples[method.ratio].to_numpy(dtype=float)
+        usable = eligible & np.isfinite(values)
+        contributions[method.ratio + ' sum'] = np.where(usable, values, 0.0)
+        contributions[method.ratio + ' count'] = usable.astype(int)
+    return pd.DataFrame(contributions, index=comparables_df.index)
+
+# Function to average the multiples of a set of comparables
+def method_averages(comparables_df, methods=None, multiples=None, aggregator='mean'):
+    """
+    {ratio: average} over the usable multiples of `comparables_df`, like calculate_sector_averages_from_excel.
+    `aggregator` is one of SECTOR_AGGREGATORS; the harmonic mean falls back to the mean for methods
+    that are not `harmonic`. Methods without any usable value are left out.
+    """
+    methods = resolve_methods(methods)
+    keys = [method.key for method in methods]
+    multiples = method_multiples(comparables_df, keys) if multiples is None else multiples
+    if aggregator != 'mean':
+        statistics = compute_sector_statistics(
+            comparables_df, multiples, np.zeros(len(comparables_df), dtype=int), ratio_columns=[method.ratio for method in methods],
+            multiple_ratios=[method.ratio for method in methods if method.harmonic]
+        )
+        return sector_averages_from_statistics(statistics, 0, aggregator, ratios=[method.ratio for method in methods])
+
+    totals = method_contributions(comparables_df, keys, multiples).sum()
+    return {method.ratio: float(totals[method.ratio + ' sum'] / totals[method.ratio + ' count'])
+            for method in methods if totals.get(method.ratio + ' count', 0) > 0}
+
+# Function to compute the fair values of several methods at once
+def method_fair_values(current_price, target_multiples, sector_multiples, methods=None):
+    """
+    Fair value matrix with the shape of `target_multiples` (..., methods): price x sector / target for
+    multiples and price x target / sector for yields (inverse methods). NaN where a value is missing,
+    the target multiple is zero or infinite, or (yields) the sector average is zero; a zero sector
+    multiple gives inf, as in calculate_fair_value_multiplier.
+    """
+    methods = resolve_methods(methods)
+    current_price = np.asarray(current_price, dtype=float)
+    target = np.asarray(target_multiples, dtype=float)
+    sector = np.asarray(sector_multiples, dtype=float)
+    if current_price.ndim:
+        current_price = current_price[..., np.newaxis]
+    inverse = np.array([method.inverse for method in methods], dtype=bool)
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        multiplier = np.where(sector != 0, current_price * (sector / target), np.inf)
+        multiplier_valid = ~np.isnan(target) & (target != 0) & (target != np.inf) & ~np.isnan(sector)
+        yield_value = current_price * (target / sector)
+        yield_valid = np.isfinite(target) & np.isfinite(sector) & (sector != 0)
+    fair_value = np.where(inverse, np.where(yield_valid, yield_value, np.nan), np.where(multiplier_valid, multiplier, np.nan))
+    return np.where(np.isnan(current_price), np.nan, fair_value)
+
+# Function to list the result columns of a batch valuation with the given methods
+def batch_result_columns(methods=None):
+    """
+    Column order of value_companies_batch for `methods`; DEFAULT_METHODS gives BATCH_RESULT_COLUMNS.
+    """
+    keys = [method.key for method in resolve_methods(methods)]
+    return (['Ticker', 'Nama_Perusahaan', 'Sektor', 'Harga_Saham_Saat_Ini'] + RATIO_COLUMNS
+            + [f'Rata-rata Sektor {key}' for key in keys] + ['Jumlah Pembanding']
+            + [f'Fair Value ({key})' for key in keys] + [f'Status ({key})' for key in keys] + ['Rekomendasi'])
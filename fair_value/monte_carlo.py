@@ -0,0 +1,117 @@
+"""
+Monte Carlo fair value: instead of a single sector average, the sector P/E and P/B are
+bootstrapped from the comparables (resampled with replacement, averaged the same way as
+calculate_sector_averages_from_excel) and the target's net income and equity get random
+relative noise. Each sample yields a P/E and a P/B fair value; the distribution is summarized
+by percentiles and the probability of each status band.
+
+Samples are drawn in chunks so the bootstrap index matrix stays within a fixed element budget,
+and a seeded generator makes the results reproducible.
+"""
+from collections import namedtuple
+import pandas as pd
+import numpy as np
+
+from fair_value.valuation import calculate_key_ratios_vectorized, classify_valuation_status
+from fair_value.methods import method_fair_values
+from fair_value.sector_index import sector_contributions
+
+# Ratio used by each valuation method
+MONTE_CARLO_METHODS = {'P/E': 'P/E Ratio', 'P/B': 'P/B Ratio'}
+
+# Default relative noise (standard deviation) on the target fundamental of each method
+DEFAULT_NOISE = {'P/E': 0.10, 'P/B': 0.05}
+
+DEFAULT_SAMPLES = 100_000
+DEFAULT_SEED = 42
+
+# Maximum number of bootstrap indices held in memory at once (samples per chunk x comparables)
+DEFAULT_CHUNK_ELEMENTS = 1_000_000
+
+# Percentiles reported in the summary
+MONTE_CARLO_PERCENTILES = [5, 25, 50, 75, 95]
+
+MonteCarloResult = namedtuple('MonteCarloResult', ['samples', 'summary'])
+
+# Function to simulate the fair value distribution of one target company
+def simulate_fair_value(ticker_ratios, comparables_df, current_price, n_samples=DEFAULT_SAMPLES, seed=DEFAULT_SEED,
+                        noise=None, comparable_ratios=None, chunk_elements=DEFAULT_CHUNK_ELEMENTS):
+    """
+    Draws `n_samples` fair values per method (P/E and P/B).
+    - Each sample resamples the rows of `comparables_df` with replacement and averages their usable
+      ratios (same filtering as the sector mean), so P/E and P/B come from the same resampled peers.
+    - The target ratio is divided by (1 + noise x N(0, 1)), i.e. relative noise on net income (P/E)
+      or equity (P/B); `noise` maps method to standard deviation and defaults to DEFAULT_NOISE.
+    `comparable_ratios` may be passed when the ratios of `comparables_df` are already known.
+    The same seed and chunk size always give the same samples.
+    Returns a MonteCarloResult of {method: fair value array} and a summary DataFrame (one row per method).
+    """
+    if n_samples < 1:
+        raise ValueError('n_samples must be at least 1')
+    noise = dict(DEFAULT_NOISE, **(noise or {}))
+    methods = list(MONTE_CARLO_METHODS)
+    samples = {method: np.full(n_samples, np.nan) for method in methods}
+
+    if comparables_df.empty or current_price is None:
+        return MonteCarloResult(samples, summarize_fair_value_samples(samples, current_price))
+
+    ratios_df = calculate_key_ratios_vectorized(comparables_df) if comparable_ratios is None else comparable_ratios
+    contributions = sector_contributions(comparables_df, ratios_df)
+    ratio_names = [MONTE_CARLO_METHODS[method] for method in methods]
+    sums_and_counts = np.hstack([
+        contributions[[ratio + ' sum' for ratio in ratio_names]].to_numpy(dtype=float),
+        contributions[[ratio + ' count' for ratio in ratio_names]].to_numpy(dtype=float)
+    ])
+    target = np.array([ticker_ratios.get(ratio, np.nan) for ratio in ratio_names], dtype=float)
+    sigma = np.array([noise[method] for method in methods], dtype=float)
+
+    n_rows = len(comparables_df)
+    chunk_size = max(1, chunk_elements // n_rows)
+    rng = np.random.default_rng(seed)
+
+    for start in range(0, n_samples, chunk_size):
+        size = min(chunk_size, n_samples - start)
+
+        # Bootstrap: how often each comparable is picked in each sample, then sums/counts as one matrix product
+        picks = rng.integers(0, n_rows, size=(size, n_rows))
+        picks += np.arange(size)[:, np.newaxis] * n_rows
+        weights = np.bincount(picks.ravel(), minlength=size * n_rows).reshape(size, n_rows)
+        totals = weights @ sums_and_counts
+        sector_sums, sector_counts = totals[:, :len(methods)], totals[:, len(methods):]
+        with np.errstate(divide='ignore', invalid='ignore'):
+            sector_ratio = np.where(sector_counts > 0, sector_sums / sector_counts, np.nan)
+
+        # Relative noise on the target fundamental scales its ratio inversely
+        shock = 1.0 + sigma * rng.standard_normal((size, len(methods)))
+        with np.errstate(divide='ignore', invalid='ignore'):
+            target_ratio = target / shock
+
+        fair_values = method_fair_values(current_price, target_ratio, sector_ratio, methods)
+        for j, method in enumerate(methods):
+            samples[method][start:start + size] = fair_values[:, j]
+
+    return MonteCarloResult(samples, summarize_fair_value_samples(samples, current_price))
+
+# Function to summarize fair value samples with percentiles and status probabilities
+def summarize_fair_value_samples(samples, current_price):
+    """
+    One row per method: the MONTE_CARLO_PERCENTILES and mean of the finite samples, and the share of
+    all samples in each status band (UNDERVALUED / FAIR / OVERVALUED) against `current_price`.
+    Samples without a valid positive fair value count in none of the bands.
+    """
+    rows = {}
+    for method, values in samples.items():
+        finite = values[np.isfinite(values)]
+        row = {f'P{q}': (float(np.percentile(finite, q)) if finite.size else np.nan) for q in MONTE_CARLO_PERCENTILES}
+        row['Mean'] = float(finite.mean()) if finite.size else np.nan
+
+        if current_price is None or values.size == 0:
+            status = np.full(values.size, '')
+        else:
+            status = classify_valuation_status(current_price, values)
+        for label in ['UNDERVALUED', 'FAIR', 'OVERVALUED']:
+            row[f'P({label})'] = float((status == label).mean()) if values.size else np.nan
+        row['Sampel Valid'] = int((status != '').sum())
+        rows[method] = row
+
+    return pd.DataFrame.from_dict(rows, orient='index').rename_axis('Metode')
@@ -0,0 +1,60 @@
+"""
+Server-side paging for large tables: rows are sorted by position and only the rows of the
+requested page are sliced out and formatted, so the cost of rendering a table depends on
+the page size instead of the number of comparables.
+"""
+import pandas as pd
+import numpy as np
+
+# Page sizes offered in the dashboard
+PAGE_SIZES = (25, 50, 100, 250)
+DEFAULT_PAGE_SIZE = PAGE_SIZES[0]
+
+# Function to compute the row order of a sorted table without reordering the frame
+def sort_positions(df, column=None, ascending=True):
+    """
+    Integer row positions of `df` sorted by `column` (stable, missing values last).
+    The original order when `column` is None.
+    """
+    if column is None:
+        return np.arange(len(df))
+    if column not in df.columns:
+        raise ValueError(f"Unknown column '{column}'")
+    values = df[column].reset_index(drop=True)
+    return values.sort_values(ascending=ascending, na_position='last', kind='mergesort').index.to_numpy()
+
+# Function to count the pages of a table
+def page_count(n_rows, page_size=DEFAULT_PAGE_SIZE):
+    """
+    Number of pages needed for `n_rows` rows (at least 1, so an empty table has one empty page).
+    """
+    if page_size < 1:
+        raise ValueError('page_size must be at least 1')
+    return max(1, -(-n_rows // page_size))
+
+# Function to slice one page out of a (sorted) table
+def paginate(df, page=1, page_size=DEFAULT_PAGE_SIZE, sort_by=None, ascending=True, positions=None):
+    """
+    Returns (rows of page `page`, number of pages). Pages start at 1 and `page` is clamped
+    to the valid range. `positions` may be passed to reuse a sort order from sort_positions.
+    """
+    pages = page_count(len(df), page_size)
+    page = min(max(int(page), 1), pages)
+    if positions is None:
+        positions = sort_positions(df, sort_by, ascending)
+    start = (page - 1) * page_size
+    return df.iloc[positions[start:start + page_size]], pages
+
+# Function to format the visible rows as display strings
+def format_page(page_df, formats, na_rep='-'):
+    """
+    Copy of `page_df` where each column in `formats` is rendered with its format string
+    (e.g. "Rp {:,.0f}"). Missing or non-numeric values become `na_rep`.
+    """
+    formatted = page_df.copy()
+    for column, fmt in formats.items():
+        if column not in formatted.columns:
+            continue
+        values = pd.to_numeric(formatted[column], errors='coerce')
+        formatted[column] = [na_rep if pd.isna(value) else fmt.format(value) for value in values]
+    return formatted
@@ -0,0 +1,154 @@
+"""
+Multi-core batch valuation: the comparables and targets are partitioned by sector and each
+partition is valued by value_companies_batch in a worker process.
+
+A company's sector averages only involve its own sector, so partitions are independent and
+the merged result is identical to the serial path. Partitions travel to the workers as Arrow
+IPC streams in shared memory instead of pickled DataFrames through the pool's pipe, and the
+results come back as Arrow IPC bytes. Small inputs, a single worker or any failure to start
+or use the pool fall back to the serial value_companies_batch.
+"""
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from multiprocessing import shared_memory
+
+import pandas as pd
+import numpy as np
+
+from fair_value.batch import value_companies_batch
+from fair_value.methods import batch_result_columns
+from fair_value.sector_index import MISSING_SECTOR_KEY, normalize_sector
+
+# Number of worker processes, overridable through the environment (1 = serial)
+WORKERS_ENV = 'FAIR_VALUE_WORKERS'
+
+# Below this many targets + comparables the process start-up costs more than it saves
+MIN_PARALLEL_ROWS = 20_000
+
+logger = logging.getLogger('fair_value.parallel')
+
+# Function to resolve the worker count
+def default_workers():
+    """
+    $FAIR_VALUE_WORKERS, or 1 (serial) when it is not set.
+    """
+    return max(1, int(os.environ.get(WORKERS_ENV, 1)))
+
+# Function to serialize a DataFrame as an Arrow IPC stream
+def _to_ipc(df):
+    """
+    Arrow IPC stream bytes of `df` (index dropped).
+    """
+    import pyarrow as pa
+
+    table = pa.Table.from_pandas(df, preserve_index=False)
+    sink = pa.BufferOutputStream()
+    with pa.ipc.new_stream(sink, table.schema) as writer:
+        writer.write_table(table)
+    return sink.getvalue()
+
+# Function to read a DataFrame back from Arrow IPC bytes or a memoryview
+def _from_ipc(buffer):
+    """
+    DataFrame from an Arrow IPC stream. The Arrow buffers are released before returning.
+    """
+    import pyarrow as pa
+
+    with pa.ipc.open_stream(pa.py_buffer(buffer)) as reader:
+        return reader.read_all().to_pandas()
+
+# Function run in a worker process: value one sector partition held in shared memory
+def _value_partition(memory_name, targets_size, comparables_size, methods=None):
+    """
+    Reads the partition's two IPC streams from shared memory, values the targets and returns
+    the results as Arrow IPC bytes. The streams are copied out of the block once, so no Arrow
+    buffer still points into it when it is closed.
+    """
+    memory = shared_memory.SharedMemory(name=memory_name)
+    try:
+        targets_ipc = bytes(memory.buf[:targets_size])
+        comparables_ipc = bytes(memory.buf[targets_size:targets_size + comparables_size])
+    finally:
+        memory.close()
+    targets_df = _from_ipc(targets_ipc)
+    comparables_df = _from_ipc(comparables_ipc)
+    return _to_ipc(value_companies_batch(targets_df, comparables_df, methods=methods)).to_pybytes()
+
+# Function to split the sectors into balanced partitions
+def partition_by_sector(targets_df, comparables_df, n_partitions):
+    """
+    Assigns every sector (case-insensitive) to one of `n_partitions` partitions, largest sectors first,
+    always to the partition with the fewest rows so far; rows without a sector share one key.
+    Returns a list of (target positions, comparable positions) integer arrays in original row order;
+    empty partitions are dropped.
+    """
+    target_keys = normalize_sector(targets_df['Sektor']).astype(object).fillna(MISSING_SECTOR_KEY).to_numpy()
+    comparable_keys = normalize_sector(comparables_df['Sektor']).astype(object).fillna(MISSING_SECTOR_KEY).to_numpy()
+    sizes = pd.concat([pd.Series(target_keys), pd.Series(comparable_keys)]).value_counts(sort=False)
+
+    loads = np.zeros(n_partitions, dtype=np.int64)
+    assignment = {}
+    for sector, size in sizes.sort_values(ascending=False, kind='mergesort').items():
+        partition = int(np.argmin(loads))
+        assignment[sector] = partition
+        loads[partition] += size
+
+    target_partition = pd.Series(target_keys).map(assignment).to_numpy()
+    comparable_partition = pd.Series(comparable_keys).map(assignment).to_numpy()
+    partitions = [(np.flatnonzero(target_partition == p), np.flatnonzero(comparable_partition == p)) for p in range(n_partitions)]
+    return [(targets, comparables) for targets, comparables in partitions if len(targets)]
+
+# Function to value many targets against their sectors on several processes
+def value_companies_parallel(targets_df, comparables_df, workers=None, sector_index=None, min_rows=MIN_PARALLEL_ROWS, methods=None):
+    """
+    Same result as value_companies_batch(targets_df, comparables_df, methods=methods), computed per sector partition
+    on `workers` processes (default: $FAIR_VALUE_WORKERS). Runs serially, reusing `sector_index`
+    when given, for one worker, fewer than `min_rows` rows, inputs without a 'Sektor' column or
+    when the partitions cannot be shipped to the pool.
+    """
+    workers = default_workers() if workers is None else workers
+    serial = (
+        workers <= 1 or len(targets_df) + len(comparables_df) < min_rows
+        or 'Sektor' not in targets_df.columns or 'Sektor' not in comparables_df.columns
+    )
+    if not serial:
+        try:
+            return _value_partitions_in_pool(targets_df, comparables_df, workers, methods)
+        except (BrokenProcessPool, OSError, ValueError, TypeError, ImportError) as e:
+            # ValueError/TypeError cover columns Arrow cannot convert (e.g. mixed types)
+            logger.warning(f"Parallel valuation failed ({e}), falling back to the serial path")
+    return value_companies_batch(targets_df, comparables_df, sector_index=sector_index, methods=methods)
+
+# Function to ship the sector partitions to a process pool and merge the results
+def _value_partitions_in_pool(targets_df, comparables_df, workers, methods=None):
+    """
+    Writes each partition to its own shared memory block, values the partitions on a spawned
+    process pool and returns the results in the order of `targets_df`.
+    """
+    partitions = partition_by_sector(targets_df, comparables_df, workers)
+    memories = []
+    try:
+        jobs = []
+        for target_positions, comparable_positions in partitions:
+            targets_ipc = _to_ipc(targets_df.iloc[target_positions])
+            comparables_ipc = _to_ipc(comparables_df.iloc[comparable_positions])
+            memory = shared_memory.SharedMemory(create=True, size=max(1, targets_ipc.size + comparables_ipc.size))
+            memories.append(memory)
+            memory.buf[:targets_ipc.size] = memoryview(targets_ipc).cast('B')
+            memory.buf[targets_ipc.size:targets_ipc.size + comparables_ipc.size] = memoryview(comparables_ipc).cast('B')
+            jobs.append((memory.name, targets_ipc.size, comparables_ipc.size, methods))
+
+        # spawn: forking a process that runs threads (e.g. the Streamlit server) is unsafe
+        with ProcessPoolExecutor(max_workers=min(workers, len(jobs)), mp_context=multiprocessing.get_context('spawn')) as pool:
+            results = list(pool.map(_value_partition, *zip(*jobs)))
+    finally:
+        for memory in memories:
+            memory.close()
+            memory.unlink()
+
+    merged = pd.concat([_from_ipc(result) for result in results], ignore_index=True)
+    order = np.argsort(np.concatenate([target_positions for target_positions, _ in partitions]), kind='stable')
+    return merged.iloc[order].reset_index(drop=True)[batch_result_columns(methods)]
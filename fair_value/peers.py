@@ -0,0 +1,315 @@
+"""
+Peer selection by nearest neighbours instead of an exact 'Sektor' match.
+
+Each comparable is placed in a standardized feature space (log market cap, log revenue, ROE and
+net profit margin) and the k closest companies of the whole universe become the peers of a target.
+Sector can be added as a penalty: a peer from another sector is `sector_weight` standard deviations
+further away. Lookups run against a KD-tree built once over the universe, so finding the peers of
+thousands of targets visits a few leaves per target instead of scanning every pair.
+"""
+import heapq
+
+import pandas as pd
+import numpy as np
+
+from fair_value.valuation import (
+    RATIO_COLUMNS,
+    calculate_key_ratios_vectorized,
+    classify_valuation_status,
+    get_investment_recommendation,
+    _numeric_column
+)
+from fair_value.methods import resolve_methods, method_multiples, method_fair_values, batch_result_columns
+from fair_value.sector_index import MISSING_SECTOR_KEY, normalize_sector
+
+# Feature columns of the peer space, in order
+PEER_FEATURES = ['Log Market Cap', 'Log Pendapatan', 'ROE (%)', 'Net Profit Margin (%)']
+
+# Number of peers per target
+DEFAULT_PEERS = 10
+
+# Points per KD-tree leaf; leaves are scanned with one vectorized distance computation
+DEFAULT_LEAF_SIZE = 32
+
+# Distance column added to the peer rows
+DISTANCE_COLUMN = 'Jarak Peer'
+
+# Function to compute the peer features of every company
+def peer_features(companies_df, ratios_df=None):
+    """
+    DataFrame (same index as the input) with the PEER_FEATURES columns: log10 of price x shares,
+    log10 of revenue, ROE and net profit margin. Non-positive market caps or revenues give NaN.
+    """
+    ratios_df = calculate_key_ratios_vectorized(companies_df) if ratios_df is None else ratios_df
+    market_cap = _numeric_column(companies_df, 'Harga_Saham_Saat_Ini') * _numeric_column(companies_df, 'Jumlah_Saham_Beredar')
+    revenue = _numeric_column(companies_df, 'Total_Pendapatan_Terbaru')
+    with np.errstate(divide='ignore', invalid='ignore'):
+        features = {
+            'Log Market Cap': np.where(market_cap > 0, np.log10(market_cap), np.nan),
+            'Log Pendapatan': np.where(revenue > 0, np.log10(revenue), np.nan),
+        }
+    features['ROE (%)'] = ratios_df['ROE (%)'].to_numpy(dtype=float)
+    features['Net Profit Margin (%)'] = ratios_df['Net Profit Margin (%)'].to_numpy(dtype=float)
+    return pd.DataFrame(features, index=companies_df.index)[PEER_FEATURES]
+
+class KDTree:
+    """
+    KD-tree over the rows of a 2-D float array. Nodes split the widest dimension at its median;
+    leaves hold at most `leaf_size` points. query(point, k) returns the k nearest rows.
+    """
+
+    def __init__(self, points, leaf_size=DEFAULT_LEAF_SIZE):
+        if leaf_size < 1:
+            raise ValueError('leaf_size must be at least 1')
+        self.points = np.asarray(points, dtype=float)
+        self.leaf_size = leaf_size
+        self.order = np.arange(len(self.points))
+        # Node arrays: split dimension (-1 for leaves), split value, children and the node's slice of `order`
+        self._dim, self._value, self._left, self._right, self._start, self._end = [], [], [], [], [], []
+        if len(self.points):
+            self._build(0, len(self.points))
+
+    def __len__(self):
+        return len(self.points)
+
+    def _build(self, start, end):
+        node = len(self._dim)
+        self._dim.append(-1)
+        self._value.append(0.0)
+        self._left.append(-1)
+        self._right.append(-1)
+        self._start.append(start)
+        self._end.append(end)
+        if end - start <= self.leaf_size:
+            return node
+
+        positions = self.order[start:end]
+        points = self.points[positions]
+        spread = points.max(axis=0) - points.min(axis=0)
+        dim = int(np.argmax(spread))
+        if spread[dim] == 0:
+            # Identical points cannot be split
+            return node
+
+        middle = (end - start) // 2
+        self.order[start:end] = positions[np.argpartition(points[:, dim], middle)]
+        self._dim[node] = dim
+        self._value[node] = float(self.points[self.order[start + middle], dim])
+        self._left[node] = self._build(start, start + middle)
+        self._right[node] = self._build(start + middle, end)
+        return node
+
+    def query(self, point, k, skip=None):
+        """
+        (distances, row positions) of the `k` rows nearest to `point`, closest first. Rows where the
+        boolean array `skip` is True are never returned. Fewer than `k` rows come back when fewer are left.
+        """
+        best = [] # max-heap of (-squared distance, row position)
+        if k < 1 or not len(self.points):
+            return np.array([], dtype=float), np.array([], dtype=np.intp)
+
+        point = np.asarray(point, dtype=float)
+        stack = [(0, 0.0)] # (node, lower bound of the squared distance to any point of the node)
+        while stack:
+            node, bound = stack.pop()
+            if len(best) == k and bound >= -best[0][0]:
+                continue
+
+            dim = self._dim[node]
+            if dim < 0:
+                positions = self.order[self._start[node]:self._end[node]]
+                if skip is not None:
+                    positions = positions[~skip[positions]]
+                distances = ((self.points[positions] - point) ** 2).sum(axis=1)
+                for distance, position in zip(distances.tolist(), positions.tolist()):
+                    if len(best) < k:
+                        heapq.heappush(best, (-distance, position))
+                    elif distance < -best[0][0]:
+                        heapq.heapreplace(best, (-distance, position))
+                continue
+
+            # Points of the left child are <= the split value and points of the right child >= it
+            offset = point[dim] - self._value[node]
+            near, far = (self._left[node], self._right[node]) if offset < 0 else (self._right[node], self._left[node])
+            stack.append((far, max(bound, offset * offset)))
+            stack.append((near, bound))
+
+        best.sort(key=lambda item: (-item[0], item[1]))
+        return (np.sqrt(np.array([-distance for distance, _ in best], dtype=float)),
+                np.array([position for _, position in best], dtype=np.intp))
+
+class PeerIndex:
+    """
+    Nearest-neighbour index over a comparables universe.
+
+    - Companies with a usable share count and all PEER_FEATURES are indexed; features are
+      standardized with the universe mean and standard deviation.
+    - query(targets_df, k) returns the universe row positions and distances of each target's peers.
+    - peers_for(target, k) returns one target's peer rows with their distance.
+    With `sector_weight` > 0 every peer from another sector is that many standard deviations
+    further away; the search stays exact (one tree per sector plus the universe tree). Companies
+    without a sector count as one sector of their own.
+    """
+
+    # The universe frame belongs to the caller; estimate_size does not count it
+    _shared_state = ('universe',)
+
+    def __init__(self, universe_df, sector_weight=0.0, leaf_size=DEFAULT_LEAF_SIZE):
+        if sector_weight < 0:
+            raise ValueError('sector_weight must not be negative')
+        self.universe = universe_df
+        self.sector_weight = float(sector_weight)
+        self.leaf_size = leaf_size
+        self.ratios = calculate_key_ratios_vectorized(universe_df)
+
+        features = peer_features(universe_df, self.ratios).to_numpy(dtype=float)
+        eligible = np.isfinite(features).all(axis=1) & (_numeric_column(universe_df, 'Jumlah_Saham_Beredar') != 0)
+        # Universe row position of every indexed point
+        self.positions = np.flatnonzero(eligible)
+
+        indexed = features[self.positions]
+        self.mean = indexed.mean(axis=0) if len(indexed) else np.zeros(len(PEER_FEATURES))
+        std = indexed.std(axis=0) if len(indexed) else np.ones(len(PEER_FEATURES))
+        self.std = np.where(std > 0, std, 1.0)
+        self.tree = KDTree((indexed - self.mean) / self.std, leaf_size)
+
+        self.tickers = (universe_df['Ticker'].astype(str).to_numpy()[self.positions]
+                        if 'Ticker' in universe_df.columns else np.full(len(self.positions), ''))
+        self.sectors = (normalize_sector(universe_df['Sektor']).astype(object).fillna(MISSING_SECTOR_KEY).to_numpy()[self.positions]
+                        if 'Sektor' in universe_df.columns else np.full(len(self.positions), ''))
+        self._ticker_counts = pd.Series(self.tickers).value_counts().to_dict()
+        self._sector_trees = {}
+
+    def __len__(self):
+        return len(self.positions)
+
+    def standardize(self, companies_df):
+        """Standardized PEER_FEATURES of `companies_df` (rows with a missing feature contain NaN)."""
+        return (peer_features(companies_df).to_numpy(dtype=float) - self.mean) / self.std
+
+    def _sector_tree(self, sector):
+        """(KDTree over the indexed points of `sector`, their point numbers), built on first use."""
+        if sector not in self._sector_trees:
+            members = np.flatnonzero(self.sectors == sector)
+            self._sector_trees[sector] = (KDTree(self.tree.points[members], self.leaf_size), members)
+        return self._sector_trees[sector]
+
+    def _nearest(self, point, k, ticker, sector, own_sector):
+        """
+        (distances, point numbers) of the `k` nearest indexed points to `point`, leaving out every
+        point of the target's own ticker. `own_sector` marks the indexed points of `sector`.
+        """
+        # Rows of the target itself are dropped after the search, so ask for enough extra neighbours
+        extra = self._ticker_counts.get(ticker, 0) if ticker is not None else 0
+
+        if self.sector_weight == 0 or sector is None:
+            distances, points = self.tree.query(point, k + extra)
+        else:
+            # Exact penalized search: the nearest of the own sector and of the other sectors, merged
+            sector_tree, members = self._sector_tree(sector)
+            same_distances, same_points = sector_tree.query(point, k + extra)
+            other_distances, other_points = self.tree.query(point, k + extra, skip=own_sector)
+            distances = np.concatenate([same_distances, np.sqrt(other_distances ** 2 + self.sector_weight ** 2)])
+            points = np.concatenate([members[same_points], other_points])
+            order = np.argsort(distances, kind='stable')
+            distances, points = distances[order], points[order]
+
+        if extra:
+            keep = self.tickers[points] != ticker
+            distances, points = distances[keep], points[keep]
+        return distances[:k], points[:k]
+
+    def query(self, targets_df, k=DEFAULT_PEERS):
+        """
+        Peers of every row of `targets_df`, excluding companies with the target's own ticker.
+        Returns (positions, distances): (len(targets_df), k) arrays of universe row positions (-1 where
+        a target has fewer than k peers or lacks a feature) and standardized distances (NaN there).
+        """
+        if k < 1:
+            raise ValueError('k must be at least 1')
+        positions = np.full((len(targets_df), k), -1, dtype=np.intp)
+        distances = np.full((len(targets_df), k), np.nan)
+        if targets_df.empty or not len(self):
+            return positions, distances
+
+        points = self.standardize(targets_df)
+        usable = np.isfinite(points).all(axis=1)
+        tickers = targets_df['Ticker'].astype(str).to_numpy() if 'Ticker' in targets_df.columns else np.full(len(targets_df), None)
+        use_sector = self.sector_weight > 0 and 'Sektor' in targets_df.columns
+        sectors = normalize_sector(targets_df['Sektor']).astype(object).fillna(MISSING_SECTOR_KEY).to_numpy() if use_sector else np.full(len(targets_df), None)
+
+        # Targets are grouped by sector so the mask of the sector's own points is built once per sector
+        for sector in pd.unique(sectors):
+            own_sector = self.sectors == sector if use_sector else None
+            for row in np.flatnonzero((sectors == sector) & usable):
+                row_distances, row_points = self._nearest(points[row], k, tickers[row], sector, own_sector)
+                positions[row, :len(row_points)] = self.positions[row_points]
+                distances[row, :len(row_points)] = row_distances
+        return positions, distances
+
+    def peers_for(self, target, k=DEFAULT_PEERS):
+        """
+        The `k` nearest companies of the universe to `target` (a dict or a row Series), closest first,
+        with their standardized distance in DISTANCE_COLUMN. Empty if the target lacks a feature.
+        """
+        positions, distances = self.query(pd.DataFrame([dict(target)]), k)
+        found = positions[0] >= 0
+        peers = self.universe.iloc[positions[0][found]].copy()
+        peers[DISTANCE_COLUMN] = distances[0][found]
+        return peers
+
+# Function to average the peers' multiples the way the sector averages do
+def _peer_means(multiples, positions):
+    """
+    (targets x methods) means of the usable (finite) multiples of each target's peers, gathered from the
+    (universe x methods) array `multiples` by the (targets x k) `positions`, and the number of peers per target.
+    """
+    found = positions >= 0
+    values = multiples[np.where(found, positions, 0)]
+    usable = found[..., np.newaxis] & np.isfinite(values)
+    count = usable.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = np.where(count > 0, np.where(usable, values, 0.0).sum(axis=1) / count, np.nan)
+    return means, found.sum(axis=1)
+
+# Function to value many targets against their nearest peers
+def value_companies_with_peers(targets_df, universe_df, k=DEFAULT_PEERS, sector_weight=0.0, peer_index=None, methods=None):
+    """
+    Same columns as value_companies_batch(..., methods=methods), with the averages taken over each
+    target's `k` nearest peers of `universe_df` (the target's own ticker excluded) instead of its sector.
+    'Rata-rata Sektor <method>' then holds the peer averages and 'Jumlah Pembanding' the number of peers.
+    A prebuilt PeerIndex over `universe_df` can be passed to reuse its tree.
+    """
+    method_keys = [method.key for method in resolve_methods(methods)]
+    if targets_df.empty:
+        return pd.DataFrame(columns=batch_result_columns(method_keys))
+
+    if peer_index is None:
+        peer_index = PeerIndex(universe_df, sector_weight=sector_weight)
+
+    positions, _ = peer_index.query(targets_df, k)
+    universe_multiples = method_multiples(peer_index.universe, method_keys).to_numpy(dtype=float)
+    peer_means, peer_count = _peer_means(universe_multiples, positions)
+
+    target_ratios = calculate_key_ratios_vectorized(targets_df)
+    current_price = _numeric_column(targets_df, 'Harga_Saham_Saat_Ini')
+    fair_values = method_fair_values(current_price, method_multiples(targets_df, method_keys).to_numpy(dtype=float), peer_means, method_keys)
+    statuses = classify_valuation_status(current_price[:, np.newaxis], fair_values)
+
+    result = pd.DataFrame({
+        'Ticker': targets_df['Ticker'].to_numpy() if 'Ticker' in targets_df.columns else '',
+        'Nama_Perusahaan': targets_df['Nama_Perusahaan'].to_numpy() if 'Nama_Perusahaan' in targets_df.columns else '',
+        'Sektor': targets_df['Sektor'].to_numpy() if 'Sektor' in targets_df.columns else '',
+        'Harga_Saham_Saat_Ini': current_price,
+    })
+    for ratio in RATIO_COLUMNS:
+        result[ratio] = target_ratios[ratio].to_numpy(dtype=float)
+    for j, key in enumerate(method_keys):
+        result[f'Rata-rata Sektor {key}'] = peer_means[:, j]
+    result['Jumlah Pembanding'] = peer_count
+    for j, key in enumerate(method_keys):
+        result[f'Fair Value ({key})'] = fair_values[:, j]
+    for j, key in enumerate(method_keys):
+        result[f'Status ({key})'] = statuses[:, j]
+    result['Rekomendasi'] = get_investment_recommendation(*statuses.T)
+    return result[batch_result_columns(method_keys)]
@@ -0,0 +1,150 @@
+"""
+Per-stage wall time and memory of the valuation pipeline.
+
+A StageProfiler is created for each run (a dashboard rerun or a command line call) and every
+pipeline step is wrapped in `with profiler.stage('ingest'):`. Repeated stages add up. The result
+can be shown as a table, written as one JSON log record per run, or appended to a JSON lines file
+to track regressions over time.
+
+Memory comes from tracemalloc, which is global to the process. It is started once, at startup, by
+start_memory_tracing() and never stopped or reset by a run, so profilers of concurrent sessions only
+read it. Allocations of other threads running at the same time are counted in every stage they overlap.
+"""
+import json
+import logging
+import os
+import time
+import tracemalloc
+
+import pandas as pd
+
+# Pipeline stages in the order they run
+PIPELINE_STAGES = ('ingest', 'filter', 'ratios', 'aggregation', 'fair_value', 'render')
+
+# Environment variable naming a JSON lines file that every finished run is appended to
+PROFILE_LOG_ENV = 'FAIR_VALUE_PROFILE_LOG'
+
+# Environment variable that turns on memory tracing for the whole process (e.g. the dashboard server)
+TRACE_MEMORY_ENV = 'FAIR_VALUE_TRACE_MEMORY'
+
+logger = logging.getLogger('fair_value.profiling')
+
+# Function to start the process-wide memory tracer once
+def start_memory_tracing():
+    """
+    Starts tracemalloc for the rest of the process; a no-op when it is already tracing.
+    Returns True when memory is being traced.
+    """
+    if not tracemalloc.is_tracing():
+        tracemalloc.start()
+    return tracemalloc.is_tracing()
+
+class StageProfiler:
+    """
+    Records wall time (and, with trace_memory while tracemalloc is running, Python/NumPy
+    allocations) for named pipeline stages.
+    """
+
+    def __init__(self, trace_memory=False, run_label=None):
+        self.trace_memory = trace_memory
+        self.run_label = run_label
+        self.records = []
+        self._started = time.perf_counter()
+        self._started_at = time.time()
+
+    def stage(self, name):
+        """Context manager timing one execution of stage `name`."""
+        return _StageTimer(self, name)
+
+    def summary(self):
+        """
+        One row per stage (pipeline order first): calls, total seconds, share of the run, net allocated
+        bytes and the most a single call raised the process's peak traced memory (None when not traced).
+        """
+        columns = ['stage', 'calls', 'seconds', 'share', 'memory_delta_bytes', 'memory_peak_bytes']
+        if not self.records:
+            return pd.DataFrame(columns=columns)
+
+        records = pd.DataFrame(self.records).astype({'memory_delta_bytes': float, 'memory_peak_bytes': float})
+        summary = records.groupby('stage', sort=False).agg(
+            calls=('seconds', 'size'),
+            seconds=('seconds', 'sum'),
+            memory_delta_bytes=('memory_delta_bytes', lambda values: values.sum(min_count=1)),
+            memory_peak_bytes=('memory_peak_bytes', 'max')
+        ).reset_index()
+        order = {stage: i for i, stage in enumerate(PIPELINE_STAGES)}
+        summary = summary.sort_values('stage', key=lambda stages: stages.map(lambda s: order.get(s, len(order))), kind='mergesort')
+        summary['share'] = summary['seconds'] / max(self.elapsed(), 1e-12)
+        return summary[columns].reset_index(drop=True)
+
+    def elapsed(self):
+        """Seconds since the profiler was created."""
+        return time.perf_counter() - self._started
+
+    def to_dict(self):
+        """
+        JSON-serializable report of the run: label, start time, total seconds, whether memory was
+        traced and the per-stage summary.
+        """
+        summary = self.summary().astype(object).where(lambda frame: frame.notna(), None)
+        return {
+            'run': self.run_label,
+            'started_at': self._started_at,
+            'total_seconds': self.elapsed(),
+            'trace_memory': self.trace_memory and tracemalloc.is_tracing(),
+            'stages': summary.to_dict(orient='records')
+        }
+
+    def to_json(self, **kwargs):
+        """The report of to_dict as a JSON string."""
+        return json.dumps(self.to_dict(), **kwargs)
+
+    def finish(self, path=None):
+        """
+        Ends the run: logs the report as one JSON record on the 'fair_value.profiling' logger and appends it
+        to `path` (or the file named by $FAIR_VALUE_PROFILE_LOG) as a JSON line. Returns the report dict.
+        """
+        report = self.to_dict()
+        line = json.dumps(report)
+        logger.info(line)
+
+        path = path or os.environ.get(PROFILE_LOG_ENV)
+        if path:
+            try:
+                with open(path, 'a', encoding='utf-8') as handle:
+                    handle.write(line + '\n')
+            except OSError as e:
+                logger.warning(f"Failed to write profile to '{path}': {e}")
+        return report
+
+class _StageTimer:
+    """
+    Context manager used by StageProfiler.stage. It only reads the tracer: the peak is how much
+    the stage raised the process's high-water mark, 0 when it stayed below an earlier peak.
+    """
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.memory_before = None
+        if self.profiler.trace_memory and tracemalloc.is_tracing():
+            self.memory_before = tracemalloc.get_traced_memory()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, exc_type, exc_value, traceback):
+        seconds = time.perf_counter() - self.start
+        memory_delta = memory_peak = None
+        if self.memory_before is not None and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            memory_delta = current - self.memory_before[0]
+            memory_peak = peak - self.memory_before[1]
+        self.profiler.records.append({
+            'stage': self.name,
+            'seconds': seconds,
+            'memory_delta_bytes': memory_delta,
+            'memory_peak_bytes': memory_peak
+        })
+        return False
@@ -0,0 +1,179 @@
+"""
+Formatted Excel report of batch valuation results.
+
+The workbook has a 'Ringkasan' sheet with the recommendation counts per sector and one sheet per
+sector with the ratios, sector averages, fair values and statuses of its companies. It is written
+with xlsxwriter's constant_memory mode: every row is flushed to disk as soon as the next one starts,
+so memory stays flat however many companies the results hold. Formats are set per column and the
+status colours are conditional formats, so no cell is formatted one by one.
+"""
+import os
+import re
+import tempfile
+
+import pandas as pd
+import numpy as np
+
+from fair_value.valuation import RATIO_COLUMNS
+from fair_value.sector_index import normalize_sector
+
+# Name of the summary sheet
+REPORT_SUMMARY_SHEET = 'Ringkasan'
+
+# Sheet used for all rows when the results have no 'Sektor' column
+REPORT_ALL_SHEET = 'Hasil_Valuasi'
+
+# Columns of the summary sheet
+REPORT_SUMMARY_COLUMNS = ['Sektor', 'Sheet', 'Jumlah Perusahaan', 'BUY', 'HOLD', 'HOLD/SELL']
+
+# Excel limits on sheet names
+_SHEET_NAME_LENGTH = 31
+_INVALID_SHEET_CHARACTERS = re.compile(r'[\[\]:*?/\\]')
+
+# Colours of the statuses and recommendations (same palette as the gauges)
+_GOOD = {'bg_color': '#A3BE8C', 'font_color': '#1B3A1B'}
+_BAD = {'bg_color': '#BF616A', 'font_color': '#FFFFFF'}
+_NEUTRAL = {'bg_color': '#EBCB8B', 'font_color': '#3B3000'}
+_STATUS_COLOURS = {'UNDERVALUED': _GOOD, 'OVERVALUED': _BAD, 'FAIR': _NEUTRAL}
+_RECOMMENDATION_COLOURS = {'BUY': _GOOD, 'HOLD/SELL': _BAD, 'HOLD': _NEUTRAL}
+
+# Function to turn a sector name into a valid, unique sheet name
+def sector_sheet_name(sector, used_names):
+    """
+    `sector` without the characters Excel forbids, cut to 31 characters and made unique
+    (case-insensitive) against `used_names`, which is updated.
+    """
+    name = _INVALID_SHEET_CHARACTERS.sub('_', str(sector)).strip().strip("'") or 'Sektor'
+    name = name[:_SHEET_NAME_LENGTH]
+    candidate, number = name, 2
+    while candidate.lower() in used_names or candidate.lower() == REPORT_SUMMARY_SHEET.lower():
+        suffix = f' ({number})'
+        candidate = name[:_SHEET_NAME_LENGTH - len(suffix)] + suffix
+        number += 1
+    used_names.add(candidate.lower())
+    return candidate
+
+# Function to pick the number format of a results column
+def _column_format(column):
+    """
+    xlsxwriter num_format for a batch results column, or None for text columns.
+    """
+    if column == 'Harga_Saham_Saat_Ini' or column.startswith('Fair Value ('):
+        return '#,##0'
+    if column in RATIO_COLUMNS or column.startswith('Rata-rata Sektor '):
+        return '#,##0.00'
+    if column == 'Jumlah Pembanding':
+        return '0'
+    return None
+
+# Function to convert the results to per-column arrays of cell values
+def _cell_columns(results):
+    """
+    One object array per column; missing and infinite numbers become None (an empty cell), as Excel has no NaN.
+    """
+    columns = []
+    for column in results.columns:
+        values = results[column]
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            numbers = values.to_numpy(dtype=float)
+            cells = numbers.astype(object)
+            cells[~np.isfinite(numbers)] = None
+        else:
+            cells = values.to_numpy(dtype=object, copy=True)
+            cells[pd.isna(values).to_numpy()] = None
+        columns.append(cells)
+    return columns
+
+# Function to write one sheet of results rows
+def _write_results_sheet(workbook, name, rows_df, formats):
+    """
+    Writes the header and the rows of `rows_df` in order, as constant_memory requires, then the
+    column formats, conditional colours, frozen header and autofilter. Cell values are converted
+    one sheet at a time, so only one sector is held as Python objects.
+    """
+    columns = [str(column) for column in rows_df.columns]
+    worksheet = workbook.add_worksheet(name)
+    worksheet.write_row(0, 0, columns, formats['header'])
+    for excel_row, values in enumerate(zip(*_cell_columns(rows_df)), start=1):
+        worksheet.write_row(excel_row, 0, values)
+
+    last_row = max(len(rows_df), 1)
+    for j, column in enumerate(columns):
+        number_format = _column_format(column)
+        width = 14 if number_format else max(12, min(40, len(column) + 2))
+        worksheet.set_column(j, j, width, formats.get(number_format))
+        colours = _STATUS_COLOURS if column.startswith('Status (') else _RECOMMENDATION_COLOURS if column == 'Rekomendasi' else None
+        for value, colour in (colours or {}).items():
+            worksheet.conditional_format(1, j, last_row, j, {
+                'type': 'cell', 'criteria': 'equal to', 'value': f'"{value}"', 'format': formats[colour['bg_color']]
+            })
+    worksheet.freeze_panes(1, 1)
+    worksheet.autofilter(0, 0, len(rows_df), len(columns) - 1)
+
+# Function to write the valuation report workbook
+def write_valuation_report(results, path):
+    """
+    Writes batch valuation results (value_companies_batch columns, any valuation methods) to the
+    .xlsx file `path`: a summary sheet and one sheet per sector (case-insensitive, in order of first
+    appearance), or a single sheet when there is no 'Sektor' column. Returns the sheet names.
+    """
+    import xlsxwriter
+
+    if 'Sektor' in results.columns and not results.empty:
+        sector_keys = normalize_sector(results['Sektor'].astype(object).fillna('')).reset_index(drop=True)
+        groups = list(sector_keys.groupby(sector_keys, sort=False).indices.items())
+    else:
+        groups = []
+
+    # constant_memory only works with a file on disk, not with an in-memory workbook
+    workbook = xlsxwriter.Workbook(path, {'constant_memory': True})
+    try:
+        formats = {
+            'header': workbook.add_format({'bold': True, 'text_wrap': True, 'valign': 'top', 'fg_color': '#D7E4BC', 'border': 1}),
+            'bold': workbook.add_format({'bold': True})
+        }
+        for number_format in ('#,##0', '#,##0.00', '0'):
+            formats[number_format] = workbook.add_format({'num_format': number_format})
+        for colour in (_GOOD, _BAD, _NEUTRAL):
+            formats[colour['bg_color']] = workbook.add_format(colour)
+
+        if not groups:
+            _write_results_sheet(workbook, REPORT_ALL_SHEET, results, formats)
+            return [REPORT_ALL_SHEET]
+
+        # Summary first: the sheet names are known before any sector sheet is written
+        used_names = set()
+        sheet_names = [sector_sheet_name(results['Sektor'].iloc[rows[0]], used_names) for _, rows in groups]
+        recommendations = results['Rekomendasi'].astype(str).to_numpy() if 'Rekomendasi' in results.columns else np.full(len(results), '')
+        summary = workbook.add_worksheet(REPORT_SUMMARY_SHEET)
+        summary.write_row(0, 0, REPORT_SUMMARY_COLUMNS, formats['header'])
+        for i, ((_, rows), sheet_name) in enumerate(zip(groups, sheet_names), start=1):
+            counts = pd.Series(recommendations[rows]).value_counts()
+            summary.write_row(i, 0, [str(results['Sektor'].iloc[rows[0]])])
+            summary.write_url(i, 1, "internal:'" + sheet_name.replace("'", "''") + "'!A1", string=sheet_name)
+            summary.write_row(i, 2, [len(rows)] + [int(counts.get(label, 0)) for label in ('BUY', 'HOLD', 'HOLD/SELL')])
+        summary.write_row(len(groups) + 1, 0, ['Total', '', len(results)] + [int((recommendations == label).sum()) for label in ('BUY', 'HOLD', 'HOLD/SELL')], formats['bold'])
+        summary.set_column(0, 1, 24)
+        summary.set_column(2, 5, 12)
+        summary.freeze_panes(1, 0)
+
+        for (_, rows), sheet_name in zip(groups, sheet_names):
+            _write_results_sheet(workbook, sheet_name, results.iloc[rows], formats)
+        return [REPORT_SUMMARY_SHEET] + sheet_names
+    finally:
+        workbook.close()
+
+# Function to build the valuation report as bytes (for downloads)
+def valuation_report_bytes(results):
+    """
+    The report of write_valuation_report as .xlsx bytes, written through a temporary file
+    that is removed afterwards.
+    """
+    descriptor, path = tempfile.mkstemp(suffix='.xlsx', prefix='fair_value_report_')
+    os.close(descriptor)
+    try:
+        write_valuation_report(results, path)
+        with open(path, 'rb') as f:
+            return f.read()
+    finally:
+        os.remove(path)
@@ -0,0 +1,106 @@
+"""
+Typed schema of the company tables, applied once at load time.
+
+Excel and CSV readers return numbers as object or float64 columns with no validation. apply_schema
+coerces every column to its type in one vectorized pass: 'Ticker'/'Sektor' to categoricals (when
+values repeat; a categorical of unique tickers is larger than the strings), the share count to
+nullable Int64 and the monetary fields to float64. Missing and malformed values get explicit null
+masks, and every invalid row is listed once in a single issues table, so the valuation code can
+work on typed arrays instead of checking values one by one.
+"""
+from collections import namedtuple
+
+import pandas as pd
+import numpy as np
+
+# Columns of the company tables, by type
+CATEGORY_COLUMNS = ['Ticker', 'Sektor']
+SHARE_COLUMNS = ['Jumlah_Saham_Beredar']
+MONEY_COLUMNS = ['Harga_Saham_Saat_Ini', 'Net_Income_Terbaru', 'Total_Pendapatan_Terbaru', 'Total_Ekuitas_Terbaru']
+REQUIRED_COLUMNS = ['Ticker', 'Nama_Perusahaan', 'Sektor', 'Harga_Saham_Saat_Ini', 'Jumlah_Saham_Beredar',
+                    'Net_Income_Terbaru', 'Total_Pendapatan_Terbaru', 'Total_Ekuitas_Terbaru']
+
+# Columns of the issues table; 'Baris' is the row number in the file (the header is row 1)
+ISSUE_COLUMNS = ['Baris', 'Ticker', 'Masalah']
+
+# Result of apply_schema
+# - frame: the typed DataFrame (same rows and index as the input)
+# - nulls: boolean DataFrame, True where a required value is missing or could not be read
+# - valid: boolean Series, True for rows without any problem
+# - issues: one row per invalid row (ISSUE_COLUMNS)
+# - missing_columns: required columns absent from the input
+SchemaResult = namedtuple('SchemaResult', ['frame', 'nulls', 'valid', 'issues', 'missing_columns'])
+
+# Share of distinct values below which a text column is stored as a categorical
+CATEGORY_MAX_UNIQUE_SHARE = 0.5
+
+# Function to turn a column into strings, categorical when values repeat
+def _to_category(values):
+    """
+    Non-missing values as strings (so 1234 and '1234' are the same ticker), stored as a categorical
+    when at most CATEGORY_MAX_UNIQUE_SHARE of them are distinct.
+    """
+    strings = values.where(values.isna(), values.astype(str))
+    if strings.nunique() <= CATEGORY_MAX_UNIQUE_SHARE * len(strings):
+        return strings.astype('category')
+    return strings
+
+# Function to coerce and validate a company table
+def apply_schema(df):
+    """
+    Coerces `df` to the typed schema and validates it in one pass. Problems found per row:
+    missing required values, text in numeric columns, negative prices or share counts and
+    fractional share counts. Rows are never dropped; their problems are returned in `issues`.
+    Returns SchemaResult.
+    """
+    frame = df.copy(deep=False)
+    missing_columns = [column for column in REQUIRED_COLUMNS if column not in frame.columns]
+    nulls = pd.DataFrame(False, index=frame.index, columns=[c for c in REQUIRED_COLUMNS if c in frame.columns])
+    problems = []
+
+    for column in nulls.columns:
+        raw = frame[column]
+        nulls[column] = raw.isna().to_numpy()
+        problems.append((raw.isna(), f'{column} kosong'))
+
+        if column in MONEY_COLUMNS or column in SHARE_COLUMNS:
+            numeric = pd.to_numeric(raw, errors='coerce').astype('float64')
+            unreadable = numeric.isna() & raw.notna()
+            nulls[column] |= unreadable.to_numpy()
+            problems.append((unreadable, f'{column} bukan angka'))
+
+            if column == 'Harga_Saham_Saat_Ini' or column in SHARE_COLUMNS:
+                problems.append((numeric < 0, f'{column} negatif'))
+
+            if column in SHARE_COLUMNS:
+                fractional = numeric.notna() & (numeric % 1 != 0)
+                problems.append((fractional, f'{column} bukan bilangan bulat'))
+                nulls[column] |= fractional.to_numpy()
+                frame[column] = numeric.where(~fractional).astype('Int64')
+            else:
+                frame[column] = numeric
+        elif column in CATEGORY_COLUMNS:
+            frame[column] = _to_category(raw)
+
+    flags = pd.DataFrame({message: mask.to_numpy(dtype=bool) for mask, message in problems if mask.any()}, index=frame.index)
+    valid = ~flags.any(axis=1) if not flags.empty else pd.Series(True, index=frame.index)
+
+    invalid_positions = np.flatnonzero(~valid.to_numpy())
+    if len(invalid_positions):
+        invalid_flags = flags.iloc[invalid_positions]
+        messages = ['; '.join(invalid_flags.columns[row]) for row in invalid_flags.to_numpy()]
+        tickers = frame['Ticker'].iloc[invalid_positions].astype(object).to_numpy() if 'Ticker' in frame.columns else None
+        # Streamed frames keep the original row positions as index; others have a RangeIndex
+        positions = frame.index[invalid_positions] if pd.api.types.is_integer_dtype(frame.index) else invalid_positions
+        issues = pd.DataFrame({'Baris': np.asarray(positions) + 2, 'Ticker': tickers, 'Masalah': messages})
+    else:
+        issues = pd.DataFrame(columns=ISSUE_COLUMNS)
+
+    return SchemaResult(frame, nulls, valid, issues, missing_columns)
+
+# Function to list the required fields of one company record that have no usable value
+def missing_fields(record):
+    """
+    Names of REQUIRED_COLUMNS that are absent, None or NaN in `record` (a dict or a row Series).
+    """
+    return [column for column in REQUIRED_COLUMNS if column not in record or pd.isna(record[column])]
@@ -0,0 +1,172 @@
+"""
+Ratio screener over the comparables universe.
+
+Queries such as "P/E < 10 and ROE > 15 and P/B < sektor" are answered from indexes built once
+per dataset: for every screenable field the non-missing values are sorted together with their row
+positions, so a range condition is two binary searches and a slice. Each condition becomes a
+boolean bitmap over the rows and the conditions are intersected with a bitwise AND.
+
+Ratios follow calculate_key_ratios: P/E and P/B are inf when earnings or equity are zero (so they
+match '>' conditions and never '<' ones) and missing when the share count is zero or a value is missing.
+"""
+import re
+from collections import namedtuple
+
+import pandas as pd
+import numpy as np
+
+from fair_value.valuation import RATIO_COLUMNS, calculate_key_ratios_vectorized
+from fair_value.sector_index import SectorIndex
+
+# Suffix of the fields holding a ratio minus its sector average ("below sector average" is < 0)
+SECTOR_RELATIVE_SUFFIX = ' vs Sektor'
+
+# Fields that can be screened, in display order
+SCREEN_FIELDS = RATIO_COLUMNS + [ratio + SECTOR_RELATIVE_SUFFIX for ratio in RATIO_COLUMNS]
+
+# Short names accepted in queries (case-insensitive); full field names are accepted as well
+FIELD_ALIASES = {
+    'p/e': 'P/E Ratio', 'pe': 'P/E Ratio', 'per': 'P/E Ratio',
+    'p/b': 'P/B Ratio', 'pb': 'P/B Ratio', 'pbv': 'P/B Ratio',
+    'roe': 'ROE (%)',
+    'npm': 'Net Profit Margin (%)', 'margin': 'Net Profit Margin (%)'
+}
+
+# Words standing for the sector average on the right-hand side of a condition
+SECTOR_AVERAGE_WORDS = ('sektor', 'sector', 'rata-rata sektor')
+
+SCREEN_OPERATORS = ('<', '<=', '>', '>=')
+
+# One condition of a screen: `field` `operator` `value`
+ScreenCondition = namedtuple('ScreenCondition', ['field', 'operator', 'value'])
+
+_CONDITION_PATTERN = re.compile(r'^\s*(?P<field>.+?)\s*(?P<operator><=|>=|<|>)\s*(?P<value>.+?)\s*$')
+_CONDITION_SEPARATOR = re.compile(r'\s+(?:and|dan)\s+|\s*[&,;]\s*', re.IGNORECASE)
+
+# Function to resolve a field name or alias
+def _resolve_field(name):
+    """
+    Screen field for a query name (alias or full field name, case-insensitive). Raises ValueError if unknown.
+    """
+    key = name.strip().lower()
+    if key in FIELD_ALIASES:
+        return FIELD_ALIASES[key]
+    for field in SCREEN_FIELDS:
+        if field.lower() == key:
+            return field
+    raise ValueError(f"Unknown field '{name.strip()}'. Use one of: P/E, P/B, ROE, NPM")
+
+# Function to parse a text query into conditions
+def parse_screen_query(query):
+    """
+    Conditions of a query like "P/E < 10 and ROE >= 15% dan P/B < sektor". Conditions are joined with
+    'and', 'dan', '&', ',' or ';'. A value may end in '%'; 'sektor' compares the ratio with its sector
+    average. Returns a list of ScreenCondition (empty for a blank query); raises ValueError on bad syntax.
+    """
+    conditions = []
+    if not query or not query.strip():
+        return conditions
+
+    for part in _CONDITION_SEPARATOR.split(query.strip()):
+        match = _CONDITION_PATTERN.match(part)
+        if match is None:
+            raise ValueError(f"Cannot read condition '{part.strip()}'. Expected e.g. 'P/E < 10'")
+        field = _resolve_field(match['field'])
+        value = match['value'].strip().lower()
+
+        if value in SECTOR_AVERAGE_WORDS:
+            if field.endswith(SECTOR_RELATIVE_SUFFIX):
+                raise ValueError(f"'{field}' is already relative to the sector average")
+            conditions.append(ScreenCondition(field + SECTOR_RELATIVE_SUFFIX, match['operator'], 0.0))
+            continue
+        try:
+            number = float(value.rstrip('%').replace('_', ''))
+        except ValueError:
+            raise ValueError(f"Cannot read value '{match['value'].strip()}' in condition '{part.strip()}'") from None
+        conditions.append(ScreenCondition(field, match['operator'], number))
+    return conditions
+
+class ScreenIndex:
+    """
+    Sorted value indexes over a companies DataFrame, one per SCREEN_FIELDS entry.
+
+    - values holds the per-row field values (NaN where a ratio is missing).
+    - match(condition) returns the bitmap of rows satisfying one condition.
+    - screen(query) intersects the bitmaps of every condition and returns the matching row positions.
+    """
+
+    def __init__(self, companies_df, ratios=None, sector_index=None):
+        """
+        `ratios` and a SectorIndex over `companies_df` may be passed when they are already known.
+        """
+        # The companies frame and passed-in ratios belong to the caller; estimate_size does not count them
+        self._shared_state = ('companies',) if ratios is None else ('companies', 'ratios')
+        self.companies = companies_df
+        self.ratios = calculate_key_ratios_vectorized(companies_df) if ratios is None else ratios
+        if sector_index is None and 'Sektor' in companies_df.columns:
+            sector_index = SectorIndex(companies_df, ratios=self.ratios)
+
+        values = {ratio: self.ratios[ratio].to_numpy(dtype=float) for ratio in RATIO_COLUMNS}
+        for ratio in RATIO_COLUMNS:
+            # Sector averages include the company itself; a value is below the average with or without
+            # it, so the comparison matches the leave-one-out averages of batch valuation
+            sector_average = np.full(len(companies_df), np.nan)
+            if sector_index is not None and not sector_index.totals.empty:
+                averages = pd.Series({sector: sector_index.averages(sector).get(ratio, np.nan) for sector in sector_index.sectors}, dtype=float)
+                sector_average = sector_index.sector_keys.map(averages).to_numpy(dtype=float)
+            with np.errstate(invalid='ignore'):
+                values[ratio + SECTOR_RELATIVE_SUFFIX] = values[ratio] - sector_average
+        self.values = pd.DataFrame(values, index=companies_df.index)[SCREEN_FIELDS]
+
+        # Per field: row positions of the non-missing values in ascending value order, and those values
+        self._order, self._sorted = {}, {}
+        for field in SCREEN_FIELDS:
+            column = values[field]
+            present = np.flatnonzero(~np.isnan(column))
+            order = present[np.argsort(column[present], kind='stable')]
+            self._order[field] = order
+            self._sorted[field] = column[order]
+
+    def __len__(self):
+        return len(self.companies)
+
+    def _bounds(self, condition):
+        """Slice [start, stop) of the sorted values of the condition's field that satisfies it."""
+        if condition.operator not in SCREEN_OPERATORS:
+            raise ValueError(f"Unknown operator '{condition.operator}'. Use one of: {', '.join(SCREEN_OPERATORS)}")
+        sorted_values = self._sorted[condition.field]
+        if condition.operator == '<':
+            return 0, np.searchsorted(sorted_values, condition.value, side='left')
+        if condition.operator == '<=':
+            return 0, np.searchsorted(sorted_values, condition.value, side='right')
+        if condition.operator == '>':
+            return np.searchsorted(sorted_values, condition.value, side='right'), len(sorted_values)
+        return np.searchsorted(sorted_values, condition.value, side='left'), len(sorted_values)
+
+    def count(self, condition):
+        """Number of rows satisfying one condition, from the sorted index alone."""
+        start, stop = self._bounds(condition)
+        return int(stop - start)
+
+    def match(self, condition):
+        """Boolean bitmap (one entry per row) of the rows satisfying one ScreenCondition."""
+        if condition.field not in self._order:
+            raise ValueError(f"Unknown field '{condition.field}'")
+        start, stop = self._bounds(condition)
+        bitmap = np.zeros(len(self), dtype=bool)
+        bitmap[self._order[condition.field][start:stop]] = True
+        return bitmap
+
+    def screen(self, query):
+        """
+        Row positions (ascending) of the companies satisfying every condition of `query`
+        (a text query or a list of ScreenCondition). An empty query matches every row.
+        """
+        conditions = parse_screen_query(query) if isinstance(query, str) else list(query)
+        bitmap = np.ones(len(self), dtype=bool)
+        # Most selective condition first, so an empty intersection stops early
+        for condition in sorted(conditions, key=self.count):
+            bitmap &= self.match(condition)
+            if not bitmap.any():
+                break
+        return np.flatnonzero(bitmap)
@@ -0,0 +1,151 @@
+"""
+Sector index over the comparables universe: the 'Sektor' column is normalized and
+grouped once, and per-sector ratio aggregates are precomputed, so each lookup is a
+dictionary access instead of a string comparison over the whole frame.
+"""
+import pandas as pd
+import numpy as np
+
+from fair_value.valuation import RATIO_COLUMNS, calculate_key_ratios_vectorized, _numeric_column
+from fair_value.sector_stats import MULTIPLE_RATIOS, AVERAGE_ORDER, compute_sector_statistics, sector_averages_from_statistics
+
+# Key of the rows without a sector where they are kept together as one group (parallel partitions, peer search)
+MISSING_SECTOR_KEY = '\x00'
+
+# Function to normalize sector names the way get_sector_comparables_from_excel compares them
+def normalize_sector(sectors):
+    """
+    Case-insensitive sector key: the value as a string, lower-cased. Accepts a Series or a single value.
+    """
+    if isinstance(sectors, pd.Series):
+        return sectors.astype(str).str.lower()
+    return str(sectors).lower()
+
+class SectorIndex:
+    """
+    Groups a comparables DataFrame by normalized sector once.
+
+    - positions(sector) returns the integer row positions of the sector (no frame copy).
+    - averages(sector) returns the precomputed sector averages, identical in content to
+      calculate_sector_averages_from_excel on that sector's rows.
+    - totals holds per-sector sums and counts, used for leave-one-out averages in batch valuation.
+    - statistics holds every robust aggregator (median, trimmed mean, ...) for every sector,
+      computed once on first use so switching aggregator is only a lookup.
+    """
+
+    # The comparables frame belongs to the caller; estimate_size does not count it
+    _shared_state = ('comparables',)
+
+    def __init__(self, comparables_df, ratios=None, contributions=None, totals=None):
+        """
+        `ratios`, `contributions` and `totals` may be passed when they are already known
+        (e.g. maintained incrementally); they must be aligned with the rows of `comparables_df`.
+        """
+        self.comparables = comparables_df
+        self._statistics = None
+
+        if comparables_df.empty or 'Sektor' not in comparables_df.columns:
+            self.sector_keys = pd.Series([], dtype=object)
+            self.ratios = pd.DataFrame(columns=RATIO_COLUMNS, dtype=float)
+            self.contributions = pd.DataFrame()
+            self.totals = pd.DataFrame()
+            self._positions = {}
+            self._averages = {}
+            return
+
+        self.sector_keys = normalize_sector(comparables_df['Sektor']).reset_index(drop=True)
+        self._positions = dict(self.sector_keys.groupby(self.sector_keys, sort=False).indices)
+
+        self.ratios = calculate_key_ratios_vectorized(comparables_df) if ratios is None else ratios
+        self.contributions = sector_contributions(comparables_df, self.ratios) if contributions is None else contributions
+        self.totals = sector_totals(self.contributions) if totals is None else totals
+        self._averages = _averages_from_totals(self.totals)
+
+    @property
+    def sectors(self):
+        """Normalized sector keys present in the index."""
+        return list(self._positions)
+
+    def positions(self, sector):
+        """
+        Integer row positions of the comparables in `sector` (case-insensitive). Empty if none.
+        """
+        return self._positions.get(normalize_sector(sector), np.array([], dtype=np.intp))
+
+    def comparables_for(self, sector):
+        """
+        The comparables in `sector`, same rows and order as get_sector_comparables_from_excel.
+        """
+        if self.comparables.empty or 'Sektor' not in self.comparables.columns:
+            return pd.DataFrame()
+        return self.comparables.iloc[self.positions(sector)]
+
+    def ratios_for(self, sector):
+        """
+        Per-company ratios of the comparables in `sector`.
+        """
+        return self.ratios.iloc[self.positions(sector)]
+
+    @property
+    def statistics(self):
+        """Per-(sector, ratio) table of every aggregator in SECTOR_AGGREGATORS."""
+        if self._statistics is None:
+            self._statistics = compute_sector_statistics(self.comparables, self.ratios, self.sector_keys)
+        return self._statistics
+
+    def averages(self, sector, aggregator='mean'):
+        """
+        Precomputed average ratios of `sector` (dict, empty if the sector has no usable comparables).
+        `aggregator` selects one of SECTOR_AGGREGATORS; the default is the arithmetic mean.
+        """
+        if aggregator == 'mean':
+            return dict(self._averages.get(normalize_sector(sector), {}))
+        return sector_averages_from_statistics(self.statistics, normalize_sector(sector), aggregator)
+
+# Function to compute each comparable's contribution to its sector's sums and counts
+def sector_contributions(comparables_df, ratios_df):
+    """
+    One row per comparable with its sector key, ticker, 'rows' (always 1), 'n' (1 if it has a usable
+    share count) and '<ratio> sum' / '<ratio> count' columns. Summing these per sector gives the sector averages.
+    """
+    # Companies without a usable share count are skipped entirely, as in calculate_sector_ratios_from_excel
+    eligible = _numeric_column(comparables_df, 'Jumlah_Saham_Beredar') != 0
+
+    contributions = {
+        'sector': normalize_sector(comparables_df['Sektor']).to_numpy(),
+        'ticker': comparables_df['Ticker'].astype(str).to_numpy() if 'Ticker' in comparables_df.columns else np.full(len(comparables_df), ''),
+        'rows': np.ones(len(comparables_df), dtype=int),
+        'n': eligible.astype(int)
+    }
+    for ratio in RATIO_COLUMNS:
+        values = ratios_df[ratio].to_numpy(dtype=float)
+        usable = eligible & ~np.isnan(values)
+        if ratio in MULTIPLE_RATIOS:
+            usable &= values != np.inf
+        contributions[ratio + ' sum'] = np.where(usable, values, 0.0)
+        contributions[ratio + ' count'] = usable.astype(int)
+    return pd.DataFrame(contributions, index=comparables_df.index)
+
+# Function to add up the contributions of each sector
+def sector_totals(contributions):
+    """
+    Per-sector sums of the contribution columns, indexed by sector key.
+    """
+    return contributions.drop(columns='ticker').groupby('sector', sort=False).sum()
+
+# Function to turn per-sector sums and counts into averages dicts
+def _averages_from_totals(totals):
+    """
+    Mean = sum / count for every sector and ratio at once. Returns {sector: {ratio: mean}},
+    keeping only ratios with at least one usable value.
+    """
+    sums = totals[[ratio + ' sum' for ratio in AVERAGE_ORDER]].to_numpy(dtype=float)
+    counts = totals[[ratio + ' count' for ratio in AVERAGE_ORDER]].to_numpy(dtype=float)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        means = sums / counts
+    has_values = counts > 0
+
+    return {
+        sector: {ratio: float(means[i, j]) for j, ratio in enumerate(AVERAGE_ORDER) if has_values[i, j]}
+        for i, sector in enumerate(totals.index)
+    }
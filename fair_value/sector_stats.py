@@ -0,0 +1,129 @@
+"""
+Robust sector statistics. Besides the arithmetic mean used by calculate_sector_averages_from_excel,
+the median, trimmed mean, winsorized mean, harmonic mean and market-cap-weighted mean of every
+ratio are computed for every sector in one vectorized pass over the comparables.
+"""
+import pandas as pd
+import numpy as np
+
+from fair_value.columns import RATIO_COLUMNS, _numeric_column
+
+# Available aggregators and their labels in the dashboard
+SECTOR_AGGREGATORS = {
+    'mean': 'Rata-rata (mean)',
+    'median': 'Median',
+    'trimmed_mean': 'Trimmed mean',
+    'winsorized_mean': 'Winsorized mean',
+    'harmonic_mean': 'Harmonic mean',
+    'market_cap_weighted': 'Rata-rata tertimbang kapitalisasi pasar'
+}
+
+# Share of values cut (trimmed mean) or clipped (winsorized mean) at each end of a sector
+DEFAULT_TRIM = 0.1
+
+# Multiples: their infinite values (zero earnings/equity) are left out of the sector averages, and only
+# they get a harmonic mean (percentage ratios fall back to the arithmetic mean)
+MULTIPLE_RATIOS = ('P/E Ratio', 'P/B Ratio')
+
+# Order of the keys in the sector averages dict, as returned by calculate_sector_averages_from_excel
+AVERAGE_ORDER = ['P/E Ratio', 'P/B Ratio', 'ROE (%)', 'Net Profit Margin (%)']
+
+# Function to compute every sector statistic for every sector and ratio at once
+def compute_sector_statistics(comparables_df, ratios_df, sector_keys, trim=DEFAULT_TRIM, ratio_columns=None, multiple_ratios=None):
+    """
+    Aggregates the per-company ratios by sector with every aggregator in SECTOR_AGGREGATORS.
+    The same values are used as for the mean in calculate_sector_averages_from_excel (rows
+    with a zero share count, NaN ratios and infinite P/E or P/B are left out).
+    - trimmed_mean drops floor(n * trim) values at each end of the sorted sector values.
+    - winsorized_mean clips the same number of values to the nearest kept value.
+    - harmonic_mean uses the strictly positive P/E and P/B values only.
+    - market_cap_weighted weights by Harga_Saham_Saat_Ini x Jumlah_Saham_Beredar (positive caps only).
+    `ratio_columns` selects other columns of `ratios_df` (e.g. method_multiples); infinite values of
+    `multiple_ratios` are left out and only those get a harmonic mean (defaults: RATIO_COLUMNS, P/E and P/B).
+    Returns a DataFrame indexed by (sector, ratio) with one column per aggregator plus 'count'.
+    """
+    ratio_columns = RATIO_COLUMNS if ratio_columns is None else list(ratio_columns)
+    multiple_ratios = MULTIPLE_RATIOS if multiple_ratios is None else tuple(multiple_ratios)
+    columns = list(SECTOR_AGGREGATORS) + ['count']
+    if comparables_df.empty:
+        return pd.DataFrame(columns=columns, index=pd.MultiIndex.from_arrays([[], []], names=['sector', 'ratio']))
+
+    eligible = _numeric_column(comparables_df, 'Jumlah_Saham_Beredar') != 0
+    market_cap = _numeric_column(comparables_df, 'Harga_Saham_Saat_Ini') * _numeric_column(comparables_df, 'Jumlah_Saham_Beredar')
+
+    # Long format: one row per usable (company, ratio) value
+    n_rows = len(comparables_df)
+    values = ratios_df[ratio_columns].to_numpy(dtype=float).ravel(order='F')
+    ratio_names = np.repeat(np.array(ratio_columns, dtype=object), n_rows)
+    sectors = np.tile(np.asarray(sector_keys, dtype=object), len(ratio_columns))
+    weights = np.tile(market_cap, len(ratio_columns))
+
+    usable = np.tile(eligible, len(ratio_columns)) & ~np.isnan(values)
+    usable &= ~(np.isin(ratio_names, multiple_ratios) & (values == np.inf))
+
+    long = pd.DataFrame({
+        'sector': sectors[usable],
+        'ratio': ratio_names[usable],
+        'value': values[usable],
+        'weight': weights[usable]
+    })
+
+    # A single sort gives each value's position inside its (sector, ratio) group
+    long = long.sort_values(['sector', 'ratio', 'value'], kind='mergesort').reset_index(drop=True)
+    grouped = long.groupby(['sector', 'ratio'], sort=False)
+    position = grouped.cumcount().to_numpy()
+    size = grouped['value'].transform('size').to_numpy()
+    start = np.arange(len(long)) - position
+    cut = np.floor(size * trim).astype(int)
+
+    value = long['value'].to_numpy()
+    keys = [long['sector'], long['ratio']]
+
+    stats = pd.DataFrame({
+        'mean': grouped['value'].mean(),
+        'median': grouped['value'].median(),
+        'count': grouped['value'].size()
+    })
+
+    kept = (position >= cut) & (position < size - cut)
+    stats['trimmed_mean'] = pd.Series(np.where(kept, value, np.nan)).groupby(keys, sort=False).mean()
+
+    with np.errstate(invalid='ignore'):
+        lower = value[start + cut]
+        upper = value[start + size - 1 - cut]
+        winsorized = np.minimum(np.maximum(value, lower), upper)
+    stats['winsorized_mean'] = pd.Series(winsorized).groupby(keys, sort=False).mean()
+
+    positive = value > 0
+    with np.errstate(divide='ignore'):
+        reciprocal = np.where(positive, 1.0 / value, np.nan)
+    reciprocal_sum = pd.Series(reciprocal).groupby(keys, sort=False).sum(min_count=1)
+    positive_count = pd.Series(positive.astype(int)).groupby(keys, sort=False).sum()
+    harmonic = positive_count.where(positive_count > 0) / reciprocal_sum
+    multiple_keys = stats.index.get_level_values('ratio').isin(multiple_ratios)
+    stats['harmonic_mean'] = np.where(multiple_keys, harmonic.reindex(stats.index), stats['mean'])
+
+    weight = long['weight'].to_numpy()
+    weight = np.where(np.isfinite(weight) & (weight > 0), weight, 0.0)
+    with np.errstate(invalid='ignore'):
+        weighted_sum = pd.Series(np.where(weight > 0, value * weight, 0.0)).groupby(keys, sort=False).sum()
+    weight_sum = pd.Series(weight).groupby(keys, sort=False).sum()
+    stats['market_cap_weighted'] = weighted_sum / weight_sum.where(weight_sum > 0)
+
+    return stats[columns]
+
+# Function to read the averages dict of one sector for the chosen aggregator
+def sector_averages_from_statistics(statistics, sector, aggregator='mean', ratios=None):
+    """
+    Returns {ratio: value} for `sector` (normalized key) using `aggregator`,
+    in the same shape as calculate_sector_averages_from_excel. Missing values are left out.
+    `ratios` lists the ratios to read when the statistics cover other columns than RATIO_COLUMNS.
+    """
+    if aggregator not in SECTOR_AGGREGATORS:
+        raise ValueError(f"Unknown aggregator '{aggregator}'. Available: {', '.join(SECTOR_AGGREGATORS)}")
+    if statistics.empty or sector not in statistics.index.get_level_values('sector'):
+        return {}
+
+    sector_stats = statistics.xs(sector, level='sector')[aggregator]
+    return {ratio: float(sector_stats[ratio]) for ratio in (AVERAGE_ORDER if ratios is None else ratios)
+            if ratio in sector_stats.index and not pd.isna(sector_stats[ratio])}
@@ -0,0 +1,93 @@
+"""
+Fair value sensitivity: the multiplier fair value evaluated over a grid of scenario shocks
+on the sector multiple and on the target's own fundamental (net income for P/E, equity for P/B).
+
+A shock of +10% on net income divides the target's P/E by 1.1, so every cell is
+price x sector_ratio x (1 + multiple shock) x (1 + fundamental shock) / target_ratio,
+computed for the whole grid with one broadcast instead of a call per scenario.
+"""
+import pandas as pd
+import numpy as np
+
+from fair_value.valuation import classify_valuation_status
+from fair_value.methods import method_fair_values
+
+# Default shock ranges (+/- fraction) per method: sector multiple and the target fundamental it divides
+SENSITIVITY_SCENARIOS = {
+    'P/E': {'ratio': 'P/E Ratio', 'multiple': 0.30, 'fundamental': 0.20, 'fundamental_label': 'Net Income'},
+    'P/B': {'ratio': 'P/B Ratio', 'multiple': 0.30, 'fundamental': 0.10, 'fundamental_label': 'Ekuitas'}
+}
+
+# Number of scenarios along each axis of the grid
+DEFAULT_SENSITIVITY_STEPS = 41
+
+# Function to build evenly spaced shocks around zero
+def scenario_shocks(width, steps=DEFAULT_SENSITIVITY_STEPS):
+    """
+    `steps` shocks from -width to +width (fractions, e.g. 0.3 for +/-30%). Always contains 0 when steps is odd.
+    """
+    if steps < 1:
+        raise ValueError('steps must be at least 1')
+    return np.linspace(-width, width, steps)
+
+# Function to evaluate the fair value for every combination of shocks at once
+def fair_value_sensitivity(current_price, target_ratio, sector_ratio, multiple_shocks, fundamental_shocks, method='P/E'):
+    """
+    Fair value of `method` (a registered valuation method) for every (multiple shock, fundamental shock) pair.
+    `current_price`, `target_ratio` and `sector_ratio` may be scalars or arrays of the same shape
+    (one entry per ticker); the result has shape their_shape + (len(multiple_shocks), len(fundamental_shocks)).
+    Invalid inputs give NaN and a zero shocked sector ratio gives inf, as in calculate_fair_value_multiplier.
+    """
+    current_price = np.asarray(current_price, dtype=float)[..., np.newaxis, np.newaxis]
+    target_ratio = np.asarray(target_ratio, dtype=float)[..., np.newaxis, np.newaxis]
+    sector_ratio = np.asarray(sector_ratio, dtype=float)[..., np.newaxis, np.newaxis]
+    multiple_factor = 1.0 + np.asarray(multiple_shocks, dtype=float)[:, np.newaxis]
+    fundamental_factor = 1.0 + np.asarray(fundamental_shocks, dtype=float)[np.newaxis, :]
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        shocked_target = target_ratio / fundamental_factor
+    return method_fair_values(current_price, shocked_target[..., np.newaxis], (sector_ratio * multiple_factor)[..., np.newaxis], [method])[..., 0]
+
+# Function to build the sensitivity grid of one method for the dashboard
+def sensitivity_grid(ticker_ratios, sector_avg_ratios, current_price, method='P/E', steps=DEFAULT_SENSITIVITY_STEPS,
+                     multiple_width=None, fundamental_width=None):
+    """
+    Fair value grid for `method` ('P/E' or 'P/B'): rows are shocks on the sector multiple, columns are
+    shocks on the target's net income (P/E) or equity (P/B), both in percent.
+    Returns None when the fair value of the method cannot be computed or is not positive in any scenario
+    (the shocks only scale it, so a negative fair value stays negative).
+    """
+    if method not in SENSITIVITY_SCENARIOS:
+        raise ValueError(f"Unknown method '{method}'. Available: {', '.join(SENSITIVITY_SCENARIOS)}")
+    scenario = SENSITIVITY_SCENARIOS[method]
+    ratio = scenario['ratio']
+    if current_price is None or ratio not in ticker_ratios or ratio not in sector_avg_ratios:
+        return None
+
+    multiple_shocks = scenario_shocks(scenario['multiple'] if multiple_width is None else multiple_width, steps)
+    fundamental_shocks = scenario_shocks(scenario['fundamental'] if fundamental_width is None else fundamental_width, steps)
+    values = fair_value_sensitivity(current_price, ticker_ratios[ratio], sector_avg_ratios[ratio], multiple_shocks, fundamental_shocks, method)
+    if not (values > 0).any():
+        return None
+
+    return pd.DataFrame(
+        values,
+        index=pd.Index(np.round(multiple_shocks * 100, 2), name=f'Shock {ratio} Sektor (%)'),
+        columns=pd.Index(np.round(fundamental_shocks * 100, 2), name=f"Shock {scenario['fundamental_label']} (%)")
+    )
+
+# Function to flatten a sensitivity grid into one row per scenario for export
+def sensitivity_table(grid, current_price, method):
+    """
+    Long format of `grid`: Metode, both shocks, the fair value and its status against `current_price`.
+    Column names do not depend on the method, so tables of several methods can be concatenated.
+    """
+    values = grid.to_numpy().ravel()
+    return pd.DataFrame({
+        'Metode': method,
+        'Shock Rasio Sektor (%)': np.repeat(grid.index.to_numpy(), grid.shape[1]),
+        'Shock Fundamental (%)': np.tile(grid.columns.to_numpy(), grid.shape[0]),
+        'Fundamental': SENSITIVITY_SCENARIOS[method]['fundamental_label'],
+        'Fair Value': values,
+        'Status': classify_valuation_status(current_price, values)
+    })
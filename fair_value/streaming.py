@@ -0,0 +1,160 @@
+"""
+Streaming ingestion of large comparables tables with bounded memory.
+
+read_valuation_frames parses the whole 'Perusahaan_Sektor' sheet before one sector is selected.
+Here the sheet (or single table) is read in chunks of rows: openpyxl in read-only mode for .xlsx,
+chunked pandas reads for .csv and Arrow record batches for .parquet/.feather. Each chunk is typed
+by apply_schema, filtered to the wanted sectors and folded into running per-sector sums and counts
+before the next one is read, so peak memory grows with the size of the selected sectors rather
+than the size of the file.
+"""
+from collections import namedtuple
+
+import pandas as pd
+import numpy as np
+
+from fair_value.ingest import TARGET_SHEET, SECTOR_SHEET, SUPPORTED_EXTENSIONS, _file_extension
+from fair_value.valuation import calculate_key_ratios_vectorized
+from fair_value.schema import ISSUE_COLUMNS, apply_schema
+from fair_value.sector_index import SectorIndex, normalize_sector, sector_contributions, sector_totals
+
+# Rows parsed per chunk
+DEFAULT_CHUNK_ROWS = 50_000
+
+# Result of stream_sector_comparables: the kept (typed) rows, a SectorIndex over them, the number of rows read,
+# the schema issues of every row read (ISSUE_COLUMNS) and the required columns missing from the table
+StreamedComparables = namedtuple('StreamedComparables', ['comparables', 'sector_index', 'rows_read', 'issues', 'missing_columns'])
+
+# Function to read the rows of one worksheet in chunks without loading the workbook
+def _iter_xlsx_chunks(source, sheet_name, chunk_rows):
+    """
+    Yields DataFrames of at most `chunk_rows` rows from `sheet_name` (first row is the header).
+    Fully empty rows are skipped, as pd.read_excel does. Yields nothing when the sheet is missing.
+    """
+    import openpyxl
+
+    workbook = openpyxl.load_workbook(source, read_only=True, data_only=True)
+    try:
+        if sheet_name not in workbook.sheetnames:
+            return
+        rows = workbook[sheet_name].iter_rows(values_only=True)
+        header = next(rows, None)
+        if header is None:
+            return
+        columns = [f'Unnamed: {i}' if name is None else str(name) for i, name in enumerate(header)]
+        width = len(columns)
+
+        chunk = []
+        for row in rows:
+            if all(value is None for value in row):
+                continue
+            chunk.append(tuple(row[:width]) + (None,) * (width - len(row)))
+            if len(chunk) >= chunk_rows:
+                yield pd.DataFrame.from_records(chunk, columns=columns, coerce_float=True)
+                chunk = []
+        if chunk:
+            yield pd.DataFrame.from_records(chunk, columns=columns, coerce_float=True)
+    finally:
+        workbook.close()
+
+# Function to read the record batches of an Arrow file
+def _iter_arrow_chunks(source, extension, chunk_rows):
+    """
+    Yields DataFrames from the row groups of a .parquet file or the record batches of a .feather file.
+    """
+    import pyarrow.parquet as pq
+    import pyarrow.ipc as ipc
+
+    if extension == '.parquet':
+        for batch in pq.ParquetFile(source).iter_batches(batch_size=chunk_rows):
+            yield batch.to_pandas()
+        return
+
+    reader = ipc.open_file(source)
+    for i in range(reader.num_record_batches):
+        yield reader.get_batch(i).to_pandas()
+
+# Function to read a comparables table chunk by chunk
+def iter_table_chunks(source, file_name=None, sheet_name=SECTOR_SHEET, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Yields the rows of `sheet_name` (.xlsx) or of the single table (.csv, .parquet, .feather) as
+    DataFrames of at most `chunk_rows` rows, indexed by their row position in the table.
+    Raises ValueError for unsupported file types.
+    """
+    if chunk_rows < 1:
+        raise ValueError('chunk_rows must be at least 1')
+    extension = _file_extension(source, file_name)
+
+    if extension == '.xlsx':
+        chunks = _iter_xlsx_chunks(source, sheet_name, chunk_rows)
+    elif extension == '.csv':
+        chunks = pd.read_csv(source, chunksize=chunk_rows)
+    elif extension in ('.parquet', '.feather'):
+        chunks = _iter_arrow_chunks(source, extension, chunk_rows)
+    else:
+        raise ValueError(f"Unsupported file type '{extension}'. Supported types: {', '.join(SUPPORTED_EXTENSIONS)}")
+
+    offset = 0
+    for chunk in chunks:
+        chunk.index = pd.RangeIndex(offset, offset + len(chunk))
+        offset += len(chunk)
+        yield chunk
+
+# Function to read the (small) target sheet with the streaming reader
+def read_target_frame(source, file_name=None):
+    """
+    The 'Perusahaan_Target' sheet of an .xlsx file, read row by row in read-only mode.
+    Empty for single-table files and workbooks without the sheet.
+    """
+    if _file_extension(source, file_name) != '.xlsx':
+        return pd.DataFrame()
+    chunks = list(_iter_xlsx_chunks(source, TARGET_SHEET, DEFAULT_CHUNK_ROWS))
+    return pd.concat(chunks, ignore_index=True) if chunks else pd.DataFrame()
+
+# Function to stream the comparables of some sectors out of a large table
+def stream_sector_comparables(source, sectors=None, file_name=None, chunk_rows=DEFAULT_CHUNK_ROWS):
+    """
+    Reads the comparables table chunk by chunk and keeps only the rows whose 'Sektor' matches one
+    of `sectors` (case-insensitive, as get_sector_comparables_from_excel). With `sectors` None
+    every row is kept. Each chunk goes through apply_schema before it is filtered, so the issues
+    cover the whole table as with read_valuation_frames, while only the kept rows are held. The
+    ratios and the per-sector sums and counts are computed per chunk and added up, so the returned
+    SectorIndex is built without a second pass; its averages equal
+    calculate_sector_averages_from_excel on the kept rows of each sector. Returns StreamedComparables.
+    """
+    keys = None if sectors is None else set(normalize_sector(pd.Series(list(np.atleast_1d(sectors)), dtype=object)))
+
+    frames, ratio_frames, contribution_frames, issue_frames = [], [], [], []
+    totals = None
+    rows_read = 0
+    missing_columns = []
+    for chunk in iter_table_chunks(source, file_name, SECTOR_SHEET, chunk_rows):
+        rows_read += len(chunk)
+        typed = apply_schema(chunk)
+        chunk, missing_columns = typed.frame, typed.missing_columns
+        if not typed.issues.empty:
+            issue_frames.append(typed.issues)
+        if 'Sektor' not in chunk.columns:
+            continue
+        if keys is not None:
+            chunk = chunk[normalize_sector(chunk['Sektor']).isin(keys)]
+        if chunk.empty:
+            continue
+
+        ratios = calculate_key_ratios_vectorized(chunk)
+        contributions = sector_contributions(chunk, ratios)
+        chunk_totals = sector_totals(contributions)
+        totals = chunk_totals if totals is None else pd.concat([totals, chunk_totals]).groupby(level=0, sort=False).sum()
+
+        frames.append(chunk)
+        ratio_frames.append(ratios)
+        contribution_frames.append(contributions)
+
+    issues = pd.concat(issue_frames, ignore_index=True) if issue_frames else pd.DataFrame(columns=ISSUE_COLUMNS)
+    if not frames:
+        return StreamedComparables(pd.DataFrame(), SectorIndex(pd.DataFrame()), rows_read, issues, missing_columns)
+
+    comparables = pd.concat(frames)
+    sector_index = SectorIndex(comparables, ratios=pd.concat(ratio_frames),
+                               contributions=pd.concat(contribution_frames), totals=totals)
+    return StreamedComparables(comparables, sector_index, rows_read, issues, missing_columns)
@@ -0,0 +1,220 @@
+"""
+Pure valuation functions used by the Streamlit dashboard and the command line.
+Nothing in this module imports Streamlit or plotly.
+"""
+import pandas as pd
+import numpy as np
+
+from fair_value.columns import RATIO_COLUMNS, _numeric_column
+from fair_value.methods import VALUATION_METHODS, method_fair_values
+
+# Function to calculate key financial ratios
+def calculate_key_ratios(net_income, revenue, total_equity, current_price, shares_outstanding):
+    """
+    Calculates key financial ratios (Net Profit Margin, ROE, P/E Ratio, P/B Ratio)
+    from direct inputs.
+    """
+    ratios = {}
+
+    # Net Profit Margin
+    if net_income is not None and revenue is not None and revenue != 0:
+        ratios['Net Profit Margin (%)'] = (net_income / revenue) * 100
+    else:
+        ratios['Net Profit Margin (%)'] = float('nan')
+
+    # ROE (Return on Equity)
+    if net_income is not None and total_equity is not None and total_equity != 0:
+        ratios['ROE (%)'] = (net_income / total_equity) * 100
+    else:
+        ratios['ROE (%)'] = float('nan')
+
+    # P/E Ratio (Price-to-Earnings Ratio)
+    if current_price is not None and shares_outstanding is not None and shares_outstanding != 0:
+        if net_income is not None and net_income != 0:
+            eps = net_income / shares_outstanding
+            ratios['P/E Ratio'] = current_price / eps if eps != 0 else float('inf')
+        else:
+            ratios['P/E Ratio'] = float('inf')
+
+    # P/B Ratio (Price-to-Book Ratio)
+    if current_price is not None and shares_outstanding is not None and shares_outstanding != 0:
+        if total_equity is not None and total_equity != 0:
+            book_value_per_share = total_equity / shares_outstanding if shares_outstanding != 0 else 0
+            ratios['P/B Ratio'] = current_price / book_value_per_share if book_value_per_share != 0 else float('inf')
+        else:
+            ratios['P/B Ratio'] = float('inf')
+
+    return {k: v for k, v in ratios.items() if not pd.isna(v)}
+
+# Function to filter comparable companies by sector from Excel data
+def get_sector_comparables_from_excel(comparables_df, target_sector, sector_index=None):
+    """
+    Filters the comparable companies DataFrame to get only those in the same sector.
+    With a SectorIndex built over `comparables_df`, the lookup uses its precomputed row positions.
+    """
+    if sector_index is not None:
+        return sector_index.comparables_for(target_sector)
+
+    if comparables_df.empty or 'Sektor' not in comparables_df.columns:
+        return pd.DataFrame() # Return empty if no data or 'Sektor' column
+
+    # Ensure case-insensitive sector comparison
+    filtered_comparables = comparables_df[
+        comparables_df['Sektor'].astype(str).str.lower() == target_sector.lower()
+    ]
+    return filtered_comparables
+
+# Function to calculate key financial ratios for every row of a DataFrame at once
+def calculate_key_ratios_vectorized(companies_df):
+    """
+    Columnar version of calculate_key_ratios.
+    Returns a DataFrame (same index as the input) with one column per ratio. Ratios that
+    calculate_key_ratios would leave out are NaN; P/E and P/B are inf when earnings or equity are zero.
+    """
+    if companies_df.empty:
+        return pd.DataFrame(columns=RATIO_COLUMNS, index=companies_df.index, dtype=float)
+
+    current_price = _numeric_column(companies_df, 'Harga_Saham_Saat_Ini')
+    shares_outstanding = _numeric_column(companies_df, 'Jumlah_Saham_Beredar')
+    net_income = _numeric_column(companies_df, 'Net_Income_Terbaru')
+    revenue = _numeric_column(companies_df, 'Total_Pendapatan_Terbaru')
+    total_equity = _numeric_column(companies_df, 'Total_Ekuitas_Terbaru')
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        npm = np.where(revenue != 0, (net_income / revenue) * 100, np.nan)
+        roe = np.where(total_equity != 0, (net_income / total_equity) * 100, np.nan)
+
+        # P/E and P/B are only defined when the share count is non-zero
+        has_shares = shares_outstanding != 0
+        eps = net_income / shares_outstanding
+        pe = np.where((net_income != 0) & (eps != 0), current_price / eps, np.inf)
+        pe = np.where(has_shares, pe, np.nan)
+
+        book_value_per_share = total_equity / shares_outstanding
+        pb = np.where((total_equity != 0) & (book_value_per_share != 0), current_price / book_value_per_share, np.inf)
+        pb = np.where(has_shares, pb, np.nan)
+
+    return pd.DataFrame({
+        'Net Profit Margin (%)': npm,
+        'ROE (%)': roe,
+        'P/E Ratio': pe,
+        'P/B Ratio': pb
+    }, index=companies_df.index)
+
+# Function to aggregate a per-company ratio DataFrame into sector averages
+def aggregate_sector_ratios(ratios_df, eligible=None):
+    """
+    Averages the per-company ratios the same way the original row loop did:
+    NaN values are skipped and infinite P/E or P/B values (zero earnings/equity) are left out.
+    `eligible` is an optional boolean mask of rows allowed to contribute.
+    """
+    if ratios_df.empty:
+        return {}
+
+    if eligible is None:
+        eligible = np.ones(len(ratios_df), dtype=bool)
+
+    sector_averages = {}
+    for ratio in ['P/E Ratio', 'P/B Ratio', 'ROE (%)', 'Net Profit Margin (%)']:
+        values = ratios_df[ratio].to_numpy(dtype=float)
+        mask = eligible & ~np.isnan(values)
+        if ratio in ('P/E Ratio', 'P/B Ratio'):
+            mask &= values != np.inf
+        if mask.any():
+            with np.errstate(invalid='ignore'):
+                sector_averages[ratio] = float(values[mask].mean())
+
+    return sector_averages
+
+# Function to calculate per-company ratios and sector averages from Excel data in one pass
+def calculate_sector_ratios_from_excel(comparable_companies_data):
+    """
+    Computes the ratios of every comparable company at once and aggregates them.
+    Returns a tuple (per-company ratio DataFrame, sector averages dict).
+    """
+    if comparable_companies_data.empty:
+        return pd.DataFrame(columns=RATIO_COLUMNS, dtype=float), {}
+
+    ratios_df = calculate_key_ratios_vectorized(comparable_companies_data)
+
+    # Companies without a usable share count are skipped entirely, as before
+    eligible = _numeric_column(comparable_companies_data, 'Jumlah_Saham_Beredar') != 0
+
+    return ratios_df, aggregate_sector_ratios(ratios_df, eligible)
+
+# Function to calculate average sector ratios from Excel data
+def calculate_sector_averages_from_excel(comparable_companies_data):
+    """
+    Calculates average financial ratios for a specific sector
+    from the filtered comparable companies DataFrame.
+    """
+    _, sector_averages = calculate_sector_ratios_from_excel(comparable_companies_data)
+    return sector_averages
+
+# Function to calculate fair value using the multiplier method
+def calculate_fair_value_multiplier(ticker_ratios, sector_avg_ratios, current_price, method='P/E'):
+    """
+    Calculates fair value using the multiplier method of any registered valuation method
+    (P/E, P/B, P/S, ...; see fair_value.methods). Both dicts are keyed by the method's ratio name.
+    Assumption: The fair price of the company is when its ratio equals the sector average.
+    Returns None when the method is unknown, a ratio is absent or the company's own multiple is zero,
+    infinite or missing; inf when the sector average multiple is zero. A missing sector average or
+    price gives NaN. Yield methods return None whenever their fair value cannot be computed.
+    """
+    if current_price is None or method not in VALUATION_METHODS:
+        return None
+    ratio = VALUATION_METHODS[method].ratio
+    if ratio not in ticker_ratios or ratio not in sector_avg_ratios:
+        return None
+
+    if VALUATION_METHODS[method].inverse:
+        fair_value = float(method_fair_values(current_price, [ticker_ratios[ratio]], [sector_avg_ratios[ratio]], [method])[0])
+        return None if pd.isna(fair_value) else fair_value
+
+    if ticker_ratios[ratio] == 0 or ticker_ratios[ratio] == float('inf') or pd.isna(ticker_ratios[ratio]):
+        return None
+    # Sector average multiple is zero, implies infinite fair value if the company's multiple is not zero
+    if sector_avg_ratios[ratio] == 0:
+        return float('inf')
+    return current_price * (sector_avg_ratios[ratio] / ticker_ratios[ratio])
+
+# Price bands around fair value used for the UNDERVALUED / OVERVALUED status
+UNDERVALUED_THRESHOLD = 0.95
+OVERVALUED_THRESHOLD = 1.05
+
+# Function to classify current price against fair value
+def classify_valuation_status(current_price, fair_value):
+    """
+    Returns 'UNDERVALUED', 'OVERVALUED' or 'FAIR' for each price/fair value pair,
+    or '' where the fair value is missing or not positive. Works on scalars and arrays.
+    """
+    current_price = np.asarray(current_price, dtype=float)
+    fair_value = np.asarray(fair_value, dtype=float)
+    valid = ~np.isnan(fair_value) & (fair_value > 0)
+
+    with np.errstate(invalid='ignore'):
+        status = np.select(
+            [valid & (current_price < fair_value * UNDERVALUED_THRESHOLD),
+             valid & (current_price > fair_value * OVERVALUED_THRESHOLD),
+             valid],
+            ['UNDERVALUED', 'OVERVALUED', 'FAIR'],
+            default=''
+        )
+    return status if status.ndim else str(status)
+
+# Function to turn the per-method valuation statuses into an investment recommendation
+def get_investment_recommendation(*statuses):
+    """
+    Majority vote over the statuses of each valuation method.
+    Returns 'BUY', 'HOLD/SELL' or 'HOLD' (scalar or array, matching the inputs).
+    """
+    statuses = [np.asarray(status) for status in statuses]
+    undervalued_count = sum((status == 'UNDERVALUED').astype(int) for status in statuses)
+    overvalued_count = sum((status == 'OVERVALUED').astype(int) for status in statuses)
+
+    recommendation = np.select(
+        [np.asarray(undervalued_count > overvalued_count), np.asarray(overvalued_count > undervalued_count)],
+        ['BUY', 'HOLD/SELL'],
+        default='HOLD'
+    )
+    return recommendation if recommendation.ndim else str(recommendation)
@@ -1,15 +1,133 @@
 import streamlit as st
 import pandas as pd
+import numpy as np
 import plotly.graph_objects as go
 import plotly.express as px
 from plotly.subplots import make_subplots
 import io
+import os
+import json
 import base64
+from functools import partial
+from fair_value import (
+    RATIO_COLUMNS,
+    calculate_key_ratios,
+    get_sector_comparables_from_excel,
+    classify_valuation_status,
+    get_investment_recommendation,
+    value_companies_parallel,
+    default_workers,
+    SectorIndex,
+    IncrementalSectorState,
+    IncrementalBatchValuation,
+    SECTOR_AGGREGATORS,
+    normalize_sector,
+    read_valuation_frames_cached,
+    is_single_table_source,
+    SENSITIVITY_SCENARIOS,
+    DEFAULT_SENSITIVITY_STEPS,
+    sensitivity_grid,
+    sensitivity_table,
+    MONTE_CARLO_METHODS,
+    DEFAULT_SEED,
+    simulate_fair_value,
+    PAGE_SIZES,
+    page_count,
+    paginate,
+    format_page,
+    TRACE_MEMORY_ENV,
+    StageProfiler,
+    start_memory_tracing,
+    HISTORY_SHEET,
+    HISTORY_COLUMNS,
+    PeriodStore,
+    historical_fair_values,
+    read_history_frame,
+    read_target_frame,
+    stream_sector_comparables,
+    content_hash,
+    shared_cache,
+    submit_tasks,
+    apply_schema,
+    missing_fields,
+    DEFAULT_PEERS,
+    DISTANCE_COLUMN,
+    PeerIndex,
+    value_companies_with_peers,
+    ScreenIndex,
+    parse_screen_query,
+    DEFAULT_METHODS,
+    VALUATION_METHODS,
+    resolve_methods,
+    method_multiples,
+    method_averages,
+    method_fair_values,
+    DEFAULT_REFRESH_SECONDS,
+    PRICE_FEEDS_ENV,
+    LivePricer,
+    configured_price_feeds,
+    open_price_feed,
+    valuation_report_bytes
+)
+
+# Columns of both template sheets; the last five hold numbers formatted as #,##0
+TEMPLATE_COLUMNS = ['Ticker', 'Nama_Perusahaan', 'Sektor', 'Harga_Saham_Saat_Ini',
+                    'Jumlah_Saham_Beredar', 'Net_Income_Terbaru', 'Total_Pendapatan_Terbaru',
+                    'Total_Ekuitas_Terbaru']
+TEMPLATE_NUMBER_COLUMNS = TEMPLATE_COLUMNS[3:] + HISTORY_COLUMNS[2:]
+
+# Function to write the template sheets with header and number formatting
+def _write_template_workbook(df_target, df_sector, df_history=None):
+    """
+    Serializes the target and sector DataFrames (and the optional per-period history)
+    into an .xlsx workbook (bytes). Number columns get their format once per column instead of once per cell.
+    """
+    output = io.BytesIO()
+    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
+        workbook = writer.book
+
+        # Format headers
+        header_format = workbook.add_format({
+            'bold': True,
+            'text_wrap': True,
+            'valign': 'top',
+            'fg_color': '#4472C4',
+            'font_color': 'white',
+            'border': 1
+        })
+
+        # Format numbers
+        number_format_currency = workbook.add_format({'num_format': '#,##0'})
+        border_format = workbook.add_format({'border': 1})
+
+        sheets = [('Perusahaan_Target', df_target), ('Perusahaan_Sektor', df_sector)]
+        if df_history is not None:
+            sheets.append((HISTORY_SHEET, df_history))
+
+        for sheet_name, df in sheets:
+            df.to_excel(writer, sheet_name=sheet_name, index=False)
+            worksheet = writer.sheets[sheet_name]
+
+            for col_num, value in enumerate(df.columns.values):
+                worksheet.write(0, col_num, value, header_format)
+                column_format = number_format_currency if value in TEMPLATE_NUMBER_COLUMNS else None
+                worksheet.set_column(col_num, col_num, 20, column_format)
+
+            # Border around the filled data cells, applied to the whole range at once
+            if len(df) > 0:
+                worksheet.conditional_format(1, 0, len(df), len(df.columns) - 1, {
+                    'type': 'no_errors',
+                    'format': border_format
+                })
+
+    return output.getvalue()
 
 # Function to create Excel template with sample data
+@st.cache_data(show_spinner=False)
 def create_excel_template():
     """
-    Creates an Excel template with two sheets: Perusahaan_Target and Perusahaan_Sektor
+    Creates an Excel template with three sheets: Perusahaan_Target, Perusahaan_Sektor
+    and the optional quarterly history Perusahaan_Historis
     """
     # Sample data for Perusahaan_Target (single company)
     target_data = {
@@ -39,285 +157,400 @@ def create_excel_template():
         'Total_Ekuitas_Terbaru': [180_000_000_000_000, 200_000_000_000_000, 140_000_000_000_000]
     }
     
+    # Sample data for Perusahaan_Historis (one row per company and quarter, trailing 12-month net income)
+    history_growth = [0.88, 0.92, 0.96, 1.0]
+    history_data = {
+        'Ticker': [ticker for ticker in ['BBRI', 'BBCA', 'BMRI', 'BBNI'] for _ in history_growth],
+        'Periode': ['2024Q1', '2024Q2', '2024Q3', '2024Q4'] * 4,
+        'Net_Income': [round(net_income * g) for net_income in [56e12, 32e12, 34e12, 17e12] for g in history_growth],
+        'Pendapatan': [round(revenue * g) for revenue in [150e12, 80e12, 95e12, 65e12] for g in history_growth],
+        'Ekuitas': [round(equity * g) for equity in [280e12, 180e12, 200e12, 140e12] for g in history_growth],
+        'Harga': [4300, 4650, 4900, 4520, 8100, 8400, 8900, 8750, 5900, 6100, 6400, 6225, 4600, 4750, 5100, 4890]
+    }
+
     # Create DataFrames
     df_target = pd.DataFrame(target_data)
     df_sector = pd.DataFrame(sector_data)
+    df_history = pd.DataFrame(history_data)
     
-    # Create Excel file in memory
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        # Write target company sheet
-        df_target.to_excel(writer, sheet_name='Perusahaan_Target', index=False)
-        
-        # Write sector companies sheet
-        df_sector.to_excel(writer, sheet_name='Perusahaan_Sektor', index=False)
-        
-        # Get workbook and worksheets
-        workbook = writer.book
-        worksheet_target = writer.sheets['Perusahaan_Target']
-        worksheet_sector = writer.sheets['Perusahaan_Sektor']
-        
-        # Format headers
-        header_format = workbook.add_format({
-            'bold': True,
-            'text_wrap': True,
-            'valign': 'top',
-            'fg_color': '#4472C4',
-            'font_color': 'white',
-            'border': 1
-        })
-        
-        # Format numbers
-        number_format_currency = workbook.add_format({
-            'num_format': '#,##0',
-            'border': 1
-        })
-        
-        # Apply formatting to target sheet
-        for col_num, value in enumerate(df_target.columns.values):
-            worksheet_target.write(0, col_num, value, header_format)
-            worksheet_target.set_column(col_num, col_num, 20)
-        
-        # Apply formatting to sector sheet
-        for col_num, value in enumerate(df_sector.columns.values):
-            worksheet_sector.write(0, col_num, value, header_format)
-            worksheet_sector.set_column(col_num, col_num, 20)
-        
-        # Format number columns for target sheet
-        for row in range(1, len(df_target) + 1):
-            # Apply currency format to relevant columns
-            for col_idx in [3, 4, 5, 6, 7]: # Harga_Saham_Saat_Ini, Jumlah_Saham_Beredar, Net_Income_Terbaru, Total_Pendapatan_Terbaru, Total_Ekuitas_Terbaru
-                worksheet_target.write(row, col_idx, df_target.iloc[row-1, col_idx], number_format_currency)
-        
-        # Format number columns for sector sheet
-        for row in range(1, len(df_sector) + 1):
-            # Apply currency format to relevant columns
-            for col_idx in [3, 4, 5, 6, 7]: # Harga_Saham_Saat_Ini, Jumlah_Saham_Beredar, Net_Income_Terbaru, Total_Pendapatan_Terbaru, Total_Ekuitas_Terbaru
-                worksheet_sector.write(row, col_idx, df_sector.iloc[row-1, col_idx], number_format_currency)
-    
-    processed_data = output.getvalue()
-    return processed_data
+    return _write_template_workbook(df_target, df_sector, df_history)
 
 # Function to create empty Excel template
+@st.cache_data(show_spinner=False)
 def create_empty_excel_template():
     """
     Creates an empty Excel template with headers only
     """
-    # Headers only
-    headers = ['Ticker', 'Nama_Perusahaan', 'Sektor', 'Harga_Saham_Saat_Ini', 
-               'Jumlah_Saham_Beredar', 'Net_Income_Terbaru', 'Total_Pendapatan_Terbaru', 
-               'Total_Ekuitas_Terbaru']
-    
     # Create empty DataFrames with headers
-    df_target = pd.DataFrame(columns=headers)
-    df_sector = pd.DataFrame(columns=headers)
-    
-    # Create Excel file in memory
-    output = io.BytesIO()
-    with pd.ExcelWriter(output, engine='xlsxwriter') as writer:
-        # Write target company sheet
-        df_target.to_excel(writer, sheet_name='Perusahaan_Target', index=False)
-        
-        # Write sector companies sheet
-        df_sector.to_excel(writer, sheet_name='Perusahaan_Sektor', index=False)
-        
-        # Get workbook and worksheets
-        workbook = writer.book
-        worksheet_target = writer.sheets['Perusahaan_Target']
-        worksheet_sector = writer.sheets['Perusahaan_Sektor']
-        
-        # Format headers
-        header_format = workbook.add_format({
-            'bold': True,
-            'text_wrap': True,
-            'valign': 'top',
-            'fg_color': '#4472C4',
-            'font_color': 'white',
-            'border': 1
-        })
-        
-        # Apply formatting to both sheets
-        for col_num, value in enumerate(headers):
-            worksheet_target.write(0, col_num, value, header_format)
-            worksheet_target.set_column(col_num, col_num, 20)
-            
-            worksheet_sector.write(0, col_num, value, header_format)
-            worksheet_sector.set_column(col_num, col_num, 20)
-    
-    processed_data = output.getvalue()
-    return processed_data
+    df_target = pd.DataFrame(columns=TEMPLATE_COLUMNS)
+    df_sector = pd.DataFrame(columns=TEMPLATE_COLUMNS)
+    df_history = pd.DataFrame(columns=HISTORY_COLUMNS)
 
-# Function to read data from the uploaded Excel file
-@st.cache_data
-def read_excel_data(uploaded_file):
+    return _write_template_workbook(df_target, df_sector, df_history)
+
+# Function to get the content key of an uploaded file, hashed once per upload in the session
+def uploaded_content_key(uploaded_file):
     """
-    Reads target company and sector comparable company data from an Excel file.
-    Assumptions:
-    - The first sheet is named 'Perusahaan_Target' and contains single-row data.
-    - The second sheet is named 'Perusahaan_Sektor' and contains multi-row data.
+    SHA-256 of the file content plus its extension. Reruns with the same upload reuse the digest
+    instead of hashing the whole file again.
+    """
+    content_keys = st.session_state.setdefault('content_keys', {})
+    upload_id = (getattr(uploaded_file, 'file_id', None), uploaded_file.name, uploaded_file.size)
+    if upload_id not in content_keys:
+        content_keys[upload_id] = content_hash(uploaded_file.getvalue()) + '.' + uploaded_file.name.rsplit('.', 1)[-1].lower()
+    return content_keys[upload_id]
+
+# Function to combine the schema problems of several sheets into one table
+def _schema_issue_table(sheets):
+    """
+    The issues of {sheet: (issues, missing columns)} with a 'Sheet' column in front of the schema's
+    ISSUE_COLUMNS; missing columns are listed with no row number. Empty when there is no problem.
+    """
+    issues = []
+    for sheet, (sheet_issues, missing_columns) in sheets.items():
+        if missing_columns:
+            issues.append(pd.DataFrame({'Sheet': [sheet], 'Baris': [None], 'Ticker': [None],
+                                        'Masalah': [f"Kolom tidak ada: {', '.join(missing_columns)}"]}))
+        if not sheet_issues.empty:
+            issues.append(sheet_issues.assign(Sheet=sheet))
+    return pd.concat(issues, ignore_index=True)[['Sheet', 'Baris', 'Ticker', 'Masalah']] if issues else pd.DataFrame()
+
+# Function to parse an uploaded file and coerce both tables to the typed schema
+def _load_typed_frames(uploaded_file):
+    """
+    (typed target frame, typed comparables frame, issues of both sheets as in _schema_issue_table).
+    """
+    df_target, df_sector = read_valuation_frames_cached(uploaded_file)
+    typed = {'Perusahaan_Target': apply_schema(df_target), 'Perusahaan_Sektor': apply_schema(df_sector)}
+    issues = _schema_issue_table({sheet: (result.issues, result.missing_columns)
+                                  for sheet, result in typed.items() if not result.frame.empty})
+    return typed['Perusahaan_Target'].frame, typed['Perusahaan_Sektor'].frame, issues
+
+# Function to parse an uploaded file (.xlsx, .csv, .parquet or .feather)
+def read_uploaded_frames(uploaded_file, with_issues=False):
+    """
+    Reads the target and comparable company DataFrames from the uploaded file, typed and validated
+    by apply_schema. Parsed frames are kept in the process-wide cache by content hash, so every
+    session that uploads the same file shares one copy; the .xlsx/.csv parse is also cached on disk.
+    The returned frames are shared and must not be modified. With `with_issues` the table of
+    invalid rows is returned as a third value.
     """
     try:
-        xls = pd.ExcelFile(uploaded_file)
-
-        # Read 'Perusahaan_Target' sheet
-        if 'Perusahaan_Target' in xls.sheet_names:
-            df_target = pd.read_excel(xls, sheet_name='Perusahaan_Target')
-            if not df_target.empty:
-                # Take the first row (assuming only one target company)
-                target_data = df_target.iloc[0].to_dict()
-            else:
-                st.error("Sheet 'Perusahaan_Target' is empty or has no data.")
-                return None, None
-        else:
-            st.error("Excel file must have a sheet named 'Perusahaan_Target'.")
-            return None, None
+        df_target, df_sector, issues = shared_cache().get_or_compute(('frames', uploaded_content_key(uploaded_file)),
+                                                                     lambda: _load_typed_frames(uploaded_file))
+    except Exception as e:
+        st.error(f"Failed to read file: {e}. Please ensure the file format and sheet names are correct.")
+        df_target, df_sector, issues = None, None, pd.DataFrame()
+    return (df_target, df_sector, issues) if with_issues else (df_target, df_sector)
 
-        # Read 'Perusahaan_Sektor' sheet
-        if 'Perusahaan_Sektor' in xls.sheet_names:
-            df_sector = pd.read_excel(xls, sheet_name='Perusahaan_Sektor')
-            if df_sector.empty:
-                st.warning("Sheet 'Perusahaan_Sektor' is empty. Sector comparison will not be performed.")
-        else:
-            st.warning("Excel file does not have a sheet named 'Perusahaan_Sektor'. Sector comparison will not be performed.")
-            df_sector = pd.DataFrame() # Create an empty DataFrame
+# Function to report every invalid row of the upload in one place
+def show_schema_issues(issues):
+    """
+    One warning with the number of invalid rows and the full list in an expander.
+    """
+    if issues is None or issues.empty:
+        return
+    st.warning(f"⚠️ {len(issues):,} baris/kolom tidak valid ditemukan saat memuat file. Nilai yang kosong atau tidak terbaca dianggap tidak tersedia.")
+    with st.expander("Lihat daftar data tidak valid"):
+        st.dataframe(issues, use_container_width=True, hide_index=True)
+
+# Function to start parsing the per-period history of an uploaded file in the background
+def submit_history_read(uploaded_file):
+    """
+    Parses the 'Perusahaan_Historis' sheet (or a separate history table) on the shared thread pool
+    and returns the Future of the frame, empty when there is none. The worker reads its own copy of
+    the upload, so it never moves the file position under the script thread. Kept in the
+    process-wide cache by content hash like the other parsed frames; the frame is shared and must
+    not be modified.
+    """
+    cache_key = ('history', uploaded_content_key(uploaded_file))
+    content, file_name = io.BytesIO(uploaded_file.getvalue()), uploaded_file.name
+    return submit_tasks({
+        'history': lambda: shared_cache().get_or_compute(cache_key, lambda: read_history_frame(content, file_name))
+    })['history']
 
-        return target_data, df_sector
+# Function to collect the per-period history parsed in the background
+def read_uploaded_history(history_future):
+    """
+    The frame of a submit_history_read Future; a warning and an empty frame when it cannot be read.
+    """
+    try:
+        return history_future.result()
     except Exception as e:
-        st.error(f"Failed to read Excel file: {e}. Please ensure the file format and sheet names are correct.")
-        return None, None
+        st.warning(f"Data historis tidak dapat dibaca: {e}")
+        return pd.DataFrame()
 
-# Function to calculate key financial ratios
-def calculate_key_ratios(net_income, revenue, total_equity, current_price, shares_outstanding):
+# Function to keep this session's per-period store in sync with the uploaded history
+def get_session_period_store(history_df, store_key):
     """
-    Calculates key financial ratios (Net Profit Margin, ROE, P/E Ratio, P/B Ratio)
-    from direct inputs.
+    One append-only PeriodStore per history source in the session. Re-uploading a file with one
+    more quarter only appends that quarter's rows. Returns (PeriodStore, rows appended by this upload).
     """
-    ratios = {}
+    stores = st.session_state.setdefault('period_stores', {})
+    store = stores.setdefault(store_key, PeriodStore())
+    return store, store.append(history_df)
 
-    # Net Profit Margin
-    if net_income is not None and revenue is not None and revenue != 0:
-        ratios['Net Profit Margin (%)'] = (net_income / revenue) * 100
-    else:
-        ratios['Net Profit Margin (%)'] = float('nan')
+# Function to stream one sector's comparables out of a large workbook
+def stream_uploaded_comparables(uploaded_file, sector):
+    """
+    Reads 'Perusahaan_Sektor' in chunks and keeps only the rows of `sector`, so memory follows
+    the size of the sector instead of the file. Cached per (content hash, sector) in the process-wide cache.
+    Returns StreamedComparables, or None if the file cannot be read.
+    """
+    try:
+        return shared_cache().get_or_compute(('streamed', uploaded_content_key(uploaded_file), normalize_sector(sector)),
+                                             lambda: stream_sector_comparables(uploaded_file, [sector]))
+    except Exception as e:
+        st.error(f"Failed to read file: {e}. Please ensure the file format and sheet names are correct.")
+        return None
+
+# Function to build the sector index over the comparables once per uploaded dataset
+def build_sector_index(df_sector, uploaded_file, target_ticker=None):
+    """
+    Normalizes and groups the 'Sektor' column once and precomputes per-sector averages.
+    Kept in the process-wide cache by the file's content hash (and the target left out of a
+    single-table file), so every rerun and session that loads the same comparables shares it.
+    """
+    return shared_cache().get_or_compute(('sector_index', uploaded_content_key(uploaded_file), target_ticker),
+                                         lambda: SectorIndex(df_sector))
+
+# Function to build the nearest-neighbour peer index once per uploaded dataset
+def build_peer_index(df_sector, uploaded_file, target_ticker=None, sector_weight=0.0):
+    """
+    Standardizes the peer features of the comparables and builds their KD-tree once.
+    Kept in the process-wide cache by content hash, left-out target and sector weight.
+    """
+    return shared_cache().get_or_compute(('peer_index', uploaded_content_key(uploaded_file), target_ticker, sector_weight),
+                                         lambda: PeerIndex(df_sector, sector_weight=sector_weight))
+
+# Function to build the screener's sorted ratio indexes once per uploaded dataset
+def build_screen_index(df_sector, uploaded_file):
+    """
+    Sorts every screenable ratio of the comparables once, reusing the cached sector index for the
+    sector averages. Kept in the process-wide cache by content hash, so each query is only binary searches.
+    """
+    def compute():
+        sector_index = build_sector_index(df_sector, uploaded_file)
+        return ScreenIndex(df_sector, ratios=sector_index.ratios, sector_index=sector_index)
+
+    return shared_cache().get_or_compute(('screen_index', uploaded_content_key(uploaded_file)), compute)
+
+# Function to keep this session's sector aggregates in sync with the latest upload
+def get_session_sector_index(df_sector):
+    """
+    Diff-aware alternative to build_sector_index. The first upload of the session is computed in full.
+    Later uploads only recompute the ratios of added/changed rows and adjust each sector's running
+    sums and counts. Returns (SectorIndex, ChangeSummary or None on the first upload).
+    """
+    state = st.session_state.get('incremental_sector_state')
+    if state is None:
+        st.session_state['incremental_sector_state'] = IncrementalSectorState(df_sector)
+        st.session_state['incremental_sector_index'] = st.session_state['incremental_sector_state'].sector_index()
+        return st.session_state['incremental_sector_index'], None
 
-    # ROE (Return on Equity)
-    if net_income is not None and total_equity is not None and total_equity != 0:
-        ratios['ROE (%)'] = (net_income / total_equity) * 100
+    changes = state.update(df_sector)
+    if changes.added or changes.removed or changes.changed:
+        st.session_state['incremental_sector_index'] = state.sector_index()
+        st.session_state['incremental_last_changes'] = changes
+    return st.session_state['incremental_sector_index'], changes
+
+# Function to show what the last diff-aware update recomputed
+def show_incremental_changes(changes):
+    """
+    Small note listing how many comparable rows were added, removed or changed by the last re-upload.
+    """
+    if changes is not None and (changes.added or changes.removed or changes.changed):
+        st.info(
+            f"♻️ Perubahan sejak upload sebelumnya: {len(changes.changed)} baris berubah, "
+            f"{len(changes.added)} baris baru, {len(changes.removed)} baris dihapus. "
+            f"Hanya {len(changes.sectors)} sektor yang dihitung ulang."
+        )
+
+# Most recently repriced companies shown in the live batch table
+LIVE_TABLE_ROWS = 50
+
+# Function to keep one live pricer and price feed per dataset in the session
+def get_session_live_pricer(pricer_key, targets_df, comparables_df, methods, source):
+    """
+    The session's LivePricer for `pricer_key` and the price feed of `source`, one of the sources
+    configured on the server. Each is rebuilt only when its key changes, so the ticks applied so far
+    survive reruns; a new pricer replays the feed from the start.
+    """
+    live = st.session_state.setdefault('live_pricing', {})
+    if live.get('pricer_key') != pricer_key:
+        live.update(pricer_key=pricer_key, pricer=LivePricer(targets_df, comparables_df, methods), recent=[], feed_key=None)
+    if live.get('feed_key') != source:
+        live.update(feed_key=source, feed=open_price_feed(source))
+    return live['pricer'], live['feed'], live['recent']
+
+# Function to apply the ticks that arrived since the last refresh and show the live valuation
+def show_live_valuation(pricer, feed, recent, target_ticker=None, upload_price=None):
+    """
+    Polls the feed once and applies its ticks (the latest price per ticker wins), then shows the
+    target's live quote, or the batch targets repriced most recently. Runs as a fragment with
+    run_every, so a refresh reruns only this section and a burst of ticks costs one refresh.
+    """
+    try:
+        ticks = feed.poll()
+    except (OSError, ValueError) as e:
+        st.warning(f"⚠️ Sumber harga tidak dapat dibaca: {e}")
+        ticks = []
+    repriced = pricer.apply(ticks)
+    recent[:] = [ticker for ticker in recent if ticker not in repriced][-LIVE_TABLE_ROWS:] + repriced
+    st.caption(f"📡 {len(ticks)} tick diterima, {len(repriced)} saham diperbarui pada refresh ini "
+               f"({pricer.ticks:,} sejak mulai). Rata-rata sektor: mean tanpa perusahaan itu sendiri.")
+
+    if target_ticker is not None:
+        quote = pricer.quote(target_ticker)
+        if quote is None:
+            return
+        cols = st.columns(len(quote.fair_values) + 2)
+        with cols[0]:
+            delta = f"{(quote.price / upload_price - 1) * 100:+.2f}%" if upload_price else None
+            st.metric("Harga Live", f"Rp {quote.price:,.0f}", delta=delta)
+        for col, (key, fair_value) in zip(cols[1:], quote.fair_values.items()):
+            with col:
+                st.metric(f"Fair Value ({key})", f"Rp {fair_value:,.0f}" if not pd.isna(fair_value) and fair_value > 0 else "-")
+                st.caption(quote.statuses[key] or "tidak valid")
+        with cols[-1]:
+            st.metric("Rekomendasi Live", quote.recommendation)
+    elif recent:
+        live_results = pricer.snapshot(recent[-LIVE_TABLE_ROWS:])
+        st.dataframe(format_page(live_results, {
+            'Harga_Saham_Saat_Ini': "Rp {:,.0f}",
+            **{ratio: "{:.2f}" for ratio in RATIO_COLUMNS},
+            **{f'Rata-rata Sektor {key}': "{:.2f}" for key in pricer.method_keys},
+            **{f'Fair Value ({key})': "Rp {:,.0f}" for key in pricer.method_keys}
+        }), use_container_width=True, hide_index=True)
     else:
-        ratios['ROE (%)'] = float('nan')
+        st.info("ℹ️ Belum ada harga baru untuk perusahaan dalam file.")
 
-    # P/E Ratio (Price-to-Earnings Ratio)
-    if current_price is not None and shares_outstanding is not None and shares_outstanding != 0:
-        if net_income is not None and net_income != 0:
-            eps = net_income / shares_outstanding
-            ratios['P/E Ratio'] = current_price / eps if eps != 0 else float('inf')
-        else:
-            ratios['P/E Ratio'] = float('inf')
+# Function to run the Monte Carlo fair value simulation once per set of inputs
+@st.cache_data(show_spinner=False, max_entries=16)
+def run_fair_value_simulation(ticker_ratios, comparables_df, current_price, n_samples, seed):
+    """
+    Cached wrapper around simulate_fair_value, so widget changes elsewhere do not redraw the samples.
+    """
+    return simulate_fair_value(ticker_ratios, comparables_df, current_price, n_samples=n_samples, seed=seed)
 
-    # P/B Ratio (Price-to-Book Ratio)
-    if current_price is not None and shares_outstanding is not None and shares_outstanding != 0:
-        if total_equity is not None and total_equity != 0:
-            book_value_per_share = total_equity / shares_outstanding if shares_outstanding != 0 else 0
-            ratios['P/B Ratio'] = current_price / book_value_per_share if book_value_per_share != 0 else float('inf')
-        else:
-            ratios['P/B Ratio'] = float('inf')
+# Function to render a large table one sorted page at a time
+def show_paginated_table(df, key, formats=None):
+    """
+    Sorting and paging happen on the server; only the visible page is formatted and sent to the browser.
+    `key` keeps the widgets of several tables apart, `formats` maps columns to format strings.
+    Returns the unformatted rows of the visible page.
+    """
+    original_order = "(urutan asli)"
+    sort_col, order_col, size_col, page_col = st.columns([3, 2, 2, 2])
+    with sort_col:
+        sort_by = st.selectbox("Urutkan berdasarkan", [original_order] + list(df.columns), key=f"{key}_sort_by")
+    with order_col:
+        order = st.selectbox("Urutan", ["Naik", "Turun"], key=f"{key}_order", disabled=sort_by == original_order)
+    with size_col:
+        page_size = st.selectbox("Baris per halaman", PAGE_SIZES, key=f"{key}_page_size")
+    sort_by = None if sort_by == original_order else sort_by
+
+    pages = page_count(len(df), page_size)
+    # A larger page size (or a smaller upload) can leave the remembered page past the end
+    if st.session_state.get(f"{key}_page", 1) > pages:
+        st.session_state[f"{key}_page"] = pages
+    with page_col:
+        page = st.number_input("Halaman", min_value=1, max_value=pages, step=1, key=f"{key}_page")
 
-    return {k: v for k, v in ratios.items() if not pd.isna(v)}
+    with profiler.stage('render'):
+        page_df, pages = paginate(df, page, page_size, sort_by=sort_by, ascending=order == "Naik")
+        st.dataframe(format_page(page_df, formats or {}), use_container_width=True, hide_index=True)
+    st.caption(f"Halaman {min(page, pages)} dari {pages} ({len(df):,} baris)")
+    return page_df
 
-# Function to filter comparable companies by sector from Excel data
-def get_sector_comparables_from_excel(comparables_df, target_sector):
+# Function to read data from the uploaded Excel file
+def read_excel_data(uploaded_file, target_ticker=None):
     """
-    Filters the comparable companies DataFrame to get only those in the same sector.
+    Reads target company and sector comparable company data from an uploaded file.
+    Assumptions:
+    - The first sheet is named 'Perusahaan_Target' and contains single-row data.
+    - The second sheet is named 'Perusahaan_Sektor' and contains multi-row data.
+    For single-table files (.csv, .parquet, .feather) the target is the row of `target_ticker`,
+    which is then left out of the comparables.
     """
-    if comparables_df.empty or 'Sektor' not in comparables_df.columns:
-        return pd.DataFrame() # Return empty if no data or 'Sektor' column
+    df_target, df_sector, issues = read_uploaded_frames(uploaded_file, with_issues=True)
+    if df_target is None:
+        return None, None
+    show_schema_issues(issues)
+
+    if target_ticker is not None:
+        is_target = df_sector['Ticker'].astype(str) == str(target_ticker)
+        if not is_target.any():
+            st.error(f"Ticker '{target_ticker}' tidak ditemukan di file.")
+            return None, None
+        return df_sector[is_target].iloc[0].to_dict(), df_sector[~is_target]
+
+    if df_target.empty:
+        st.error("Sheet 'Perusahaan_Target' is missing or has no data.")
+        return None, None
+
+    # Take the first row (assuming only one target company)
+    target_data = df_target.iloc[0].to_dict()
 
-    # Ensure case-insensitive sector comparison
-    filtered_comparables = comparables_df[
-        comparables_df['Sektor'].astype(str).str.lower() == target_sector.lower()
-    ]
-    return filtered_comparables
+    if df_sector.empty:
+        st.warning("Sheet 'Perusahaan_Sektor' is missing or empty. Sector comparison will not be performed.")
 
-# Function to calculate average sector ratios from Excel data
-def calculate_sector_averages_from_excel(comparable_companies_data):
+    return target_data, df_sector
+
+# Function to read the target and only its sector's comparables from a large workbook
+def read_excel_data_streaming(uploaded_file):
     """
-    Calculates average financial ratios for a specific sector
-    from the filtered comparable companies DataFrame.
+    Streaming variant of read_excel_data for .xlsx files: the target sheet is read first, then
+    'Perusahaan_Sektor' is scanned in chunks keeping only the target's sector. Both are typed by
+    apply_schema and their invalid rows are reported as in read_excel_data.
+    Returns (target_data, comparables of the target sector, SectorIndex over them).
     """
-    all_pe_ratios = []
-    all_pb_ratios = []
-    all_roe_ratios = []
-    all_npm_ratios = []
-
-    if comparable_companies_data.empty:
-        return {}
-
-    for index, row in comparable_companies_data.iterrows():
-        current_price = row.get('Harga_Saham_Saat_Ini')
-        shares_outstanding = row.get('Jumlah_Saham_Beredar')
-        net_income = row.get('Net_Income_Terbaru')
-        revenue = row.get('Total_Pendapatan_Terbaru')
-        total_equity = row.get('Total_Ekuitas_Terbaru')
-
-        if (current_price is not None and shares_outstanding is not None and shares_outstanding != 0 and
-            net_income is not None and revenue is not None and total_equity is not None):
-
-            ratios = calculate_key_ratios(net_income, revenue, total_equity, current_price, shares_outstanding)
-
-            if 'P/E Ratio' in ratios and ratios['P/E Ratio'] != float('inf') and not pd.isna(ratios['P/E Ratio']):
-                all_pe_ratios.append(ratios['P/E Ratio'])
-            if 'P/B Ratio' in ratios and ratios['P/B Ratio'] != float('inf') and not pd.isna(ratios['P/B Ratio']):
-                all_pb_ratios.append(ratios['P/B Ratio'])
-            if 'ROE (%)' in ratios and not pd.isna(ratios['ROE (%)']):
-                all_roe_ratios.append(ratios['ROE (%)'])
-            if 'Net Profit Margin (%)' in ratios and not pd.isna(ratios['Net Profit Margin (%)']):
-                all_npm_ratios.append(ratios['Net Profit Margin (%)'])
-        else:
-            # Suppress warnings for individual missing comparables data
-            pass
-
-    sector_averages = {}
-    if all_pe_ratios:
-        sector_averages['P/E Ratio'] = sum(all_pe_ratios) / len(all_pe_ratios)
-    if all_pb_ratios:
-        sector_averages['P/B Ratio'] = sum(all_pb_ratios) / len(all_pb_ratios)
-    if all_roe_ratios:
-        sector_averages['ROE (%)'] = sum(all_roe_ratios) / len(all_roe_ratios)
-    if all_npm_ratios:
-        sector_averages['Net Profit Margin (%)'] = sum(all_npm_ratios) / len(all_npm_ratios)
-
-    return sector_averages
-
-# Function to calculate fair value using the multiplier method
-def calculate_fair_value_multiplier(ticker_ratios, sector_avg_ratios, current_price, method='P/E'):
+    try:
+        typed_target = apply_schema(read_target_frame(uploaded_file))
+    except Exception as e:
+        st.error(f"Failed to read file: {e}. Please ensure the file format and sheet names are correct.")
+        return None, None, None
+
+    if typed_target.frame.empty:
+        st.error("Sheet 'Perusahaan_Target' is missing or has no data.")
+        return None, None, None
+
+    target_data = typed_target.frame.iloc[0].to_dict()
+    streamed = stream_uploaded_comparables(uploaded_file, str(target_data.get('Sektor')))
+    if streamed is None:
+        return None, None, None
+    sheets = {'Perusahaan_Target': (typed_target.issues, typed_target.missing_columns)}
+    if streamed.rows_read:
+        sheets['Perusahaan_Sektor'] = (streamed.issues, streamed.missing_columns)
+    show_schema_issues(_schema_issue_table(sheets))
+
+    if streamed.rows_read == 0:
+        st.warning("Sheet 'Perusahaan_Sektor' is missing or empty. Sector comparison will not be performed.")
+    else:
+        st.caption(f"🌊 {streamed.rows_read:,} baris dibaca, {len(streamed.comparables):,} baris sektor target disimpan.")
+
+    return target_data, streamed.comparables, streamed.sector_index
+
+# Function to read every row of both sheets for batch valuation
+def read_excel_batch_data(uploaded_file):
     """
-    Calculates fair value using the multiplier method (P/E or P/B).
-    Assumption: The fair price of the company is when its ratio equals the sector average.
+    Reads the full 'Perusahaan_Target' and 'Perusahaan_Sektor' sheets for batch valuation.
+    Unlike read_excel_data, every row of 'Perusahaan_Target' is kept. Missing sheets become empty DataFrames.
     """
-    fair_value = None
-    if current_price is None:
-        return None
+    df_target, df_sector, issues = read_uploaded_frames(uploaded_file, with_issues=True)
+    if df_target is None:
+        return None, None
+    show_schema_issues(issues)
 
-    # Fair value calculation based on P/E Ratio
-    if method == 'P/E' and 'P/E Ratio' in ticker_ratios and 'P/E Ratio' in sector_avg_ratios:
-        if ticker_ratios['P/E Ratio'] != 0 and ticker_ratios['P/E Ratio'] != float('inf') and not pd.isna(ticker_ratios['P/E Ratio']):
-            # Ensure sector_avg_ratios['P/E Ratio'] is not zero to avoid division by zero
-            if sector_avg_ratios['P/E Ratio'] != 0:
-                fair_value_multiplier = sector_avg_ratios['P/E Ratio'] / ticker_ratios['P/E Ratio']
-                fair_value = current_price * fair_value_multiplier
-            else:
-                fair_value = float('inf') # Sector average P/E is zero, implies infinite fair value if current P/E is not zero
-    # Fair value calculation based on P/B Ratio
-    elif method == 'P/B' and 'P/B Ratio' in ticker_ratios and 'P/B Ratio' in sector_avg_ratios:
-        if ticker_ratios['P/B Ratio'] != 0 and ticker_ratios['P/B Ratio'] != float('inf') and not pd.isna(ticker_ratios['P/B Ratio']):
-            # Ensure sector_avg_ratios['P/B Ratio'] is not zero to avoid division by zero
-            if sector_avg_ratios['P/B Ratio'] != 0:
-                fair_value_multiplier = sector_avg_ratios['P/B Ratio'] / ticker_ratios['P/B Ratio']
-                fair_value = current_price * fair_value_multiplier
-            else:
-                fair_value = float('inf') # Sector average P/B is zero, implies infinite fair value if current P/B is not zero
-    return fair_value
+    if df_target.empty and df_sector.empty:
+        st.error("Sheet 'Perusahaan_Target' dan 'Perusahaan_Sektor' kosong atau tidak ditemukan.")
+        return None, None
+
+    return df_target, df_sector
 
+# Chart figures are cached by their inputs (st.plotly_chart only reads them), so reruns with
+# unchanged numbers skip building and validating the plotly objects again
+@st.cache_resource(show_spinner=False, max_entries=256)
 def create_gauge_chart(current_price, fair_value, title):
     """Create a gauge chart for fair value visualization"""
     if fair_value is None or pd.isna(fair_value) or fair_value <= 0:
@@ -371,6 +604,7 @@ def create_gauge_chart(current_price, fair_value, title):
     
     return fig
 
+@st.cache_resource(show_spinner=False, max_entries=64)
 def create_comparison_chart(target_ratios, sector_ratios):
     """Create a comparison chart between target and sector ratios"""
     if not target_ratios or not sector_ratios:
@@ -419,6 +653,177 @@ def create_comparison_chart(target_ratios, sector_ratios):
     
     return fig
 
+# Maximum number of companies drawn in the compact batch gauge figure
+COMPACT_GAUGE_LIMIT = 50
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def create_batch_gauge_grid(batch_results):
+    """Create one small-multiples figure of bullet gauges (one column per valuation method) for many companies"""
+    rows = batch_results.head(COMPACT_GAUGE_LIMIT)
+    if rows.empty:
+        return None
+
+    methods = [column[len('Fair Value ('):-1] for column in rows.columns if column.startswith('Fair Value (')]
+    # Width of one method's column of gauges, the ticker labels take the left 12%
+    span = 0.92 / len(methods)
+    row_height = 1.0 / len(rows)
+    fig = go.Figure()
+    for i, (_, company) in enumerate(rows.iterrows()):
+        # First company at the top
+        y_domain = [1.0 - (i + 1) * row_height + row_height * 0.15, 1.0 - i * row_height - row_height * 0.15]
+        price = company['Harga_Saham_Saat_Ini']
+        for j, method in enumerate(methods):
+            fair_value = company[f'Fair Value ({method})']
+            x_domain = [0.12 + j * span, 0.06 + (j + 1) * span]
+            if pd.isna(fair_value) or fair_value <= 0 or pd.isna(price) or price <= 0 or fair_value == np.inf:
+                continue
+            max_value = max(price, fair_value) * 1.2
+            fig.add_trace(go.Indicator(
+                mode="number+gauge",
+                value=price,
+                number={'font': {'size': 11}, 'valueformat': ',.0f'},
+                domain={'x': x_domain, 'y': y_domain},
+                title={'text': company['Ticker'] if j == 0 else '', 'font': {'size': 11}},
+                gauge={
+                    'shape': 'bullet',
+                    'axis': {'range': [0, max_value], 'visible': False},
+                    'bar': {'color': '#5E81AC', 'thickness': 0.4},
+                    'steps': [
+                        {'range': [0, fair_value * 0.95], 'color': '#A3BE8C'}, # Undervalued (Greenish)
+                        {'range': [fair_value * 0.95, fair_value * 1.05], 'color': '#EBCB8B'}, # Fair (Yellowish)
+                        {'range': [fair_value * 1.05, max_value], 'color': '#BF616A'} # Overvalued (Reddish)
+                    ],
+                    'threshold': {'line': {'color': '#D08770', 'width': 2}, 'thickness': 0.8, 'value': fair_value}
+                }
+            ))
+
+    if not fig.data:
+        return None
+
+    for j, method in enumerate(methods):
+        fig.add_annotation(x=0.09 + (j + 0.5) * span, y=1.0, xref='paper', yref='paper', yanchor='bottom',
+                           text=f'<b>Harga vs Fair Value ({method})</b>', showarrow=False)
+    fig.update_layout(
+        height=40 * len(rows) + 80,
+        margin=dict(l=20, r=20, t=40, b=20),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2E3440'}
+    )
+
+    return fig
+
+def create_sensitivity_heatmap(grid, current_price, title):
+    """Create a heatmap of fair value over the sensitivity grid, centered on the current price"""
+    if grid is None:
+        return None
+
+    values = grid.to_numpy()
+    finite = values[np.isfinite(values)]
+    if finite.size == 0:
+        return None
+
+    # Diverging scale around the current price: green where fair value is above it (undervalued)
+    spread = max(abs(finite.max() - current_price), abs(current_price - finite.min())) or 1.0
+    fig = go.Figure(go.Heatmap(
+        z=np.where(np.isfinite(values), values, np.nan),
+        x=grid.columns,
+        y=grid.index,
+        colorscale='RdYlGn',
+        zmin=current_price - spread,
+        zmax=current_price + spread,
+        colorbar={'title': 'Fair Value'},
+        hovertemplate=f"{grid.index.name}: %{{y}}<br>{grid.columns.name}: %{{x}}<br>Fair Value: Rp %{{z:,.0f}}<extra></extra>"
+    ))
+
+    fig.update_layout(
+        title=title,
+        xaxis_title=grid.columns.name,
+        yaxis_title=grid.index.name,
+        height=400,
+        margin=dict(l=20, r=20, t=60, b=20),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2E3440'},
+        title_font={'size': 15, 'color': '#2E3440'}
+    )
+
+    return fig
+
+def build_sensitivity_heatmap(ratios, sector_avg_ratios, current_price, method, steps):
+    """Compute one method's sensitivity grid and its heatmap in one background task; returns (grid, heatmap)"""
+    grid = sensitivity_grid(ratios, sector_avg_ratios, current_price, method=method, steps=steps)
+    return grid, create_sensitivity_heatmap(grid, current_price, f"Sensitivitas Fair Value ({method})")
+
+def create_simulation_histogram(samples, current_price, title):
+    """Create a histogram of simulated fair values with the current price marked"""
+    finite = samples[np.isfinite(samples)]
+    if finite.size == 0:
+        return None
+
+    # Bin the central 98% only, so a few extreme bootstrap draws do not flatten the chart
+    low, high = np.percentile(finite, [1, 99])
+    if high <= low:
+        low, high = low - 1, high + 1
+    counts, edges = np.histogram(finite, bins=60, range=(low, high))
+
+    fig = go.Figure(go.Bar(
+        x=(edges[:-1] + edges[1:]) / 2,
+        y=counts / samples.size,
+        width=np.diff(edges),
+        marker_color='#5E81AC',
+        hovertemplate="Fair Value: Rp %{x:,.0f}<br>Peluang: %{y:.2%}<extra></extra>"
+    ))
+    fig.add_vline(x=current_price, line_color='#D08770', line_width=3, annotation_text='Harga Saat Ini')
+
+    fig.update_layout(
+        title=title,
+        xaxis_title='Fair Value (Rp)',
+        yaxis_title='Peluang',
+        height=350,
+        margin=dict(l=20, r=20, t=60, b=20),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2E3440'},
+        title_font={'size': 15, 'color': '#2E3440'}
+    )
+
+    return fig
+
+@st.cache_resource(show_spinner=False, max_entries=32)
+def create_history_chart(history_rows, title):
+    """Create a line chart of the price against both historical fair values"""
+    rows = history_rows.dropna(subset=['Tanggal'])
+    if rows.empty:
+        return None
+
+    fig = go.Figure()
+    for column, color, dash in [('Harga', '#2E3440', 'solid'), ('Fair Value (P/E)', '#5E81AC', 'dash'), ('Fair Value (P/B)', '#A3BE8C', 'dot')]:
+        values = rows[column].where(np.isfinite(rows[column].astype(float)))
+        fig.add_trace(go.Scatter(
+            x=rows['Tanggal'],
+            y=values,
+            name=column,
+            mode='lines+markers',
+            line={'color': color, 'dash': dash, 'width': 3 if column == 'Harga' else 2},
+            hovertemplate=f"{column}: Rp %{{y:,.0f}}<extra></extra>"
+        ))
+
+    fig.update_layout(
+        title=title,
+        xaxis_title='Periode',
+        yaxis_title='Rupiah',
+        hovermode='x unified',
+        height=400,
+        margin=dict(l=20, r=20, t=60, b=20),
+        paper_bgcolor='rgba(0,0,0,0)',
+        plot_bgcolor='rgba(0,0,0,0)',
+        font={'color': '#2E3440'},
+        title_font={'size': 15, 'color': '#2E3440'}
+    )
+
+    return fig
+
 # --- Streamlit User Interface ---
 st.set_page_config(
     layout="wide", 
@@ -637,6 +1042,14 @@ st.markdown("""
 </div>
 """, unsafe_allow_html=True)
 
+# Memory tracing is global to the server process: it is turned on once through the environment,
+# never by a session, so one session's run cannot stop or reset it under another
+if os.environ.get(TRACE_MEMORY_ENV):
+    start_memory_tracing()
+
+# Per-stage timings of this rerun; memory is read from the tracer only when the debug panel is enabled
+profiler = StageProfiler(trace_memory=st.session_state.get('debug_profiling', False), run_label='fair_value_app')
+
 # Sidebar
 with st.sidebar:
     st.markdown("""
@@ -682,9 +1095,9 @@ with st.sidebar:
     st.markdown("---")
     
     uploaded_file = st.file_uploader(
-        "Pilih file Excel (.xlsx)",
-        type=["xlsx"],
-        help="File harus berisi sheet 'Perusahaan_Target' dan 'Perusahaan_Sektor'"
+        "Pilih file data (.xlsx, .csv, .parquet, .feather)",
+        type=["xlsx", "csv", "parquet", "feather"],
+        help="File Excel harus berisi sheet 'Perusahaan_Target' dan 'Perusahaan_Sektor'. File CSV/Parquet/Feather berisi satu tabel semua perusahaan."
     )
     
     if uploaded_file is not None:
@@ -706,11 +1119,289 @@ with st.sidebar:
             - **Net_Income_Terbaru**: Laba bersih terbaru (dalam Rupiah)
             - **Total_Pendapatan_Terbaru**: Total pendapatan terbaru (dalam Rupiah)
             - **Total_Ekuitas_Terbaru**: Total ekuitas terbaru (dalam Rupiah)
+
+            **File CSV/Parquet/Feather:** satu tabel dengan kolom yang sama. Perusahaan target dipilih dari tabel.
+
+            **Sheet 3 'Perusahaan_Historis' (opsional):** satu baris per perusahaan per kuartal dengan kolom
+            Ticker, Periode (contoh: 2024Q1), Net_Income (12 bulan terakhir), Pendapatan, Ekuitas dan Harga.
+            Bisa juga diunggah sebagai file terpisah di bawah.
             """)
 
-if uploaded_file is not None:
-    with st.spinner("🔄 Memproses data..."):
-        target_data, df_sector_comparables = read_excel_data(uploaded_file)
+        history_file = st.file_uploader(
+            "Data historis per periode (opsional)",
+            type=["xlsx", "csv", "parquet", "feather"],
+            help="Tabel panjang dengan kolom Ticker, Periode, Net_Income, Pendapatan, Ekuitas, Harga. Menggantikan sheet 'Perusahaan_Historis'."
+        )
+
+        st.markdown("---")
+
+        # Analysis mode: single target company or every company in the workbook
+        analysis_mode = st.radio(
+            "Mode Analisis",
+            ["Perusahaan Tunggal", "Batch (Semua Perusahaan)", "Screener"],
+            help="Mode batch menilai semua perusahaan dalam file sekaligus. "
+                 "Screener menyaring semua perusahaan pembanding dengan kriteria rasio lalu menilai hasilnya."
+        )
+        selected_target_ticker = None
+        if is_single_table_source(uploaded_file):
+            # Single-table files have no target sheet: value every row, or pick the target from the table
+            batch_source = "Semua baris Perusahaan_Sektor"
+            if analysis_mode == "Perusahaan Tunggal":
+                _, df_uploaded_universe = read_uploaded_frames(uploaded_file)
+                if df_uploaded_universe is not None and 'Ticker' in df_uploaded_universe.columns:
+                    selected_target_ticker = st.selectbox(
+                        "Perusahaan Target",
+                        df_uploaded_universe['Ticker'].astype(str).tolist(),
+                        help="Perusahaan yang dinilai; baris lainnya menjadi pembanding"
+                    )
+        if analysis_mode == "Screener":
+            batch_source = "Screener"
+            screen_query = st.text_input(
+                "Kriteria screener",
+                value="P/E < 15 and P/B < sektor",
+                help="Gabungkan kondisi dengan 'and'/'dan'. Kolom: P/E, P/B, ROE, NPM. Operator: <, <=, >, >=. "
+                     "Nilai 'sektor' membandingkan dengan rata-rata sektor, contoh: 'P/E < 10 and ROE > 15 and P/B < sektor'."
+            )
+        elif analysis_mode == "Batch (Semua Perusahaan)" and not is_single_table_source(uploaded_file):
+            batch_source = st.radio(
+                "Sumber Perusahaan Target",
+                ["Sheet Perusahaan_Target", "Semua baris Perusahaan_Sektor"],
+                help="Pilih baris mana yang dinilai. Setiap perusahaan dibandingkan dengan rata-rata sektornya tanpa dirinya sendiri."
+            )
+
+        peer_mode = st.radio(
+            "Pemilihan Pembanding",
+            ["Sektor yang sama", "K tetangga terdekat"],
+            help="K tetangga terdekat memilih pembanding dari seluruh file berdasarkan kapitalisasi pasar, pendapatan, ROE dan "
+                 "Net Profit Margin (distandarisasi), tanpa syarat nama sektor yang sama."
+        )
+        use_peers = peer_mode == "K tetangga terdekat"
+        peer_count, peer_sector_weight = DEFAULT_PEERS, 0.0
+        if use_peers:
+            peer_count = st.slider("Jumlah pembanding (k)", min_value=3, max_value=50, value=DEFAULT_PEERS)
+            peer_sector_weight = st.slider(
+                "Bobot sektor",
+                min_value=0.0, max_value=3.0, value=0.0, step=0.5,
+                help="Jarak tambahan (dalam standar deviasi) untuk pembanding dari sektor lain. 0 = sektor diabaikan."
+            )
+
+        valuation_methods = st.multiselect(
+            "Metode Valuasi",
+            list(VALUATION_METHODS),
+            default=list(DEFAULT_METHODS),
+            help="Semua metode dihitung sekaligus; rekomendasi adalah suara mayoritas status setiap metode. "
+                 + " ".join(f"{key}: {method.description}." for key, method in VALUATION_METHODS.items())
+        )
+        if not valuation_methods:
+            st.warning("⚠️ Pilih minimal satu metode valuasi. P/E dan P/B dipakai.")
+            valuation_methods = list(DEFAULT_METHODS)
+
+        incremental_mode = st.checkbox(
+            "♻️ Hitung ulang hanya baris yang berubah",
+            value=True,
+            help="Saat file yang sama diunggah ulang setelah diedit, hanya perusahaan yang berubah yang dihitung ulang."
+        )
+
+        batch_workers = 1
+        if analysis_mode == "Batch (Semua Perusahaan)" and not incremental_mode and not use_peers:
+            cpu_count = os.cpu_count() or 1
+            batch_workers = st.number_input(
+                "Proses paralel",
+                min_value=1,
+                max_value=cpu_count,
+                value=min(default_workers(), cpu_count),
+                help="Setiap sektor dinilai di proses terpisah. Hasil sama dengan perhitungan serial; "
+                     "data kecil (di bawah 20.000 baris) selalu dihitung serial."
+            )
+
+        streaming_mode = False
+        # Nearest neighbours are searched in the whole universe, which streaming does not keep
+        if analysis_mode == "Perusahaan Tunggal" and not is_single_table_source(uploaded_file) and not use_peers:
+            streaming_mode = st.checkbox(
+                "🌊 Baca streaming (hemat memori)",
+                value=False,
+                help="Sheet 'Perusahaan_Sektor' dibaca bertahap dan hanya baris sektor target yang disimpan. "
+                     "Cocok untuk file ekspor yang sangat besar."
+            )
+
+        if analysis_mode == "Perusahaan Tunggal":
+            # All aggregators are computed together, so switching here does not recompute the sector
+            sector_aggregator = st.selectbox(
+                "Agregasi Rasio Sektor",
+                list(SECTOR_AGGREGATORS),
+                format_func=lambda key: SECTOR_AGGREGATORS[key],
+                help="Median, trimmed/winsorized mean dan harmonic mean mengurangi pengaruh pembanding dengan rasio ekstrem. "
+                     "Rata-rata tertimbang memakai Harga_Saham_Saat_Ini × Jumlah_Saham_Beredar sebagai bobot."
+            )
+
+        live_mode = False
+        price_feeds = configured_price_feeds()
+        # Live sector sums are plain means over the sector, which the nearest-neighbour peers are not
+        if analysis_mode != "Screener" and not use_peers and not price_feeds:
+            st.caption(f"📡 Harga live tidak tersedia: belum ada sumber harga di ${PRICE_FEEDS_ENV} server.")
+        elif analysis_mode != "Screener" and not use_peers:
+            live_mode = st.checkbox(
+                "📡 Harga live",
+                value=False,
+                help="Harga saat ini diperbarui dari sumber harga yang dikonfigurasi di server: file CSV yang terus ditambah "
+                     "(baris 'TICKER,HARGA') atau URL yang mengembalikan JSON. Setiap tick hanya menghitung ulang saham itu; "
+                     "data fundamental tidak dibaca ulang."
+            )
+        if live_mode:
+            # Only sources configured by the server operator can be chosen
+            live_source = st.selectbox(
+                "Sumber harga",
+                price_feeds,
+                help="JSON berupa {\"BBRI\": 4520, ...} atau [{\"Ticker\": \"BBRI\", \"Harga\": 4520}, ...]"
+            )
+            live_interval = st.number_input(
+                "Refresh setiap (detik)",
+                min_value=0.5, max_value=60.0, value=DEFAULT_REFRESH_SECONDS, step=0.5,
+                help="Tick yang datang di antara dua refresh digabung; hanya bagian harga live yang digambar ulang."
+            )
+
+    debug_profiling = st.checkbox(
+        "🛠️ Tampilkan profil performa",
+        key='debug_profiling',
+        help="Waktu dan memori setiap tahap (ingest, filter, rasio, agregasi, fair value, render) pada run ini."
+    )
+
+if uploaded_file is not None and analysis_mode in ("Batch (Semua Perusahaan)", "Screener"):
+    with st.spinner("🔄 Menilai semua perusahaan..."), profiler.stage('ingest'):
+        df_batch_targets, df_sector_comparables = read_excel_batch_data(uploaded_file)
+
+    if df_batch_targets is not None:
+        if batch_source == "Semua baris Perusahaan_Sektor":
+            df_batch_targets = df_sector_comparables
+        elif batch_source == "Screener":
+            # The matches of the screen are valued like a batch against the whole universe
+            try:
+                screen_conditions = parse_screen_query(screen_query)
+            except ValueError as e:
+                st.error(f"❌ Kriteria screener tidak valid: {e}")
+                screen_conditions = None
+            if screen_conditions is None:
+                df_batch_targets = df_sector_comparables.iloc[:0]
+            else:
+                with profiler.stage('filter'):
+                    screen_index = build_screen_index(df_sector_comparables, uploaded_file)
+                    screen_positions = screen_index.screen(screen_conditions)
+                df_batch_targets = df_sector_comparables.iloc[screen_positions]
+                st.caption(f"🔎 {len(screen_positions):,} dari {len(screen_index):,} perusahaan memenuhi: "
+                           + (' dan '.join(f"{c.field} {c.operator} {c.value:g}" for c in screen_conditions) or 'semua perusahaan'))
+
+        if df_batch_targets.empty:
+            if batch_source != "Screener":
+                st.warning("❌ Tidak ada perusahaan untuk dinilai pada sumber target yang dipilih.")
+            elif screen_conditions is not None:
+                st.warning("❌ Tidak ada perusahaan yang memenuhi kriteria screener.")
+        else:
+            if use_peers:
+                with profiler.stage('aggregation'):
+                    peer_index = build_peer_index(df_sector_comparables, uploaded_file, sector_weight=peer_sector_weight)
+                with profiler.stage('fair_value'):
+                    batch_results = value_companies_with_peers(df_batch_targets, df_sector_comparables, k=peer_count, peer_index=peer_index, methods=valuation_methods)
+            elif incremental_mode:
+                with profiler.stage('aggregation'):
+                    sector_index, sector_changes = get_session_sector_index(df_sector_comparables)
+                with profiler.stage('fair_value'):
+                    # One state per target source and method selection: each keeps its own cached results
+                    batch_state = st.session_state.setdefault('incremental_batch_states', {}).setdefault(
+                        (batch_source, tuple(valuation_methods)), IncrementalBatchValuation(methods=valuation_methods)
+                    )
+                    batch_results, revalued_count = batch_state.update(df_batch_targets, sector_index)
+                show_incremental_changes(sector_changes)
+                st.caption(f"♻️ {revalued_count} dari {len(batch_results)} perusahaan dinilai ulang pada run ini.")
+            else:
+                with profiler.stage('aggregation'):
+                    sector_index = build_sector_index(df_sector_comparables, uploaded_file)
+                with profiler.stage('fair_value'):
+                    batch_results = value_companies_parallel(df_batch_targets, df_sector_comparables, workers=batch_workers, sector_index=sector_index, methods=valuation_methods)
+
+            st.markdown(f"""
+            <div class="info-card">
+                <h2 style="color: #667eea; margin-bottom: 1rem;">📋 Valuasi Batch ({len(batch_results)} perusahaan)</h2>
+                <p style="color: #666; margin-bottom: 0;">{f"Rata-rata dihitung dari {peer_count} tetangga terdekat setiap perusahaan" if use_peers else "Rata-rata sektor dihitung"} tanpa menyertakan perusahaan yang sedang dinilai.</p>
+            </div>
+            """, unsafe_allow_html=True)
+
+            recommendation_counts = batch_results['Rekomendasi'].value_counts()
+            count_cols = st.columns(3)
+            for col, label in zip(count_cols, ['BUY', 'HOLD', 'HOLD/SELL']):
+                with col:
+                    st.metric(f"Rekomendasi {label}", int(recommendation_counts.get(label, 0)))
+
+            batch_page = show_paginated_table(batch_results, "batch_results", formats={
+                'Harga_Saham_Saat_Ini': "Rp {:,.0f}",
+                **{ratio: "{:.2f}" for ratio in RATIO_COLUMNS},
+                **{f'Rata-rata Sektor {key}': "{:.2f}" for key in valuation_methods},
+                **{f'Fair Value ({key})': "Rp {:,.0f}" for key in valuation_methods}
+            })
+
+            # One combined figure for the visible page instead of a gauge widget per company
+            # It is built in the background while the CSV export below is written, then put in its slot
+            batch_gauge_future = None
+            if st.checkbox(f"📊 Tampilkan gauge ringkas untuk halaman ini (maks. {COMPACT_GAUGE_LIMIT} perusahaan)", value=False):
+                batch_gauge_future = submit_tasks({'batch_gauges': partial(create_batch_gauge_grid, batch_page)})['batch_gauges']
+                batch_gauge_slot = st.empty()
+
+            st.download_button(
+                label="📥 Download Hasil Valuasi (CSV)",
+                data=batch_results.to_csv(index=False).encode('utf-8'),
+                file_name="hasil_valuasi_batch.csv",
+                mime="text/csv"
+            )
+
+            if batch_gauge_future is not None:
+                with profiler.stage('render'):
+                    batch_gauges = batch_gauge_future.result()
+                    if batch_gauges:
+                        batch_gauge_slot.plotly_chart(batch_gauges, use_container_width=True)
+                if not batch_gauges:
+                    batch_gauge_slot.info("ℹ️ Tidak ada Fair Value yang valid di halaman ini.")
+            with st.sidebar:
+                # The workbook is only written when the button is clicked, streamed row by row to a temporary file
+                st.download_button(
+                    label="📑 Download Laporan Excel",
+                    data=partial(valuation_report_bytes, batch_results),
+                    file_name="laporan_valuasi.xlsx",
+                    mime="application/vnd.openxmlformats-officedocument.spreadsheetml.sheet",
+                    help="Sheet ringkasan dan satu sheet per sektor berisi rasio, rata-rata sektor, fair value dan status berwarna."
+                )
+
+            if live_mode:
+                st.markdown("""
+                <div class="info-card">
+                    <h3 style="color: #667eea; margin-bottom: 0;">📡 Harga Live (saham yang terakhir diperbarui)</h3>
+                </div>
+                """, unsafe_allow_html=True)
+                live_pricer, live_feed, live_recent = get_session_live_pricer(
+                    ('batch', uploaded_content_key(uploaded_file), batch_source, tuple(valuation_methods)),
+                    df_batch_targets, df_sector_comparables, valuation_methods, live_source
+                )
+                st.fragment(show_live_valuation, run_every=live_interval)(live_pricer, live_feed, live_recent)
+
+elif uploaded_file is not None:
+    # Historical fair value: rolling sector multiples per quarter from the history sheet or file,
+    # parsed on the shared thread pool while the main sheets are read below
+    if history_file is not None:
+        history_source = history_file
+    elif is_single_table_source(uploaded_file):
+        history_source = None
+    else:
+        history_source = uploaded_file
+    history_future = submit_history_read(history_source) if history_source is not None else None
+
+    with st.spinner("🔄 Memproses data..."), profiler.stage('ingest'):
+        if is_single_table_source(uploaded_file) and selected_target_ticker is None:
+            st.error("❌ File harus memiliki kolom 'Ticker' untuk memilih perusahaan target.")
+            target_data, df_sector_comparables = None, None
+        elif is_single_table_source(uploaded_file):
+            target_data, df_sector_comparables = read_excel_data(uploaded_file, selected_target_ticker)
+        elif streaming_mode:
+            target_data, df_sector_comparables, streamed_index = read_excel_data_streaming(uploaded_file)
+        else:
+            target_data, df_sector_comparables = read_excel_data(uploaded_file)
 
     if target_data is not None:
         # Extract target company data
@@ -724,9 +1415,7 @@ if uploaded_file is not None:
         total_equity_target = target_data.get('Total_Ekuitas_Terbaru')
 
         # Ensure all key data is present
-        if all(x is not None for x in [ticker_target, company_name_target, sector_target,
-                                       shares_outstanding_target, current_price_target,
-                                       net_income_target, revenue_target, total_equity_target]):
+        if not missing_fields(target_data):
             
             # Company info section
             st.markdown(f"""
@@ -762,10 +1451,11 @@ if uploaded_file is not None:
             st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 
             # Calculate target company ratios
-            ratios_target = calculate_key_ratios(
-                net_income_target, revenue_target, total_equity_target,
-                current_price_target, shares_outstanding_target
-            )
+            with profiler.stage('ratios'):
+                ratios_target = calculate_key_ratios(
+                    net_income_target, revenue_target, total_equity_target,
+                    current_price_target, shares_outstanding_target
+                )
 
             # Financial ratios section
             st.markdown("""
@@ -815,7 +1505,25 @@ if uploaded_file is not None:
 
             if not df_sector_comparables.empty:
                 # Filter comparable companies from Excel by sector
-                comparable_companies_in_sector = get_sector_comparables_from_excel(df_sector_comparables, sector_target)
+                # Building the sector index groups the comparables and sums their ratios in one pass
+                if use_peers:
+                    with profiler.stage('filter'):
+                        peer_index = build_peer_index(df_sector_comparables, uploaded_file, selected_target_ticker, peer_sector_weight)
+                        comparable_companies_in_sector = peer_index.peers_for(target_data, peer_count)
+                    # The peers stand in for the target's sector, so the rest of the page uses them unchanged
+                    with profiler.stage('aggregation'):
+                        sector_index = SectorIndex(comparable_companies_in_sector.assign(Sektor=sector_target))
+                else:
+                    with profiler.stage('aggregation'):
+                        if streaming_mode:
+                            sector_index, sector_changes = streamed_index, None
+                        elif incremental_mode:
+                            sector_index, sector_changes = get_session_sector_index(df_sector_comparables)
+                        else:
+                            sector_index, sector_changes = build_sector_index(df_sector_comparables, uploaded_file, selected_target_ticker), None
+                    show_incremental_changes(sector_changes)
+                    with profiler.stage('filter'):
+                        comparable_companies_in_sector = get_sector_comparables_from_excel(df_sector_comparables, sector_target, sector_index)
 
                 if not comparable_companies_in_sector.empty:
                     st.markdown(f"""
@@ -826,25 +1534,62 @@ if uploaded_file is not None:
                     
                     # Display comparable companies
                     display_cols = ['Ticker', 'Nama_Perusahaan', 'Harga_Saham_Saat_Ini', 'Net_Income_Terbaru', 'Total_Ekuitas_Terbaru'] # Added Total_Ekuitas_Terbaru
-                    st.dataframe(
-                        comparable_companies_in_sector[display_cols].style.format({
-                            'Harga_Saham_Saat_Ini': "Rp {:,.0f}",
-                            'Net_Income_Terbaru': "Rp {:,.0f}",
-                            'Total_Ekuitas_Terbaru': "Rp {:,.0f}" # Formatted Total_Ekuitas_Terbaru
-                        }),
-                        use_container_width=True
-                    )
+                    if use_peers:
+                        display_cols = display_cols[:2] + ['Sektor'] + display_cols[2:] + [DISTANCE_COLUMN]
+                    show_paginated_table(comparable_companies_in_sector[display_cols], "sector_comparables", formats={
+                        'Harga_Saham_Saat_Ini': "Rp {:,.0f}",
+                        'Net_Income_Terbaru': "Rp {:,.0f}",
+                        'Total_Ekuitas_Terbaru': "Rp {:,.0f}", # Formatted Total_Ekuitas_Terbaru
+                        DISTANCE_COLUMN: "{:.3f}"
+                    })
+
+                    # Average sector ratios, precomputed by the sector index
+                    with profiler.stage('aggregation'):
+                        sector_avg_ratios = sector_index.averages(sector_target, sector_aggregator)
 
-                    # Calculate average sector ratios
-                    sector_avg_ratios = calculate_sector_averages_from_excel(comparable_companies_in_sector)
+                    # Every sector statistic side by side, to show how sensitive the averages are to outliers
+                    with st.expander("📐 Statistik Sektor (semua metode agregasi)"):
+                        with profiler.stage('aggregation'):
+                            sector_statistics = sector_index.statistics
+                        sector_key = normalize_sector(sector_target)
+                        if sector_key in sector_statistics.index.get_level_values('sector'):
+                            st.dataframe(
+                                sector_statistics.xs(sector_key, level='sector').rename(columns=SECTOR_AGGREGATORS),
+                                use_container_width=True
+                            )
 
                     if sector_avg_ratios:
+                        # Heavy numeric work starts on the shared thread pool now and is collected where it is shown,
+                        # so the comparison chart and the fair value cards render while it runs
+                        sensitivity_steps = st.session_state.get('sensitivity_steps', DEFAULT_SENSITIVITY_STEPS)
+                        background_tasks = {
+                            method: partial(build_sensitivity_heatmap, ratios_target, sector_avg_ratios, current_price_target, method, sensitivity_steps)
+                            for method in SENSITIVITY_SCENARIOS
+                        }
+                        background_tasks['comparison_chart'] = partial(create_comparison_chart, ratios_target, sector_avg_ratios)
+
+                        history_df, history_error = pd.DataFrame(), None
+                        if history_future is not None:
+                            with profiler.stage('ingest'):
+                                history_df = read_uploaded_history(history_future)
+                        if not history_df.empty:
+                            try:
+                                with profiler.stage('aggregation'):
+                                    period_store, appended_rows = get_session_period_store(history_df, history_source.name)
+                                    companies_df = pd.concat([pd.DataFrame([target_data]), df_sector_comparables], ignore_index=True)
+                                # The worker gets a snapshot: the session's store can be appended to by the next run
+                                background_tasks['history'] = partial(historical_fair_values, period_store.to_frame(), companies_df)
+                            except ValueError as e:
+                                history_error = e
+                        background_results = submit_tasks(background_tasks)
+
                         st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
                         
                         # Comparison chart
-                        comparison_chart = create_comparison_chart(ratios_target, sector_avg_ratios)
-                        if comparison_chart:
-                            st.plotly_chart(comparison_chart, use_container_width=True)
+                        with profiler.stage('render'):
+                            comparison_chart = background_results['comparison_chart'].result()
+                            if comparison_chart:
+                                st.plotly_chart(comparison_chart, use_container_width=True)
 
                         st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
 
@@ -855,91 +1600,205 @@ if uploaded_file is not None:
                         </div>
                         """, unsafe_allow_html=True)
 
-                        # Fair value calculations
-                        fair_value_pe = calculate_fair_value_multiplier(ratios_target, sector_avg_ratios, current_price_target, method='P/E')
-                        fair_value_pb = calculate_fair_value_multiplier(ratios_target, sector_avg_ratios, current_price_target, method='P/B')
+                        # Fair value calculations: every selected method in one vectorized pass. P/E and P/B come
+                        # from the sector index; the other methods are averaged over the same comparables
+                        with profiler.stage('fair_value'):
+                            selected_methods = resolve_methods(valuation_methods)
+                            target_multiples = method_multiples(pd.DataFrame([target_data]), valuation_methods).iloc[0]
+                            extra_methods = [method.key for method in selected_methods if method.ratio not in RATIO_COLUMNS]
+                            method_sector_averages = dict(sector_avg_ratios)
+                            if extra_methods:
+                                method_sector_averages.update(method_averages(comparable_companies_in_sector, extra_methods, aggregator=sector_aggregator))
+                            fair_values = method_fair_values(
+                                current_price_target,
+                                [target_multiples[method.ratio] for method in selected_methods],
+                                [method_sector_averages.get(method.ratio, np.nan) for method in selected_methods],
+                                valuation_methods
+                            )
+                            statuses = classify_valuation_status(current_price_target, fair_values)
 
-                        col1, col2 = st.columns(2)
-                        
-                        with col1:
-                            if fair_value_pe is not None and not pd.isna(fair_value_pe) and fair_value_pe > 0:
-                                # P/E Fair Value
-                                st.markdown(f"""
-                                <div style="background: white; padding: 1.5rem; border-radius: 15px; text-align: center; box-shadow: 0 5px 15px rgba(0,0,0,0.1);">
-                                    <h3 style="color: #667eea;">Fair Value (P/E)</h3>
-                                    <h2 style="color: #2c3e50; font-size: 2rem;">Rp {fair_value_pe:,.0f}</h2>
-                                </div>
-                                """, unsafe_allow_html=True)
-                                
-                                # Status for P/E
-                                if current_price_target < fair_value_pe * 0.95: # Adding a small buffer for "undervalued"
-                                    st.markdown("""
-                                    <div class="status-card status-undervalued">
-                                        🚀 UNDERVALUED - Berdasarkan P/E<br>
-                                        <small>Harga di bawah fair value, potensi profit tinggi</small>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                                elif current_price_target > fair_value_pe * 1.05: # Adding a small buffer for "overvalued"
-                                    st.markdown("""
-                                    <div class="status-card status-overvalued">
-                                        ⚠️ OVERVALUED - Berdasarkan P/E<br>
-                                        <small>Harga di atas fair value, pertimbangkan risiko</small>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                                else:
-                                    st.markdown("""
-                                    <div class="status-card status-fair">
-                                        ✅ FAIR VALUE - Berdasarkan P/E<br>
-                                        <small>Harga sesuai dengan fair value</small>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                                
-                                # Gauge chart for P/E
-                                pe_gauge = create_gauge_chart(current_price_target, fair_value_pe, "P/E Fair Value")
-                                if pe_gauge:
-                                    st.plotly_chart(pe_gauge, use_container_width=True)
-                            else:
-                                st.info("ℹ️ Fair Value (P/E) tidak dapat dihitung atau tidak valid. Pastikan Net Income Target tidak nol dan rata-rata P/E sektor tidak nol.")
-                        
-                        with col2:
-                            if fair_value_pb is not None and not pd.isna(fair_value_pb) and fair_value_pb > 0:
-                                # P/B Fair Value
-                                st.markdown(f"""
-                                <div style="background: white; padding: 1.5rem; border-radius: 15px; text-align: center; box-shadow: 0 5px 15px rgba(0,0,0,0.1);">
-                                    <h3 style="color: #667eea;">Fair Value (P/B)</h3>
-                                    <h2 style="color: #2c3e50; font-size: 2rem;">Rp {fair_value_pb:,.0f}</h2>
-                                </div>
-                                """, unsafe_allow_html=True)
-                                
-                                # Status for P/B
-                                if current_price_target < fair_value_pb * 0.95: # Adding a small buffer
-                                    st.markdown("""
-                                    <div class="status-card status-undervalued">
-                                        🚀 UNDERVALUED - Berdasarkan P/B<br>
-                                        <small>Harga di bawah fair value, potensi profit tinggi</small>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                                elif current_price_target > fair_value_pb * 1.05: # Adding a small buffer
-                                    st.markdown("""
-                                    <div class="status-card status-overvalued">
-                                        ⚠️ OVERVALUED - Berdasarkan P/B<br>
-                                        <small>Harga di atas fair value, pertimbangkan risiko</small>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                                else:
-                                    st.markdown("""
-                                    <div class="status-card status-fair">
-                                        ✅ FAIR VALUE - Berdasarkan P/B<br>
-                                        <small>Harga sesuai dengan fair value</small>
-                                    </div>
-                                    """, unsafe_allow_html=True)
-                                
-                                # Gauge chart for P/B
-                                pb_gauge = create_gauge_chart(current_price_target, fair_value_pb, "P/B Fair Value")
-                                if pb_gauge:
-                                    st.plotly_chart(pb_gauge, use_container_width=True)
-                            else:
-                                st.info("ℹ️ Fair Value (P/B) tidak dapat dihitung atau tidak valid. Pastikan Total Ekuitas Target tidak nol dan rata-rata P/B sektor tidak nol.")
+                        # The gauges are built in the background while the cards are written
+                        gauge_results = submit_tasks({
+                            method.key: partial(create_gauge_chart, current_price_target, fair_value, f"{method.key} Fair Value")
+                            for method, fair_value in zip(selected_methods, fair_values)
+                            if not pd.isna(fair_value) and fair_value > 0
+                        })
+
+                        status_cards = {
+                            'UNDERVALUED': ('status-undervalued', '🚀 UNDERVALUED', 'Harga di bawah fair value, potensi profit tinggi'),
+                            'OVERVALUED': ('status-overvalued', '⚠️ OVERVALUED', 'Harga di atas fair value, pertimbangkan risiko'),
+                            'FAIR': ('status-fair', '✅ FAIR VALUE', 'Harga sesuai dengan fair value')
+                        }
+                        # What to check when a method cannot be computed
+                        missing_hints = {
+                            'P/E': 'Pastikan Net Income Target tidak nol dan rata-rata P/E sektor tidak nol.',
+                            'P/B': 'Pastikan Total Ekuitas Target tidak nol dan rata-rata P/B sektor tidak nol.'
+                        }
+
+                        # Two cards per row; a gauge slot per valid card, filled once all cards are on the page
+                        gauge_slots = []
+                        for row_start in range(0, len(selected_methods), 2):
+                            for col, method, fair_value, status in zip(
+                                st.columns(2), selected_methods[row_start:row_start + 2],
+                                fair_values[row_start:row_start + 2], statuses[row_start:row_start + 2]
+                            ):
+                                with col:
+                                    if not pd.isna(fair_value) and fair_value > 0:
+                                        st.markdown(f"""
+                                        <div style="background: white; padding: 1.5rem; border-radius: 15px; text-align: center; box-shadow: 0 5px 15px rgba(0,0,0,0.1);">
+                                            <h3 style="color: #667eea;">Fair Value ({method.key})</h3>
+                                            <h2 style="color: #2c3e50; font-size: 2rem;">Rp {fair_value:,.0f}</h2>
+                                        </div>
+                                        """, unsafe_allow_html=True)
+
+                                        card_class, label, note = status_cards[status]
+                                        st.markdown(f"""
+                                        <div class="status-card {card_class}">
+                                            {label} - Berdasarkan {method.key}<br>
+                                            <small>{note}</small>
+                                        </div>
+                                        """, unsafe_allow_html=True)
+
+                                        gauge_slots.append((st.empty(), gauge_results[method.key]))
+                                    else:
+                                        hint = missing_hints.get(method.key, f"Pastikan kolom {', '.join(method.columns)} terisi dan rata-rata {method.key} sektor tersedia.")
+                                        st.info(f"ℹ️ Fair Value ({method.key}) tidak dapat dihitung atau tidak valid. {hint}")
+
+                        # Gauges after all cards, so the fair values show before any figure is waited for
+                        with profiler.stage('render'):
+                            for gauge_slot, gauge_future in gauge_slots:
+                                gauge = gauge_future.result()
+                                if gauge:
+                                    gauge_slot.plotly_chart(gauge, use_container_width=True)
+
+                        # Live price of the target against the same comparables; only this section reruns on each refresh
+                        if live_mode:
+                            st.markdown("""
+                            <div class="info-card">
+                                <h3 style="color: #667eea; margin-bottom: 0;">📡 Harga Live</h3>
+                            </div>
+                            """, unsafe_allow_html=True)
+                            live_pricer, live_feed, live_recent = get_session_live_pricer(
+                                ('single', uploaded_content_key(uploaded_file), ticker_target, tuple(valuation_methods)),
+                                pd.DataFrame([target_data]), comparable_companies_in_sector, valuation_methods, live_source
+                            )
+                            st.fragment(show_live_valuation, run_every=live_interval)(
+                                live_pricer, live_feed, live_recent, target_ticker=ticker_target, upload_price=current_price_target
+                            )
+
+                        # Sensitivity grid under the gauges: fair value across sector multiple and fundamental shocks
+                        with st.expander("🧮 Analisis Sensitivitas Fair Value", expanded=True):
+                            st.select_slider(
+                                "Jumlah skenario per sumbu",
+                                options=[11, 21, 41, 101, 201],
+                                value=DEFAULT_SENSITIVITY_STEPS,
+                                key='sensitivity_steps',
+                                help="Sektor P/E dan P/B diuji ±30%, Net Income ±20% dan Ekuitas ±10%."
+                            )
+                            sensitivity_tables = []
+                            heatmap_cols = st.columns(len(SENSITIVITY_SCENARIOS))
+                            for heatmap_col, method in zip(heatmap_cols, SENSITIVITY_SCENARIOS):
+                                with heatmap_col:
+                                    with profiler.stage('render'):
+                                        grid, heatmap = background_results[method].result()
+                                        if heatmap:
+                                            st.plotly_chart(heatmap, use_container_width=True)
+                                    if heatmap:
+                                        sensitivity_tables.append(sensitivity_table(grid, current_price_target, method))
+                                    else:
+                                        st.info(f"ℹ️ Sensitivitas Fair Value ({method}) tidak dapat dihitung.")
+
+                            if sensitivity_tables:
+                                st.download_button(
+                                    label="📥 Download Grid Sensitivitas (CSV)",
+                                    data=pd.concat(sensitivity_tables, ignore_index=True).to_csv(index=False).encode('utf-8'),
+                                    file_name=f"sensitivitas_{ticker_target}.csv",
+                                    mime="text/csv"
+                                )
+
+                        # Probabilistic fair value: bootstrapped sector multiples and noisy fundamentals
+                        with st.expander("🎲 Simulasi Monte Carlo Fair Value"):
+                            mc_col1, mc_col2 = st.columns(2)
+                            with mc_col1:
+                                mc_samples = st.select_slider(
+                                    "Jumlah sampel",
+                                    options=[100_000, 250_000, 500_000, 1_000_000],
+                                    value=100_000,
+                                    format_func=lambda n: f"{n:,}"
+                                )
+                            with mc_col2:
+                                mc_seed = st.number_input("Seed", min_value=0, value=DEFAULT_SEED, step=1)
+                            st.caption("Rasio sektor di-bootstrap dari perusahaan pembanding; Net Income diberi noise ±10% dan Ekuitas ±5% (1 standar deviasi).")
+
+                            if st.checkbox("Jalankan simulasi", value=False):
+                                with st.spinner("Menjalankan simulasi..."), profiler.stage('fair_value'):
+                                    simulation = run_fair_value_simulation(
+                                        ratios_target, comparable_companies_in_sector, current_price_target, mc_samples, int(mc_seed)
+                                    )
+                                st.dataframe(
+                                    simulation.summary.style.format({
+                                        **{column: "Rp {:,.0f}" for column in simulation.summary.columns if column.startswith('P') and '(' not in column},
+                                        'Mean': "Rp {:,.0f}",
+                                        'P(UNDERVALUED)': "{:.1%}",
+                                        'P(FAIR)': "{:.1%}",
+                                        'P(OVERVALUED)': "{:.1%}",
+                                        'Sampel Valid': "{:,}"
+                                    }, na_rep='-'),
+                                    use_container_width=True
+                                )
+                                histogram_cols = st.columns(len(MONTE_CARLO_METHODS))
+                                for histogram_col, method in zip(histogram_cols, MONTE_CARLO_METHODS):
+                                    with histogram_col:
+                                        with profiler.stage('render'):
+                                            histogram = create_simulation_histogram(simulation.samples[method], current_price_target, f"Distribusi Fair Value ({method})")
+                                            if histogram:
+                                                st.plotly_chart(histogram, use_container_width=True)
+                                        if not histogram:
+                                            st.info(f"ℹ️ Tidak ada sampel Fair Value ({method}) yang valid.")
+
+                        # Historical fair value computed in the background since the sector averages were known
+                        if not history_df.empty:
+                            with st.expander("📈 Histori Fair Value vs Harga"):
+                                try:
+                                    if history_error is not None:
+                                        raise history_error
+                                    with profiler.stage('fair_value'):
+                                        history_results = background_results['history'].result()
+                                except ValueError as e:
+                                    st.error(f"❌ Data historis tidak valid: {e}")
+                                    history_results = None
+
+                                if history_results is not None:
+                                    target_history = history_results[history_results['Ticker'] == str(ticker_target).strip()]
+                                    with profiler.stage('render'):
+                                        history_chart = create_history_chart(target_history, f"Fair Value vs Harga {ticker_target} per Kuartal")
+                                        if history_chart:
+                                            st.plotly_chart(history_chart, use_container_width=True)
+                                    if history_chart:
+                                        st.caption(
+                                            f"Rata-rata sektor memakai 4 kuartal terakhir tanpa perusahaan itu sendiri. "
+                                            f"{len(period_store):,} baris periode tersimpan, {appended_rows:,} baris baru dari upload ini."
+                                        )
+                                        st.dataframe(
+                                            target_history.drop(columns=['Tanggal']).style.format({
+                                                'Harga': "Rp {:,.0f}",
+                                                'P/E Ratio': "{:.2f}x",
+                                                'P/B Ratio': "{:.2f}x",
+                                                'Rata-rata Sektor P/E': "{:.2f}x",
+                                                'Rata-rata Sektor P/B': "{:.2f}x",
+                                                'Fair Value (P/E)': "Rp {:,.0f}",
+                                                'Fair Value (P/B)': "Rp {:,.0f}"
+                                            }, na_rep='-'),
+                                            use_container_width=True
+                                        )
+                                        st.download_button(
+                                            label="📥 Download Histori Fair Value (CSV)",
+                                            data=history_results.to_csv(index=False).encode('utf-8'),
+                                            file_name="histori_fair_value.csv",
+                                            mime="text/csv"
+                                        )
+                                    else:
+                                        st.info(f"ℹ️ Tidak ada data historis untuk {ticker_target}.")
 
                         # Summary analysis
                         st.markdown('<div class="divider"></div>', unsafe_allow_html=True)
@@ -952,23 +1811,10 @@ if uploaded_file is not None:
                         """, unsafe_allow_html=True)
                         
                         # Calculate overall recommendation
-                        undervalued_count = 0
-                        overvalued_count = 0
-                        
-                        if fair_value_pe is not None and not pd.isna(fair_value_pe) and fair_value_pe > 0:
-                            if current_price_target < fair_value_pe * 0.95:
-                                undervalued_count += 1
-                            elif current_price_target > fair_value_pe * 1.05:
-                                overvalued_count += 1
-                        
-                        if fair_value_pb is not None and not pd.isna(fair_value_pb) and fair_value_pb > 0:
-                            if current_price_target < fair_value_pb * 0.95:
-                                undervalued_count += 1
-                            elif current_price_target > fair_value_pb * 1.05:
-                                overvalued_count += 1
+                        recommendation = get_investment_recommendation(*statuses)
                         
                         # Display recommendation
-                        if undervalued_count > overvalued_count:
+                        if recommendation == 'BUY':
                             st.markdown("""
                             <div class="status-card status-undervalued" style="font-size: 1.2rem; padding: 2rem;">
                                 <h3 style="margin-bottom: 1rem;">🎯 REKOMENDASI: BUY</h3>
@@ -976,7 +1822,7 @@ if uploaded_file is not None:
                                 <small><strong>Catatan:</strong> Selalu lakukan riset mendalam sebelum berinvestasi</small>
                             </div>
                             """, unsafe_allow_html=True)
-                        elif overvalued_count > undervalued_count:
+                        elif recommendation == 'HOLD/SELL':
                             st.markdown("""
                             <div class="status-card status-overvalued" style="font-size: 1.2rem; padding: 2rem;">
                                 <h3 style="margin-bottom: 1rem;">⚠️ REKOMENDASI: HOLD/SELL</h3>
@@ -1009,13 +1855,52 @@ if uploaded_file is not None:
 
                     else:
                         st.warning("❌ Tidak dapat menghitung rata-rata rasio sektor. Pastikan data perusahaan pembanding lengkap dan valid.")
+                elif use_peers:
+                    st.warning("❌ Tidak ditemukan tetangga terdekat. Pastikan harga, jumlah saham, pendapatan (positif) dan ekuitas perusahaan target dan pembanding terisi.")
                 else:
                     st.warning(f"❌ Tidak ditemukan perusahaan pembanding di sektor **'{sector_target}'** dalam file Excel Anda. Pastikan nama sektor di sheet 'Perusahaan_Sektor' sesuai dengan 'Perusahaan_Target'.")
             else:
                 st.info("ℹ️ Tidak ada data perusahaan pembanding di sheet 'Perusahaan_Sektor'. Analisis perbandingan sektor tidak dapat dilakukan.")
 
         else:
-            st.error("❌ Data perusahaan target tidak lengkap. Pastikan semua kolom wajib (Ticker, Nama_Perusahaan, Sektor, Harga_Saham_Saat_Ini, Jumlah_Saham_Beredar, Net_Income_Terbaru, Total_Pendapatan_Terbaru, Total_Ekuitas_Terbaru) terisi di sheet 'Perusahaan_Target'.")
+            st.error(f"❌ Data perusahaan target tidak lengkap (kosong atau tidak terbaca: {', '.join(missing_fields(target_data))}). Pastikan semua kolom wajib (Ticker, Nama_Perusahaan, Sektor, Harga_Saham_Saat_Ini, Jumlah_Saham_Beredar, Net_Income_Terbaru, Total_Pendapatan_Terbaru, Total_Ekuitas_Terbaru) terisi di sheet 'Perusahaan_Target'.")
+
+# Performance panel: logged on every rerun, shown on demand
+profile_report = profiler.finish()
+if debug_profiling:
+    with st.expander("🛠️ Profil Performa", expanded=True):
+        st.caption(f"Total waktu run: {profile_report['total_seconds'] * 1000:,.1f} ms")
+        if not profile_report['trace_memory']:
+            st.caption(f"Memori tidak diukur: jalankan server dengan ${TRACE_MEMORY_ENV}=1 untuk mengaktifkan tracemalloc.")
+        else:
+            st.caption("Memori dihitung untuk seluruh proses server: memory_peak_mb adalah kenaikan puncak memori proses "
+                       "selama tahap itu (0 bila di bawah puncak sebelumnya); sesi lain yang berjalan bersamaan ikut terhitung.")
+        profile_summary = pd.DataFrame(profile_report['stages'], columns=['stage', 'calls', 'seconds', 'share', 'memory_delta_bytes', 'memory_peak_bytes'])
+        profile_summary = profile_summary.astype({'seconds': float, 'share': float, 'memory_delta_bytes': float, 'memory_peak_bytes': float})
+        st.dataframe(
+            profile_summary.assign(
+                ms=profile_summary['seconds'] * 1000,
+                memory_delta_mb=profile_summary['memory_delta_bytes'] / 2**20,
+                memory_peak_mb=profile_summary['memory_peak_bytes'] / 2**20
+            )[['stage', 'calls', 'ms', 'share', 'memory_delta_mb', 'memory_peak_mb']],
+            use_container_width=True,
+            hide_index=True
+        )
+        cache_stats = shared_cache().stats()
+        lookups = cache_stats.hits + cache_stats.misses
+        st.caption(
+            f"Cache bersama: {cache_stats.entries}/{cache_stats.max_entries} entri, "
+            f"{cache_stats.bytes / 2**20:,.1f}/{cache_stats.max_bytes / 2**20:,.0f} MB, "
+            f"hit {cache_stats.hits:,} / miss {cache_stats.misses:,}"
+            + (f" ({cache_stats.hits / lookups:.0%} hit rate)" if lookups else "")
+            + f", {cache_stats.evictions:,} dikeluarkan (LRU), {cache_stats.expirations:,} kedaluwarsa"
+        )
+        st.download_button(
+            label="📥 Download Profil (JSON)",
+            data=json.dumps(profile_report, indent=2).encode('utf-8'),
+            file_name="profil_performa.json",
+            mime="application/json"
+        )
 
 # Footer
 st.markdown("""
@@ -0,0 +1,38 @@
+import os
+
+import pandas as pd
+
+from fair_value.ingest import content_hash, prune_cache_dir, read_valuation_frames_cached
+
+
+def make_entry(cache_dir, name, size, used_at):
+    path = cache_dir / (content_hash(name.encode()) + '.csv')
+    path.mkdir()
+    (path / 'sector.parquet').write_bytes(b'x' * size)
+    os.utime(path, (used_at, used_at))
+    return path
+
+
+def test_prune_removes_expired_then_least_recently_used(tmp_path):
+    expired = make_entry(tmp_path, 'expired', 10, used_at=0)
+    old = make_entry(tmp_path, 'old', 600, used_at=900)
+    recent = make_entry(tmp_path, 'recent', 600, used_at=950)
+    other = tmp_path / 'notes'
+    other.mkdir()
+
+    assert prune_cache_dir(str(tmp_path), max_bytes=1000, max_age=500, now=1000) == 2
+    assert not expired.exists() and not old.exists()
+    assert recent.exists() and other.exists()
+
+
+def test_cached_read_prunes_after_write(tmp_path, monkeypatch):
+    cache_dir = tmp_path / 'cache'
+    cache_dir.mkdir()
+    stale = make_entry(cache_dir, 'stale', 10, used_at=0)
+    source = tmp_path / 'data.csv'
+    pd.DataFrame({'Ticker': ['A'], 'Sektor': ['Bank']}).to_csv(source, index=False)
+
+    _, df_sector = read_valuation_frames_cached(str(source), cache_dir=str(cache_dir))
+    assert df_sector['Ticker'].tolist() == ['A']
+    assert not stale.exists()
+    assert len(os.listdir(cache_dir)) == 1
@@ -0,0 +1,46 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fair_value import value_companies_batch
+from fair_value.live import PRICE_FEEDS_ENV, CsvPriceFeed, HttpPriceFeed, LivePricer, open_price_feed
+
+
+def make_companies():
+    return pd.DataFrame({
+        'Ticker': ['A', 'B', 'C', 'D', 'E'],
+        'Nama_Perusahaan': ['a', 'b', 'c', 'd', 'e'],
+        'Sektor': ['Bank', np.nan, np.nan, 'bank', 'Bank'],
+        'Harga_Saham_Saat_Ini': [100.0, 200.0, 300.0, 400.0, 250.0],
+        'Jumlah_Saham_Beredar': [10.0, 10.0, 10.0, 10.0, 10.0],
+        'Net_Income_Terbaru': [100.0, 200.0, 150.0, 120.0, 90.0],
+        'Total_Pendapatan_Terbaru': [1000.0] * 5,
+        'Total_Ekuitas_Terbaru': [500.0, 400.0, 300.0, 200.0, 600.0]
+    })
+
+
+def test_blank_sector_matches_batch():
+    companies = make_companies()
+    pricer = LivePricer(companies, companies)
+    pd.testing.assert_frame_equal(pricer.snapshot(), value_companies_batch(companies, companies), check_dtype=False)
+
+
+def test_ticks_with_blank_sector_match_batch():
+    companies = make_companies()
+    pricer = LivePricer(companies, companies)
+    pricer.apply([('A', 120.0), ('B', 50.0), ('D', 380.0)])
+
+    repriced = companies.copy()
+    repriced['Harga_Saham_Saat_Ini'] = [120.0, 50.0, 300.0, 380.0, 250.0]
+    pd.testing.assert_frame_equal(pricer.snapshot(), value_companies_batch(repriced, repriced), check_dtype=False)
+    assert pricer.quote('B').recommendation == 'HOLD'
+
+
+def test_open_price_feed_only_opens_configured_sources(monkeypatch, tmp_path):
+    prices = tmp_path / 'prices.csv'
+    monkeypatch.setenv(PRICE_FEEDS_ENV, f'{prices}; http://feed.example/harga')
+    assert isinstance(open_price_feed(str(prices)), CsvPriceFeed)
+    assert isinstance(open_price_feed('http://feed.example/harga'), HttpPriceFeed)
+    for source in ['/etc/passwd', 'http://169.254.169.254/', '']:
+        with pytest.raises(ValueError):
+            open_price_feed(source)
@@ -0,0 +1,38 @@
+import numpy as np
+import pandas as pd
+
+from fair_value import value_companies_batch
+from fair_value.parallel import partition_by_sector, value_companies_parallel
+
+
+def make_companies(n, seed=0):
+    rng = np.random.default_rng(seed)
+    sectors = np.array(['Bank', 'bank', 'Energi', 'Properti', None, np.nan, ''], dtype=object)
+    return pd.DataFrame({
+        'Ticker': [f'T{i:05d}' for i in range(n)],
+        'Nama_Perusahaan': [f'Perusahaan {i}' for i in range(n)],
+        'Sektor': sectors[rng.integers(0, len(sectors), n)],
+        'Harga_Saham_Saat_Ini': rng.uniform(100, 5000, n),
+        'Jumlah_Saham_Beredar': rng.integers(1, 10, n) * 1e8,
+        'Net_Income_Terbaru': rng.normal(1e11, 5e10, n),
+        'Total_Pendapatan_Terbaru': rng.uniform(1e11, 1e12, n),
+        'Total_Ekuitas_Terbaru': rng.uniform(1e11, 1e12, n)
+    })
+
+
+def test_partitions_cover_blank_sectors():
+    companies = make_companies(500)
+    partitions = partition_by_sector(companies, companies, 3)
+    targets = np.sort(np.concatenate([positions for positions, _ in partitions]))
+    comparables = np.sort(np.concatenate([positions for _, positions in partitions]))
+    assert np.array_equal(targets, np.arange(len(companies)))
+    assert np.array_equal(comparables, np.arange(len(companies)))
+
+
+def test_parallel_matches_serial_with_blank_sectors():
+    companies = make_companies(3000)
+    serial = value_companies_batch(companies, companies)
+    parallel = value_companies_parallel(companies, companies, workers=3, min_rows=0)
+    assert len(parallel) == len(companies)
+    assert parallel['Ticker'].tolist() == companies['Ticker'].tolist()
+    pd.testing.assert_frame_equal(parallel, serial, check_dtype=False, check_categorical=False)
@@ -0,0 +1,50 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+from fair_value.peers import PeerIndex
+from fair_value.sector_index import normalize_sector
+
+
+def make_companies(n, seed=0):
+    rng = np.random.default_rng(seed)
+    sectors = np.array(['Bank', 'bank', 'Energi', 'Properti', None, np.nan], dtype=object)
+    return pd.DataFrame({
+        'Ticker': [f'T{i:05d}' for i in range(n)],
+        'Nama_Perusahaan': [f'Perusahaan {i}' for i in range(n)],
+        'Sektor': sectors[rng.integers(0, len(sectors), n)],
+        'Harga_Saham_Saat_Ini': rng.uniform(100, 5000, n),
+        'Jumlah_Saham_Beredar': rng.integers(1, 10, n) * 1e8,
+        'Net_Income_Terbaru': rng.normal(1e11, 5e10, n),
+        'Total_Pendapatan_Terbaru': rng.uniform(1e11, 1e12, n),
+        'Total_Ekuitas_Terbaru': rng.uniform(1e11, 1e12, n)
+    })
+
+
+def brute_force(index, targets, k):
+    points = index.tree.points
+    universe_sectors = normalize_sector(index.universe['Sektor']).to_numpy()[index.positions]
+    target_points = index.standardize(targets)
+    target_sectors = normalize_sector(targets['Sektor']).to_numpy()
+    positions = np.full((len(targets), k), -1)
+    distances = np.full((len(targets), k), np.nan)
+    for row in range(len(targets)):
+        same = np.array([a == target_sectors[row] or (pd.isna(a) and pd.isna(target_sectors[row])) for a in universe_sectors])
+        squared = ((points - target_points[row]) ** 2).sum(axis=1) + np.where(same, 0.0, index.sector_weight ** 2)
+        candidates = np.flatnonzero(index.tickers != targets['Ticker'].iloc[row])
+        nearest = candidates[np.argsort(squared[candidates], kind='stable')[:k]]
+        positions[row, :len(nearest)] = index.positions[nearest]
+        distances[row, :len(nearest)] = np.sqrt(squared[nearest])
+    return positions, distances
+
+
+@pytest.mark.parametrize('sector_weight', [0.0, 1.5])
+def test_query_matches_brute_force_with_missing_sectors(sector_weight):
+    universe = make_companies(1000)
+    targets = universe.iloc[::10]
+    index = PeerIndex(universe, sector_weight=sector_weight, leaf_size=8)
+    positions, distances = index.query(targets, k=5)
+    expected_positions, expected_distances = brute_force(index, targets, 5)
+    assert (positions >= 0).all()
+    np.testing.assert_array_equal(positions, expected_positions)
+    np.testing.assert_allclose(distances, expected_distances)
@@ -0,0 +1,21 @@
+import math
+
+import pytest
+
+from fair_value.valuation import calculate_fair_value_multiplier
+
+
+@pytest.mark.parametrize('method', ['P/E', 'P/B'])
+def test_fair_value_multiplier_return_values(method):
+    ratio = method + ' Ratio'
+    assert calculate_fair_value_multiplier({ratio: 10.0}, {ratio: 15.0}, 100.0, method) == pytest.approx(150.0)
+    # Unusable own multiple, unknown method or missing ratio: None
+    for own in [0.0, float('inf'), float('nan')]:
+        assert calculate_fair_value_multiplier({ratio: own}, {ratio: 15.0}, 100.0, method) is None
+    assert calculate_fair_value_multiplier({ratio: 10.0}, {}, 100.0, method) is None
+    assert calculate_fair_value_multiplier({ratio: 10.0}, {ratio: 15.0}, None, method) is None
+    assert calculate_fair_value_multiplier({ratio: 10.0}, {ratio: 15.0}, 100.0, 'unknown') is None
+    # Zero sector multiple: inf; missing sector average or price: NaN
+    assert calculate_fair_value_multiplier({ratio: 10.0}, {ratio: 0.0}, 100.0, method) == math.inf
+    assert math.isnan(calculate_fair_value_multiplier({ratio: 10.0}, {ratio: float('nan')}, 100.0, method))
+    assert math.isnan(calculate_fair_value_multiplier({ratio: 10.0}, {ratio: 15.0}, float('nan'), method))